@@ -74,11 +74,125 @@ DATABRICKS_HOST = _env("DATABRICKS_HOST")
 DATABRICKS_API_TOKEN = _env("DATABRICKS_API_TOKEN") or _env("DATABRICKS_TOKEN")
 DATABRICKS_SERVING_ENDPOINT = _env("DATABRICKS_SERVING_ENDPOINT")
 DATABRICKS_MODEL = _env("DATABRICKS_MODEL")  # Optional override if your endpoint needs it.
+# Several replicas (comma-separated names or URLs) enable the LLM router; it replaces DATABRICKS_SERVING_ENDPOINT.
+DATABRICKS_SERVING_ENDPOINTS = _env("DATABRICKS_SERVING_ENDPOINTS")
+# Router: consecutive failures that open an endpoint's circuit and its cooldown (seconds); optional hedging
+# sends a backup request after the endpoint's latency quantile (at least the min delay, in seconds).
+LLM_ROUTER_FAILURE_THRESHOLD = int(_env("LLM_ROUTER_FAILURE_THRESHOLD", "3"))
+LLM_ROUTER_COOLDOWN = float(_env("LLM_ROUTER_COOLDOWN", "30"))
+LLM_ROUTER_HEDGE = _env("LLM_ROUTER_HEDGE", "false").lower() == "true"
+LLM_ROUTER_HEDGE_QUANTILE = float(_env("LLM_ROUTER_HEDGE_QUANTILE", "0.95"))
+LLM_ROUTER_HEDGE_MIN_DELAY = float(_env("LLM_ROUTER_HEDGE_MIN_DELAY", "0.05"))
 SEARCH_API_ENDPOINT = _env("SEARCH_API_ENDPOINT")  # e.g., https://api.serpapi.com/search
 SEARCH_API_KEY = _env("SEARCH_API_KEY")
+# In-process search result cache (0 entries disables); TTLs in seconds for results and for failures.
+SEARCH_CACHE_SIZE = int(_env("SEARCH_CACHE_SIZE", "1024"))
+SEARCH_CACHE_TTL = float(_env("SEARCH_CACHE_TTL", "600"))
+SEARCH_CACHE_NEGATIVE_TTL = float(_env("SEARCH_CACHE_NEGATIVE_TTL", "30"))
+# Outbound HTTP (LLM + search): pooled keep-alive sessions with bounded retries.
+# Pool sizes are per host; timeouts are in seconds; retries apply to 429/5xx and connection errors.
+HTTP_POOL_CONNECTIONS = int(_env("HTTP_POOL_CONNECTIONS", "10"))
+HTTP_POOL_MAXSIZE = int(_env("HTTP_POOL_MAXSIZE", "10"))
+HTTP_POOL_BLOCK = _env("HTTP_POOL_BLOCK", "false").lower() == "true"
+HTTP_CONNECT_TIMEOUT = float(_env("HTTP_CONNECT_TIMEOUT", "3.05"))
+HTTP_READ_TIMEOUT = float(_env("HTTP_READ_TIMEOUT", "60"))
+HTTP_MAX_RETRIES = int(_env("HTTP_MAX_RETRIES", "2"))
+HTTP_BACKOFF_BASE = float(_env("HTTP_BACKOFF_BASE", "0.25"))
+HTTP_BACKOFF_MAX = float(_env("HTTP_BACKOFF_MAX", "4"))
+# Async client (ASGI view): concurrent connections per event loop; needs httpx, else a thread pool is used.
+HTTP_ASYNC_MAX_CONNECTIONS = int(_env("HTTP_ASYNC_MAX_CONNECTIONS", "200"))
+DATABRICKS_READ_TIMEOUT = float(_env("DATABRICKS_READ_TIMEOUT", "60"))
+SEARCH_READ_TIMEOUT = float(_env("SEARCH_READ_TIMEOUT", "30"))
+# Completion cache for LLM calls (SQLite in WAL mode, shared by worker processes), opt-in: default mode
+# (off, or readwrite, readonly, refresh, bypass), TTL in seconds, size caps (LRU eviction) checked every N writes.
+LLM_CACHE_MODE = _env("LLM_CACHE_MODE", "off").lower()
+LLM_CACHE_PATH = _env("LLM_CACHE_PATH", str(BASE_DIR / "llm_cache.sqlite3"))
+LLM_CACHE_TTL = float(_env("LLM_CACHE_TTL", "3600"))
+LLM_CACHE_MAX_ENTRIES = int(_env("LLM_CACHE_MAX_ENTRIES", "10000"))
+LLM_CACHE_MAX_MB = int(_env("LLM_CACHE_MAX_MB", "64"))
+LLM_CACHE_EVICT_INTERVAL = int(_env("LLM_CACHE_EVICT_INTERVAL", "64"))
+# Conversation memory: "memory" (per process) or "sqlite" (WAL database shared by worker processes).
+# Caps: sessions kept and their total size (LRU eviction), idle TTL in seconds, and per-session messages / KB.
+SESSION_STORE = _env("SESSION_STORE", "memory").lower()
+SESSION_STORE_PATH = _env("SESSION_STORE_PATH", str(BASE_DIR / "sessions.sqlite3"))
+SESSION_MAX_SESSIONS = int(_env("SESSION_MAX_SESSIONS", "10000"))
+SESSION_MAX_MB = int(_env("SESSION_MAX_MB", "64"))
+SESSION_TTL = float(_env("SESSION_TTL", "86400"))
+SESSION_MAX_MESSAGES = int(_env("SESSION_MAX_MESSAGES", "20"))
+SESSION_MAX_KB = int(_env("SESSION_MAX_KB", "32"))
+# Build the RAG index and agents at startup (AgentsConfig.ready; run gunicorn with --preload so workers fork warm)
+# and gc.freeze() what was built, so garbage collection in the workers keeps those pages shared.
+AGENT_WARMUP = _env("AGENT_WARMUP", "false").lower() == "true"
+AGENT_WARMUP_GC_FREEZE = _env("AGENT_WARMUP_GC_FREEZE", "true").lower() == "true"
+# In-process Prometheus metrics (request/stage latency histograms, LLM tokens) at /api/agent/metrics/,
+# and whether query responses include per-stage timings by default (requests can ask with "timings").
+METRICS_ENABLED = _env("METRICS_ENABLED", "true").lower() == "true"
+AGENT_RESPONSE_TIMINGS = _env("AGENT_RESPONSE_TIMINGS", "false").lower() == "true"
+# Query responses: default verbosity (answer | sources | full; requests may pass "verbosity" or "fields"),
+# JSON encoder (auto uses orjson when installed), and gzip/brotli compression negotiated on Accept-Encoding
+# for bodies of at least AGENT_COMPRESS_MIN_BYTES.
+AGENT_RESPONSE_VERBOSITY = _env("AGENT_RESPONSE_VERBOSITY", "full").lower()
+AGENT_JSON_ENCODER = _env("AGENT_JSON_ENCODER", "auto").lower()
+AGENT_RESPONSE_COMPRESSION = _env("AGENT_RESPONSE_COMPRESSION", "true").lower() == "true"
+AGENT_COMPRESS_MIN_BYTES = int(_env("AGENT_COMPRESS_MIN_BYTES", "1024"))
+AGENT_GZIP_LEVEL = int(_env("AGENT_GZIP_LEVEL", "5"))
+AGENT_BROTLI_QUALITY = int(_env("AGENT_BROTLI_QUALITY", "4"))
+# Tool calls requested in one LLM turn run concurrently: max parallel calls per turn, per-call timeout (seconds,
+# from when the handler starts) and threads of the tool pool shared by all requests (speculative searches get their own).
+AGENT_TOOL_CONCURRENCY = int(_env("AGENT_TOOL_CONCURRENCY", "4"))
+AGENT_TOOL_TIMEOUT = float(_env("AGENT_TOOL_TIMEOUT", "20"))
+AGENT_TOOL_WORKERS = int(_env("AGENT_TOOL_WORKERS", "32"))
+# Batch endpoint: max queries per request and agent runs in flight per batch (requests may ask for fewer).
+AGENT_BATCH_MAX_QUERIES = int(_env("AGENT_BATCH_MAX_QUERIES", "100"))
+AGENT_BATCH_CONCURRENCY = int(_env("AGENT_BATCH_CONCURRENCY", "4"))
+# Admission control for the query/stream/async endpoints (per process): agent runs in flight (0 disables),
+# requests waiting for a slot beyond that (more get 429 + Retry-After), and max seconds one may wait.
+AGENT_MAX_IN_FLIGHT = int(_env("AGENT_MAX_IN_FLIGHT", "32"))
+AGENT_MAX_QUEUE = int(_env("AGENT_MAX_QUEUE", "64"))
+AGENT_QUEUE_TIMEOUT = float(_env("AGENT_QUEUE_TIMEOUT", "10"))
+# Per-request deadline in seconds from arrival (0 = none); LLM, search and tool calls stop when it passes
+# and the request gets 504. Requests may ask for a shorter one with "timeout".
+AGENT_REQUEST_TIMEOUT = float(_env("AGENT_REQUEST_TIMEOUT", "60"))
+# Speculative web search: start web_search for the user query during the first LLM pass and reuse it
+# when the model asks for a search whose query has at least this token (Jaccard) similarity.
+AGENT_SPECULATIVE_SEARCH = _env("AGENT_SPECULATIVE_SEARCH", "false").lower() == "true"
+AGENT_SPECULATION_SIMILARITY = float(_env("AGENT_SPECULATION_SIMILARITY", "0.6"))
+# A single PDF or a directory of PDFs (searched recursively).
 RAG_PDF_PATH = _env("RAG_PDF_PATH", str(BASE_DIR / "rag" / "crypto.pdf"))
+# Per-document caps; 0 disables the limit.
 RAG_MAX_CHUNKS = int(_env("RAG_MAX_CHUNKS", "64"))
 # Optional: use LlamaParse instead of PyPDF2 for PDF extraction when API key is provided.
 LLAMA_PARSE_API_KEY = _env("LLAMA_PARSE_API_KEY")
-RAG_CACHE_PATH = _env("RAG_CACHE_PATH", str(BASE_DIR / "rag" / "cache.json"))
+# Binary mmap index by default; a path ending in .json keeps the portable JSON format.
+RAG_CACHE_PATH = _env("RAG_CACHE_PATH", str(BASE_DIR / "rag" / "index.bin"))
 RAG_MAX_PAGES = int(_env("RAG_MAX_PAGES", "10"))
+# Chunking: words per chunk, words shared by consecutive chunks, and whether chunks may cross page breaks.
+RAG_CHUNK_SIZE = int(_env("RAG_CHUNK_SIZE", "900"))
+RAG_CHUNK_OVERLAP = int(_env("RAG_CHUNK_OVERLAP", "100"))
+RAG_CHUNK_SPAN_PAGES = _env("RAG_CHUNK_SPAN_PAGES", "true").lower() == "true"
+# Ranking for the sparse vector store: "tfidf" (cosine), "bm25" or "keyword" (query-term overlap).
+RAG_SCORING = _env("RAG_SCORING", "tfidf").lower()
+# Scoring backend: "auto" (NumPy/SciPy when installed; without SciPy only small indexes), "python" or "numpy".
+RAG_BACKEND = _env("RAG_BACKEND", "auto").lower()
+# PDF ingestion: worker processes (1 = in-process, the default; 0 = one per CPU, worth it for large
+# corpora), pages per extraction task, and max outstanding tasks (0 = 2x workers) to bound memory.
+RAG_INGEST_WORKERS = int(_env("RAG_INGEST_WORKERS", "1"))
+RAG_INGEST_PAGES_PER_TASK = int(_env("RAG_INGEST_PAGES_PER_TASK", "8"))
+RAG_INGEST_MAX_IN_FLIGHT = int(_env("RAG_INGEST_MAX_IN_FLIGHT", "0"))
+# In-process LRU cache for RagPipeline.search results (0 entries disables; TTL in seconds).
+RAG_QUERY_CACHE_SIZE = int(_env("RAG_QUERY_CACHE_SIZE", "1024"))
+RAG_QUERY_CACHE_TTL = float(_env("RAG_QUERY_CACHE_TTL", "300"))
+# Approximate search (random-projection LSH): hash tables (0 disables), signature bits per table,
+# max candidates re-ranked exactly, extra buckets probed per table, and the corpus size (chunks) from which it kicks in.
+RAG_ANN_TABLES = int(_env("RAG_ANN_TABLES", "0"))
+RAG_ANN_BITS = int(_env("RAG_ANN_BITS", "12"))
+RAG_ANN_CANDIDATES = int(_env("RAG_ANN_CANDIDATES", "1000"))
+RAG_ANN_PROBES = int(_env("RAG_ANN_PROBES", "4"))
+RAG_ANN_MIN_DOCS = int(_env("RAG_ANN_MIN_DOCS", "5000"))
+# Prompt context packing: token budget for RAG context (0 = unlimited), chunks kept, hits retrieved
+# before merging/MMR, MMR relevance weight (1 = rank only), and token estimator (chars, words or tiktoken).
+RAG_CONTEXT_TOKEN_BUDGET = int(_env("RAG_CONTEXT_TOKEN_BUDGET", "2000"))
+RAG_CONTEXT_MAX_CHUNKS = int(_env("RAG_CONTEXT_MAX_CHUNKS", "3"))
+RAG_CONTEXT_CANDIDATES = int(_env("RAG_CONTEXT_CANDIDATES", "6"))
+RAG_CONTEXT_MMR_LAMBDA = float(_env("RAG_CONTEXT_MMR_LAMBDA", "0.7"))
+RAG_CONTEXT_TOKEN_ESTIMATOR = _env("RAG_CONTEXT_TOKEN_ESTIMATOR", "chars").lower()
@@ -0,0 +1,238 @@
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterator, Optional
+
+from django.conf import settings
+
+from .deadline import remaining
+from .metrics import shared_metrics
+
+# Bounds of the Retry-After estimate, in seconds.
+_RETRY_AFTER_MIN = 1
+_RETRY_AFTER_MAX = 60
+# Weight of the newest run in the mean service time behind Retry-After.
+_SERVICE_EWMA_ALPHA = 0.2
+
+
+class Overloaded(Exception):
+    """A request was shed: the wait queue was full ("queue_full") or it waited too long ("queue_timeout")."""
+
+    def __init__(self, reason: str, retry_after: int) -> None:
+        super().__init__(f"Server overloaded ({reason}); retry after {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionTicket:
+    """An admitted request's slot; `release()` (idempotent) hands it to the next waiter."""
+
+    __slots__ = ("_controller", "admitted", "waited", "_released")
+
+    def __init__(self, controller: Optional["AdmissionController"], waited: float) -> None:
+        self._controller = controller
+        self.admitted = time.perf_counter()
+        self.waited = waited
+        self._released = False
+
+    def release(self) -> None:
+        if self._released:
+            return
+        self._released = True
+        if self._controller is not None:
+            self._controller._release(time.perf_counter() - self.admitted)
+
+
+class _Waiter:
+    __slots__ = ("wake", "granted")
+
+    def __init__(self, wake: Callable[[], None]) -> None:
+        self.wake = wake
+        self.granted = False
+
+
+class AdmissionController:
+    """
+    Per-process admission control for agent runs.
+    - At most `max_in_flight` requests run at once; up to `max_queue` more wait, first come first served.
+    - A request finding the queue full is shed at once (`Overloaded`, reason "queue_full"); one still
+      waiting after `queue_timeout` seconds (or once its deadline passed) is shed with "queue_timeout".
+    - `Overloaded.retry_after` estimates when a slot frees up, from the queue length and the mean run time.
+    - `slot()` for threads, `aslot()` for asyncio tasks (the event loop is never blocked); they share the limit.
+    - `max_in_flight=0` disables admission control (every request is admitted at once).
+    In-flight count, queue depth, queue wait and sheds go to the metrics registry.
+    """
+
+    def __init__(self, max_in_flight: int = 32, max_queue: int = 64, queue_timeout: float = 10.0) -> None:
+        self.max_in_flight = max(0, max_in_flight)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self._lock = threading.Lock()
+        self._waiters: Deque[_Waiter] = deque()
+        self._service_seconds = 1.0
+        self.in_flight = 0
+        self.admitted = 0
+        self.shed: Dict[str, int] = {"queue_full": 0, "queue_timeout": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_in_flight > 0
+
+    def acquire(self) -> AdmissionTicket:
+        """Take a slot, waiting in the queue if needed; raises Overloaded when shed."""
+        if not self.enabled:
+            return AdmissionTicket(None, 0.0)
+        started = time.perf_counter()
+        event = threading.Event()
+        waiter = self._enqueue(event.set)
+        if waiter is not None:
+            event.wait(self._wait_budget())
+            self._dequeue(waiter)
+        return self._admit(started)
+
+    async def aacquire(self) -> AdmissionTicket:
+        """`acquire` for asyncio tasks: waits on a future of the running loop."""
+        if not self.enabled:
+            return AdmissionTicket(None, 0.0)
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        future: "asyncio.Future[None]" = loop.create_future()
+        waiter = self._enqueue(lambda: loop.call_soon_threadsafe(_resolve, future))
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(future, self._wait_budget())
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                with self._lock:
+                    granted = waiter.granted
+                    if not granted:
+                        self._waiters.remove(waiter)
+                        self._gauges()
+                if granted:
+                    self._release(0.0)
+                raise
+            self._dequeue(waiter)
+        return self._admit(started)
+
+    @contextmanager
+    def slot(self) -> Iterator[AdmissionTicket]:
+        ticket = self.acquire()
+        try:
+            yield ticket
+        finally:
+            ticket.release()
+
+    @asynccontextmanager
+    async def aslot(self) -> AsyncIterator[AdmissionTicket]:
+        ticket = await self.aacquire()
+        try:
+            yield ticket
+        finally:
+            ticket.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_in_flight": self.max_in_flight,
+                "max_queue": self.max_queue,
+                "in_flight": self.in_flight,
+                "queued": len(self._waiters),
+                "admitted": self.admitted,
+                "shed": dict(self.shed),
+                "mean_run_seconds": round(self._service_seconds, 3),
+            }
+
+    def _enqueue(self, wake: Callable[[], None]) -> Optional[_Waiter]:
+        """Take a free slot (returns None) or join the queue (returns the waiter); raises Overloaded if full."""
+        with self._lock:
+            if self.in_flight < self.max_in_flight and not self._waiters:
+                self.in_flight += 1
+                self._gauges()
+                return None
+            if len(self._waiters) >= self.max_queue:
+                raise self._shed("queue_full")
+            waiter = _Waiter(wake)
+            self._waiters.append(waiter)
+            self._gauges()
+            return waiter
+
+    def _dequeue(self, waiter: _Waiter) -> None:
+        """After waiting: keep the slot handed over by `_release`, or leave the queue and be shed."""
+        with self._lock:
+            if waiter.granted:
+                return
+            self._waiters.remove(waiter)
+            self._gauges()
+            raise self._shed("queue_timeout")
+
+    def _admit(self, started: float) -> AdmissionTicket:
+        waited = time.perf_counter() - started
+        with self._lock:
+            self.admitted += 1
+        shared_metrics().observe("agent_admission_wait_seconds", waited)
+        return AdmissionTicket(self, waited)
+
+    def _release(self, run_seconds: float) -> None:
+        with self._lock:
+            if run_seconds > 0.0:
+                self._service_seconds += _SERVICE_EWMA_ALPHA * (run_seconds - self._service_seconds)
+            # The slot goes straight to the oldest waiter, so a newcomer cannot overtake the queue.
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                waiter.granted = True
+                try:
+                    waiter.wake()
+                except RuntimeError:  # its event loop is closed; the waiter is gone
+                    continue
+                break
+            else:
+                self.in_flight -= 1
+            self._gauges()
+
+    def _wait_budget(self) -> float:
+        left = remaining()
+        return self.queue_timeout if left is None else max(0.0, min(self.queue_timeout, left))
+
+    def _shed(self, reason: str) -> Overloaded:
+        """Count a rejection (caller holds the lock) and build its error."""
+        self.shed[reason] += 1
+        shared_metrics().inc("agent_admission_shed_total", reason=reason)
+        backlog = len(self._waiters) + 1
+        estimate = math.ceil(self._service_seconds * backlog / self.max_in_flight)
+        return Overloaded(reason, max(_RETRY_AFTER_MIN, min(_RETRY_AFTER_MAX, estimate)))
+
+    def _gauges(self) -> None:
+        registry = shared_metrics()
+        registry.set("agent_admission_in_flight", self.in_flight)
+        registry.set("agent_admission_queue_depth", len(self._waiters))
+
+
+def _resolve(future: "asyncio.Future[None]") -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+def build_default_admission() -> AdmissionController:
+    return AdmissionController(
+        max_in_flight=settings.AGENT_MAX_IN_FLIGHT,
+        max_queue=settings.AGENT_MAX_QUEUE,
+        queue_timeout=settings.AGENT_QUEUE_TIMEOUT,
+    )
+
+
+_SHARED: Optional[AdmissionController] = None
+_SHARED_LOCK = threading.Lock()
+
+
+def shared_admission() -> AdmissionController:
+    """Process-wide controller shared by the query, stream, async and batch endpoints."""
+    global _SHARED
+    if _SHARED is None:
+        with _SHARED_LOCK:
+            if _SHARED is None:
+                _SHARED = build_default_admission()
+    return _SHARED
@@ -1,8 +1,21 @@
+import asyncio
+import contextvars
 import json
-from typing import Any, Dict, List, Optional
+import math
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+from contextlib import ExitStack
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple
 
-from .databricks_client import DatabricksLLMClient
+from .admission import AdmissionController
+from .context import ContextPacker
+from .databricks_client import AsyncDatabricksLLMClient, DatabricksLLMClient
+from .deadline import Deadline, bounded_timeout, check_deadline, deadline_scope, remaining
+from .llm_cache import CachedLLMClient
+from .metrics import span
 from .rag import RagPipeline
+from .tokenizer import tokenize
 from .tools import ToolRegistry
 
 
@@ -12,85 +25,509 @@ class Agent:
     - Pulls context from a local RAG pipeline.
     - Calls a Databricks-hosted LLM.
     - Executes locally registered tools/functions on demand.
+    - Can stream the answer token by token (`run_stream`).
+    - Packs retrieved chunks into a token budget (ContextPacker) before prompting.
+    - Runs the tool calls of one LLM turn concurrently (at most `tool_concurrency` of the turn's calls at
+      a time, on a pool of `tool_workers` threads shared by all requests; each call gets `tool_timeout`
+      seconds from when its handler starts) and replies with them in the requested order.
+    - Stops at the current request deadline (agents/deadline.py): LLM and search calls get at most the
+      time left, and tool calls still running when it passes are abandoned.
+    - Optionally starts `web_search` for the user query while the first LLM pass runs
+      (`speculative_search`); a sufficiently similar search request from the model reuses it.
+    - Answers batches of independent queries with shared retrieval and bounded concurrency (`run_batch`).
     """
 
-    def __init__(self, llm: DatabricksLLMClient, rag: RagPipeline, tools: ToolRegistry) -> None:
+    def __init__(
+        self,
+        llm: DatabricksLLMClient,
+        rag: RagPipeline,
+        tools: ToolRegistry,
+        tool_concurrency: int = 4,
+        tool_timeout: float = 20.0,
+        packer: Optional[ContextPacker] = None,
+        speculative_search: bool = False,
+        speculation_similarity: float = 0.6,
+        speculation_limit: int = 3,
+        tool_workers: int = 32,
+    ) -> None:
         self.llm = llm
         self.rag = rag
         self.tools = tools
+        self.packer = packer if packer is not None else ContextPacker()
+        self.tool_concurrency = max(1, tool_concurrency)
+        self.tool_timeout = tool_timeout
+        self.tool_workers = max(self.tool_concurrency, tool_workers)
+        self.speculative_search = speculative_search
+        self.speculation_similarity = speculation_similarity
+        self.speculation_limit = speculation_limit
+        self._tool_pool: Optional[ThreadPoolExecutor] = None
+        self._speculation_pool: Optional[ThreadPoolExecutor] = None
+        self._tool_pool_lock = threading.Lock()
+        self._speculation_lock = threading.Lock()
+        self._speculation_totals = {"started": 0, "used": 0, "saved_seconds": 0.0}
 
     def run(
         self,
         query: str,
         allow_search: bool = True,
         conversation_history: Optional[List[Dict[str, str]]] = None,
+        cache_mode: Optional[str] = None,
+        speculative_search: Optional[bool] = None,
+        retrieved: Optional[List[Dict[str, Any]]] = None,
     ) -> Dict[str, Any]:
+        """`retrieved`: RAG hits already fetched for `query` (e.g. by a batch `search_many`), skipping the search."""
+        trace: List[Dict[str, Any]] = []
+        context_chunks, messages = self._prepare(query, conversation_history, trace, retrieved)
+        speculation = self._speculate(query, allow_search, speculative_search)
+
+        with span("llm_first_pass") as timer:
+            first = self.llm.chat(messages=messages, tools=self.tools.schemas(), **self._llm_kwargs(cache_mode))
+        trace.append(self._llm_trace("llm_first_pass", first, timer.elapsed))
+
+        tool_calls = first.get("tool_calls") or []
+        if tool_calls:
+            with span("tools"):
+                self._run_tool_calls(tool_calls, allow_search, messages, trace, speculation)
+            self._finish_speculation(speculation, trace)
+            with span("llm_final") as timer:
+                final = self.llm.chat(messages=messages, tools=self.tools.schemas(), **self._llm_kwargs(cache_mode))
+            trace.append(self._llm_trace("llm_final", final, timer.elapsed))
+            answer = final.get("message", "")
+        else:
+            self._finish_speculation(speculation, trace)
+            answer = first.get("message", "")
+
+        return self._result(answer, trace, context_chunks)
+
+    def run_stream(
+        self,
+        query: str,
+        allow_search: bool = True,
+        conversation_history: Optional[List[Dict[str, str]]] = None,
+        cache_mode: Optional[str] = None,
+        speculative_search: Optional[bool] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Generator variant of `run` built on `llm.chat_stream`. Yields events:
+        - {"event": "token", "data": str}: answer text as it is generated (model-written
+          "Sources:" lines are held back; the computed sources line is streamed at the end).
+        - {"event": "tool_call", "data": {...}}: each executed tool call with its result.
+        - {"event": "done", "data": {...}}: the same payload as `run`, plus `sources` and
+          `timings` (time to first token and total, in ms).
+        """
+        started = time.perf_counter()
+        ttft: Optional[float] = None
         trace: List[Dict[str, Any]] = []
+        context_chunks, messages = self._prepare(query, conversation_history, trace)
+        speculation = self._speculate(query, allow_search, speculative_search)
+        sources_filter = _SourcesLineFilter()
 
-        context_chunks = self.rag.search(query, k=3)
+        passes = ("llm_first_pass", "llm_final")
+        answer = ""
+        for pass_name in passes:
+            result: Dict[str, Any] = {}
+            # The span includes the time the consumer takes to forward each token.
+            with span(pass_name) as timer:
+                stream = self.llm.chat_stream(
+                    messages=messages, tools=self.tools.schemas(), **self._llm_kwargs(cache_mode)
+                )
+                for event in stream:
+                    check_deadline(pass_name)  # read timeouts only bound the gaps between chunks
+                    if event["type"] == "delta":
+                        text = sources_filter.feed(event["content"])
+                        if text:
+                            if ttft is None:
+                                ttft = time.perf_counter() - started
+                            yield {"event": "token", "data": text}
+                    elif event["type"] == "done":
+                        result = event
+            llm_ttft = result.get("ttft")
+            trace.append(
+                {
+                    **self._llm_trace(pass_name, result, timer.elapsed),
+                    "ttft_ms": round(1000 * llm_ttft, 1) if llm_ttft is not None else None,
+                }
+            )
+            answer = result.get("message", "")
+            tool_calls = result.get("tool_calls") or []
+            if pass_name == passes[-1] or not tool_calls:
+                break
+            with span("tools"):
+                executed = self._run_tool_calls(tool_calls, allow_search, messages, trace, speculation)
+            self._finish_speculation(speculation, trace)
+            for call in executed:
+                yield {"event": "tool_call", "data": call}
+        self._finish_speculation(speculation, trace)
+
+        payload = self._result(answer, trace, context_chunks)
+        sources_line = self._sources_line(context_chunks)
+        tail = sources_filter.flush() + ("\n\n" if sources_filter.emitted else "") + sources_line
+        if ttft is None:
+            ttft = time.perf_counter() - started
+        yield {"event": "token", "data": tail}
+        payload["sources"] = sorted({c.get("source", "unknown") for c in context_chunks})
+        payload["timings"] = {
+            "ttft_ms": round(1000 * ttft, 1),
+            "total_ms": round(1000 * (time.perf_counter() - started), 1),
+        }
+        yield {"event": "done", "data": payload}
+
+    def run_batch(
+        self,
+        queries: Sequence[Any],
+        allow_search: bool = True,
+        concurrency: int = 4,
+        cache_mode: Optional[str] = None,
+        admission: Optional[AdmissionController] = None,
+        item_timeout: float = 0.0,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Answer independent queries (no conversation history), yielding items in completion order:
+        {"index", "query", "result"} or {"index", "query", "error"} for every input position.
+        - Identical queries (after whitespace normalisation) run once; each duplicate gets the result.
+        - Retrieval for all distinct queries is one `rag.search_many` scoring pass.
+        - At most `concurrency` agent runs are in flight; one failing item does not stop the others.
+        - With `admission`, each run holds one of its slots; a shed run becomes an `Overloaded` error item.
+        - With `item_timeout` > 0, each run gets its own deadline of that many seconds, starting once it is
+          admitted, so a long batch is not cut short by one request's budget.
+        - Runs execute in copies of the caller's context, so its timings (and deadline, if any) apply to them.
+        Closing the iterator early cancels the runs that have not started.
+        """
+        positions: Dict[str, List[int]] = {}
+        for idx, query in enumerate(queries):
+            if not isinstance(query, str) or not query.strip():
+                yield {"index": idx, "query": query, "error": "Query must be a non-empty string"}
+                continue
+            positions.setdefault(" ".join(query.split()), []).append(idx)
+        if not positions:
+            return
+        distinct = list(positions)
+        try:
+            retrieved = self.rag.search_many(distinct, k=self.packer.candidates)
+        except Exception as exc:
+            for query in distinct:
+                for idx in positions[query]:
+                    yield {"index": idx, "query": queries[idx], "error": f"Retrieval failed: {exc}"}
+            return
+
+        pool = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="agent-batch")
+        try:
+            futures = {
+                pool.submit(
+                    contextvars.copy_context().run,
+                    self._run_item,
+                    query,
+                    allow_search,
+                    cache_mode,
+                    hits,
+                    admission,
+                    item_timeout,
+                ): query
+                for query, hits in zip(distinct, retrieved)
+            }
+            for future in as_completed(futures):
+                query = futures[future]
+                try:
+                    outcome: Dict[str, Any] = {"result": future.result()}
+                except Exception as exc:
+                    outcome = {"error": f"{exc.__class__.__name__}: {exc}"}
+                for idx in positions[query]:
+                    yield {"index": idx, "query": queries[idx], **outcome}
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _run_item(
+        self,
+        query: str,
+        allow_search: bool,
+        cache_mode: Optional[str],
+        retrieved: List[Dict[str, Any]],
+        admission: Optional[AdmissionController],
+        item_timeout: float,
+    ) -> Dict[str, Any]:
+        """One batch run: take an admission slot, then run under the item's own deadline."""
+        with ExitStack() as stack:
+            if admission is not None:
+                stack.enter_context(admission.slot())
+            if item_timeout > 0:
+                stack.enter_context(deadline_scope(Deadline(item_timeout)))
+            return self.run(query, allow_search=allow_search, cache_mode=cache_mode, retrieved=retrieved)
+
+    def _prepare(
+        self,
+        query: str,
+        conversation_history: Optional[List[Dict[str, str]]],
+        trace: List[Dict[str, Any]],
+        retrieved: Optional[List[Dict[str, Any]]] = None,
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Retrieve RAG context, pack it into the token budget and build the initial message list."""
+        candidates = retrieved if retrieved is not None else self.rag.search(query, k=self.packer.candidates)
+        with span("context_pack"):
+            context_chunks, pack_stats = self.packer.pack(candidates)
         system_prompt = self._system_prompt()
-        user_content = self._format_user_message(query, context_chunks)
 
         messages: List[Dict[str, Any]] = [
             {"role": "system", "content": system_prompt},
         ]
         if conversation_history:
             messages.extend(conversation_history)
+        prompt_tokens = sum(self.packer.count_tokens(m.get("content") or "") for m in messages)
+        # "before" is the unpacked prompt: the top `max_chunks` hits pasted verbatim.
+        unpacked = self._format_user_message(query, candidates[: self.packer.max_chunks])
+        user_content = self._format_user_message(query, context_chunks)
         messages.append({"role": "user", "content": user_content})
+        trace.append(
+            {
+                "event": "context_pack",
+                **pack_stats,
+                "prompt_tokens_before": prompt_tokens + self.packer.count_tokens(unpacked),
+                "prompt_tokens_after": prompt_tokens + self.packer.count_tokens(user_content),
+            }
+        )
+        return context_chunks, messages
 
-        first = self.llm.chat(messages=messages, tools=self.tools.schemas())
-        trace.append({"event": "llm_first_pass", "data": first["raw"]})
+    def _run_tool_calls(
+        self,
+        tool_calls: List[Dict[str, Any]],
+        allow_search: bool,
+        messages: List[Dict[str, Any]],
+        trace: List[Dict[str, Any]],
+        speculation: Optional["_SearchSpeculation"] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Execute requested tools concurrently, appending assistant/tool messages; returns the executed calls.
+        A web_search matching `speculation` takes over its already running future instead of searching again.
+        """
+        calls = [parsed for parsed in (self._parse_tool_call(call, allow_search) for call in tool_calls) if parsed]
+        if not calls:
+            return []
+        budget = bounded_timeout(self.tool_timeout, "tools")
+        left = remaining()
+        submitted = time.perf_counter()
+        cutoff = None if left is None else submitted + left
+        pool = self._tool_executor()
+        # The pool is shared by every request; this turn runs at most `tool_concurrency` handlers at once.
+        slots = threading.Semaphore(self.tool_concurrency)
+        slots_lock = threading.Lock()
+        holding: Set[int] = set()
+        turn_over = threading.Event()
+        started: Dict[int, float] = {}
 
-        tool_calls = first.get("tool_calls") or []
-        if tool_calls:
-            for call in tool_calls:
-                tool_name = call.get("function", {}).get("name") or call.get("name")
-                if not tool_name:
-                    continue
-                if tool_name == "web_search" and not allow_search:
-                    continue
-                args_raw = call.get("function", {}).get("arguments") or call.get("arguments") or "{}"
-                try:
-                    parsed_args: Dict[str, Any] = json.loads(args_raw) if isinstance(args_raw, str) else args_raw
-                except json.JSONDecodeError:
-                    parsed_args = {}
+        def free(idx: int) -> None:
+            """Give back the turn slot of call `idx` (once; a timed-out handler may still be running)."""
+            with slots_lock:
+                if idx not in holding:
+                    return
+                holding.discard(idx)
+            slots.release()
+
+        def invoke(idx: int, tool_name: str, parsed_args: Dict[str, Any]) -> str:
+            slots.acquire()
+            with slots_lock:
+                holding.add(idx)
+            if turn_over.is_set():  # the turn gave up on this call while it was queued
+                free(idx)
+                return ""
+            started[idx] = time.perf_counter()
+            try:
+                return self.tools.call(tool_name, parsed_args)
+            finally:
+                free(idx)
+
+        futures: List["Future[str]"] = []
+        for idx, (name, args, _) in enumerate(calls):
+            if speculation is not None and speculation.claim(name, args):
+                started[idx] = speculation.started
+                futures.append(speculation.future)
+            else:
+                # Run in a copy of the caller's context so the tool's spans count toward this request.
+                futures.append(pool.submit(contextvars.copy_context().run, invoke, idx, name, args))
+        outcomes: List[Optional[Tuple[str, float]]] = [None] * len(calls)
+        pending = set(range(len(calls)))
+        while pending:
+            now = time.perf_counter()
+            # A call's budget starts with its handler; a queued call only waits for the request deadline.
+            deadlines = {idx: started[idx] + budget for idx in pending if idx in started}
+            if cutoff is not None:
+                deadlines = {idx: min(deadlines.get(idx, cutoff), cutoff) for idx in pending}
+            for idx in [idx for idx in pending if deadlines.get(idx, math.inf) <= now]:
+                # A running handler cannot be interrupted; its result is discarded and its slot handed on.
+                futures[idx].cancel()
+                free(idx)
+                state = "running" if idx in started else "queued"
+                waited = now - started.get(idx, submitted)
+                outcomes[idx] = (f"Tool {calls[idx][0]} timed out after {waited:.3g}s ({state})", waited)
+                pending.discard(idx)
+            if not pending:
+                break
+            # Wake up at least every `budget` seconds to pick up calls that started in the meantime.
+            timeout = max(0.0, min([*(deadlines[idx] for idx in pending if idx in deadlines), now + budget]) - now)
+            done, _ = wait([futures[idx] for idx in pending], timeout=timeout, return_when=FIRST_COMPLETED)
+            finished = time.perf_counter()
+            for idx in [idx for idx in pending if futures[idx] in done]:
                 try:
-                    result = self.tools.call(tool_name, parsed_args)
+                    result = futures[idx].result()
                 except Exception as exc:  # pragma: no cover - defensive
-                    result = f"Tool {tool_name} failed: {exc}"
+                    result = f"Tool {calls[idx][0]} failed: {exc}"
+                outcomes[idx] = (result, finished - started.get(idx, submitted))
+                pending.discard(idx)
+        turn_over.set()
+        return self._record_tool_calls(calls, outcomes, messages, trace)
 
-                trace.append({"event": "tool_call", "name": tool_name, "arguments": parsed_args, "result": result})
+    def _speculate(
+        self, query: str, allow_search: bool, speculative_search: Optional[bool]
+    ) -> Optional["_SearchSpeculation"]:
+        """
+        Start web_search for the user query, if speculation is on for this run. It runs on its own pool, so
+        speculative searches never hold up the tool calls of other requests.
+        """
+        enabled = self.speculative_search if speculative_search is None else speculative_search
+        if not enabled or not allow_search or "web_search" not in self.tools.names():
+            return None
+        speculation = _SearchSpeculation(query, self.speculation_limit, self.speculation_similarity)
+        args = {"query": query, "limit": self.speculation_limit}
+        speculation.future = self._speculation_executor().submit(
+            contextvars.copy_context().run, speculation.run, lambda: self.tools.call("web_search", args)
+        )
+        return self._track_speculation(speculation)
 
-                messages.append(
-                    {
-                        "role": "assistant",
-                        "tool_calls": [
-                            {
-                                "id": call.get("id") or tool_name,
-                                "type": "function",
-                                "function": {"name": tool_name, "arguments": json.dumps(parsed_args)},
-                            }
-                        ],
-                        "content": None,
-                    }
+    def _track_speculation(self, speculation: "_SearchSpeculation") -> "_SearchSpeculation":
+        with self._speculation_lock:
+            self._speculation_totals["started"] += 1
+        return speculation
+
+    def _finish_speculation(self, speculation: Optional["_SearchSpeculation"], trace: List[Dict[str, Any]]) -> None:
+        """Record how the speculative search was used (once per run); an unused one is cancelled or ignored."""
+        if speculation is None or speculation.finished:
+            return
+        speculation.finished = True
+        if speculation.claimed_at is None:
+            speculation.future.cancel()
+        saved = speculation.saved_seconds()
+        with self._speculation_lock:
+            totals = self._speculation_totals
+            if speculation.claimed_at is not None:
+                totals["used"] += 1
+                totals["saved_seconds"] += saved
+            hit_rate = totals["used"] / totals["started"] if totals["started"] else 0.0
+        trace.append(
+            {
+                "event": "speculative_search",
+                "query": speculation.query,
+                "used": speculation.claimed_at is not None,
+                "similarity": round(speculation.similarity, 3) if speculation.similarity is not None else None,
+                "saved_ms": round(1000 * saved, 1),
+                "hit_rate": round(hit_rate, 4),
+            }
+        )
+
+    def speculation_stats(self) -> Dict[str, Any]:
+        with self._speculation_lock:
+            totals = dict(self._speculation_totals)
+        return {
+            "started": totals["started"],
+            "used": totals["used"],
+            "hit_rate": round(totals["used"] / totals["started"], 4) if totals["started"] else 0.0,
+            "saved_ms": round(1000 * totals["saved_seconds"], 1),
+        }
+
+    def _tool_executor(self) -> ThreadPoolExecutor:
+        with self._tool_pool_lock:
+            if self._tool_pool is None:
+                self._tool_pool = ThreadPoolExecutor(max_workers=self.tool_workers, thread_name_prefix="agent-tool")
+            return self._tool_pool
+
+    def _speculation_executor(self) -> ThreadPoolExecutor:
+        with self._tool_pool_lock:
+            if self._speculation_pool is None:
+                self._speculation_pool = ThreadPoolExecutor(
+                    max_workers=self.tool_workers, thread_name_prefix="agent-speculation"
                 )
-                messages.append(
+            return self._speculation_pool
+
+    @staticmethod
+    def _parse_tool_call(call: Dict[str, Any], allow_search: bool) -> Optional[Tuple[str, Dict[str, Any], str]]:
+        """(tool name, parsed arguments, call id) for a requested call, or None if it should be skipped."""
+        tool_name = call.get("function", {}).get("name") or call.get("name")
+        if not tool_name:
+            return None
+        if tool_name == "web_search" and not allow_search:
+            return None
+        args_raw = call.get("function", {}).get("arguments") or call.get("arguments") or "{}"
+        try:
+            parsed_args: Dict[str, Any] = json.loads(args_raw) if isinstance(args_raw, str) else args_raw
+        except json.JSONDecodeError:
+            parsed_args = {}
+        return tool_name, parsed_args, call.get("id") or tool_name
+
+    @staticmethod
+    def _record_tool_calls(
+        calls: List[Tuple[str, Dict[str, Any], str]],
+        outcomes: Sequence[Optional[Tuple[str, float]]],
+        messages: List[Dict[str, Any]],
+        trace: List[Dict[str, Any]],
+    ) -> List[Dict[str, Any]]:
+        """
+        Append one assistant message listing every call, then one tool message per call,
+        both in the order the model requested them (OpenAI-compatible parallel tool calls).
+        """
+        messages.append(
+            {
+                "role": "assistant",
+                "tool_calls": [
                     {
-                        "role": "tool",
-                        "tool_call_id": call.get("id") or tool_name,
-                        "name": tool_name,
-                        "content": result,
+                        "id": call_id,
+                        "type": "function",
+                        "function": {"name": tool_name, "arguments": json.dumps(parsed_args)},
                     }
-                )
+                    for tool_name, parsed_args, call_id in calls
+                ],
+                "content": None,
+            }
+        )
+        executed: List[Dict[str, Any]] = []
+        for (tool_name, parsed_args, call_id), outcome in zip(calls, outcomes):
+            result, elapsed = outcome if outcome is not None else ("", 0.0)
+            entry = {
+                "event": "tool_call",
+                "name": tool_name,
+                "arguments": parsed_args,
+                "result": result,
+                "elapsed_ms": round(1000 * elapsed, 1),
+            }
+            trace.append(entry)
+            executed.append(entry)
+            messages.append(
+                {
+                    "role": "tool",
+                    "tool_call_id": call_id,
+                    "name": tool_name,
+                    "content": result,
+                }
+            )
+        return executed
 
-            final = self.llm.chat(messages=messages, tools=self.tools.schemas())
-            trace.append({"event": "llm_final", "data": final["raw"]})
-            answer = final.get("message", "")
-        else:
-            answer = first.get("message", "")
+    def _llm_kwargs(self, cache_mode: Optional[str]) -> Dict[str, Any]:
+        """Extra arguments for `llm.chat` / `chat_stream`: the per-request cache mode, if the LLM is cached."""
+        if cache_mode and isinstance(self.llm, CachedLLMClient):
+            return {"cache_mode": cache_mode}
+        return {}
 
-        sources = sorted({c.get("source", "unknown") for c in context_chunks})
-        sources_line = "Sources: none" if not sources else "Sources: " + "; ".join(sources)
+    @staticmethod
+    def _llm_trace(event: str, result: Dict[str, Any], elapsed: Optional[float] = None) -> Dict[str, Any]:
+        entry: Dict[str, Any] = {"event": event, "data": result.get("raw", {})}
+        if elapsed is not None:
+            entry["elapsed_ms"] = round(1000 * elapsed, 1)
+        if result.get("cache"):
+            entry["cache"] = result["cache"]
+        if result.get("route"):
+            entry["route"] = result["route"]
+        return entry
+
+    def _result(self, answer: Any, trace: List[Dict[str, Any]], context_chunks: List[Dict[str, Any]]) -> Dict[str, Any]:
+        if isinstance(self.llm, CachedLLMClient):
+            trace.append(self._cache_summary(trace))
+        sources_line = self._sources_line(context_chunks)
         if isinstance(answer, str):
             # Strip any existing Sources lines to avoid model-invented placeholders.
             filtered_lines = [
@@ -106,6 +543,25 @@ class Agent:
             "context_used": context_chunks,
         }
 
+    def _cache_summary(self, trace: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """LLM cache outcome of this run plus the process-wide hit ratio and saved time (in-process counters only)."""
+        lookups = [entry["cache"] for entry in trace if entry.get("cache")]
+        hits = [info for info in lookups if info.get("status") == "hit"]
+        totals = self.llm.counters()  # type: ignore[union-attr]
+        return {
+            "event": "llm_cache",
+            "calls": len(lookups),
+            "hits": len(hits),
+            "saved_ms": round(sum((info.get("saved_ms", 0.0) for info in hits), 0.0), 1),
+            "hit_ratio": totals["hit_ratio"],
+            "total_saved_ms": totals["saved_ms"],
+        }
+
+    @staticmethod
+    def _sources_line(context_chunks: List[Dict[str, Any]]) -> str:
+        sources = sorted({c.get("source", "unknown") for c in context_chunks})
+        return "Sources: none" if not sources else "Sources: " + "; ".join(sources)
+
     @staticmethod
     def _format_user_message(query: str, context: List[Dict[str, Any]]) -> str:
         if context:
@@ -132,3 +588,232 @@ class Agent:
             "Include a 'Sources:' line at the end listing the tags you used, or 'Sources: none' if nothing was cited. "
             "Return final answers as markdown."
         )
+
+
+class AsyncAgent(Agent):
+    """
+    asyncio variant of Agent for ASGI deployments:
+    - LLM calls await AsyncDatabricksLLMClient, so a slow completion does not hold a worker thread.
+    - Tools run through `ToolRegistry.acall` (native coroutine when registered, else a thread).
+    - RAG retrieval is CPU-bound and runs in a thread so the event loop stays responsive.
+    Prompting, tool-call handling and the result shape are shared with Agent.
+    """
+
+    def __init__(
+        self,
+        llm: AsyncDatabricksLLMClient,
+        rag: RagPipeline,
+        tools: ToolRegistry,
+        tool_concurrency: int = 4,
+        tool_timeout: float = 20.0,
+        packer: Optional[ContextPacker] = None,
+        speculative_search: bool = False,
+        speculation_similarity: float = 0.6,
+        speculation_limit: int = 3,
+    ) -> None:
+        super().__init__(
+            llm,  # type: ignore[arg-type]
+            rag,
+            tools,
+            tool_concurrency,
+            tool_timeout,
+            packer,
+            speculative_search,
+            speculation_similarity,
+            speculation_limit,
+        )
+
+    async def run(  # type: ignore[override]
+        self,
+        query: str,
+        allow_search: bool = True,
+        conversation_history: Optional[List[Dict[str, str]]] = None,
+        cache_mode: Optional[str] = None,
+        speculative_search: Optional[bool] = None,
+        retrieved: Optional[List[Dict[str, Any]]] = None,
+    ) -> Dict[str, Any]:
+        trace: List[Dict[str, Any]] = []
+        context_chunks, messages = await asyncio.to_thread(
+            self._prepare, query, conversation_history, trace, retrieved
+        )
+        speculation = self._speculate_async(query, allow_search, speculative_search)
+
+        with span("llm_first_pass") as timer:
+            first = await self.llm.chat(messages=messages, tools=self.tools.schemas(), **self._llm_kwargs(cache_mode))
+        trace.append(self._llm_trace("llm_first_pass", first, timer.elapsed))
+
+        tool_calls = first.get("tool_calls") or []
+        if tool_calls:
+            with span("tools"):
+                await self._run_tool_calls_async(tool_calls, allow_search, messages, trace, speculation)
+            self._finish_speculation(speculation, trace)
+            with span("llm_final") as timer:
+                final = await self.llm.chat(
+                    messages=messages, tools=self.tools.schemas(), **self._llm_kwargs(cache_mode)
+                )
+            trace.append(self._llm_trace("llm_final", final, timer.elapsed))
+            answer = final.get("message", "")
+        else:
+            self._finish_speculation(speculation, trace)
+            answer = first.get("message", "")
+
+        return self._result(answer, trace, context_chunks)
+
+    async def _run_tool_calls_async(
+        self,
+        tool_calls: List[Dict[str, Any]],
+        allow_search: bool,
+        messages: List[Dict[str, Any]],
+        trace: List[Dict[str, Any]],
+        speculation: Optional["_SearchSpeculation"] = None,
+    ) -> List[Dict[str, Any]]:
+        """Async `_run_tool_calls`: tool calls run as tasks (bounded by a semaphore); timeouts cancel the task."""
+        calls = [parsed for parsed in (self._parse_tool_call(call, allow_search) for call in tool_calls) if parsed]
+        if not calls:
+            return []
+        budget = bounded_timeout(self.tool_timeout, "tools")
+        semaphore = asyncio.Semaphore(self.tool_concurrency)
+
+        async def await_speculation(spec: "_SearchSpeculation") -> Tuple[str, float]:
+            remaining = max(0.0, min(spec.started + self.tool_timeout - time.perf_counter(), budget))
+            try:
+                result = await asyncio.wait_for(asyncio.shield(spec.future), remaining)
+            except asyncio.TimeoutError:
+                spec.future.cancel()
+                result = f"Tool web_search timed out after {budget:.3g}s (running)"
+            except Exception as exc:  # pragma: no cover - defensive
+                result = f"Tool web_search failed: {exc}"
+            return result, time.perf_counter() - spec.started
+
+        async def invoke(tool_name: str, parsed_args: Dict[str, Any]) -> Tuple[str, float]:
+            if speculation is not None and speculation.claim(tool_name, parsed_args):
+                return await await_speculation(speculation)
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    result = await asyncio.wait_for(self.tools.acall(tool_name, parsed_args), budget)
+                except asyncio.TimeoutError:
+                    result = f"Tool {tool_name} timed out after {budget:.3g}s (running)"
+                except Exception as exc:  # pragma: no cover - defensive
+                    result = f"Tool {tool_name} failed: {exc}"
+                return result, time.perf_counter() - started
+
+        outcomes = await asyncio.gather(*(invoke(name, args) for name, args, _ in calls))
+        return self._record_tool_calls(calls, list(outcomes), messages, trace)
+
+    def _speculate_async(
+        self, query: str, allow_search: bool, speculative_search: Optional[bool]
+    ) -> Optional["_SearchSpeculation"]:
+        enabled = self.speculative_search if speculative_search is None else speculative_search
+        if not enabled or not allow_search or "web_search" not in self.tools.names():
+            return None
+        speculation = _SearchSpeculation(query, self.speculation_limit, self.speculation_similarity)
+        args = {"query": query, "limit": self.speculation_limit}
+        speculation.future = asyncio.create_task(speculation.arun(self.tools.acall("web_search", args)))
+        # An unused speculation may fail unobserved; retrieve its exception so asyncio does not log it.
+        speculation.future.add_done_callback(lambda task: task.cancelled() or task.exception())
+        return self._track_speculation(speculation)
+
+
+class _SearchSpeculation:
+    """
+    A web_search started for the user query before the model asked for one.
+    - `claim` hands it to the first web_search call whose query is similar enough (Jaccard similarity
+      of the token sets >= `threshold`) and whose limit it covers.
+    - Saved latency is the part of the search that overlapped the LLM pass: its duration minus
+      however long the claiming call still had to wait for it.
+    `future` runs `run` (concurrent.futures.Future, Agent) or `arun` (asyncio.Task, AsyncAgent).
+    """
+
+    def __init__(self, query: str, limit: int, threshold: float) -> None:
+        self.query = query
+        self.limit = limit
+        self.threshold = threshold
+        self.future: Any = None
+        self.started = time.perf_counter()
+        self.done_at: Optional[float] = None
+        self.claimed_at: Optional[float] = None
+        self.similarity: Optional[float] = None
+        self.finished = False
+        self._terms = set(tokenize(query))
+
+    def run(self, search: Callable[[], str]) -> str:
+        self.started = time.perf_counter()
+        try:
+            return search()
+        finally:
+            self.done_at = time.perf_counter()
+
+    async def arun(self, search: Awaitable[str]) -> str:
+        try:
+            return await search
+        finally:
+            self.done_at = time.perf_counter()
+
+    def claim(self, tool_name: str, args: Dict[str, Any]) -> bool:
+        if tool_name != "web_search" or self.claimed_at is not None:
+            return False
+        terms = set(tokenize(str(args.get("query", ""))))
+        union = self._terms | terms
+        similarity = len(self._terms & terms) / len(union) if union else 0.0
+        self.similarity = max(similarity, self.similarity or 0.0)
+        if similarity < self.threshold or int(args.get("limit", 3)) > self.limit:
+            return False
+        self.claimed_at = time.perf_counter()
+        return True
+
+    def saved_seconds(self) -> float:
+        if self.claimed_at is None or self.done_at is None:
+            return 0.0
+        duration = self.done_at - self.started
+        waited = max(0.0, self.done_at - self.claimed_at)
+        return max(0.0, duration - waited)
+
+
+class _SourcesLineFilter:
+    """
+    Filters model-written "Sources:" lines out of a token stream (mirrors the cleanup in `Agent.run`).
+    Text at the start of a line is held back only until it can no longer be a "Sources:" prefix.
+    """
+
+    _PREFIX = "sources:"
+
+    def __init__(self) -> None:
+        self._mode = "start"  # "start" (undecided), "pass" (normal line) or "drop" (sources line)
+        self._pending = ""
+        self.emitted = False
+
+    def feed(self, text: str) -> str:
+        out: List[str] = []
+        for ch in text:
+            if self._mode == "drop":
+                if ch == "\n":
+                    self._mode = "start"
+                continue
+            if self._mode == "pass":
+                out.append(ch)
+                if ch == "\n":
+                    self._mode = "start"
+                continue
+            self._pending += ch
+            head = self._pending.lstrip().lower()
+            if head.startswith(self._PREFIX):
+                self._mode = "start" if ch == "\n" else "drop"
+                self._pending = ""
+            elif ch == "\n":
+                out.append(self._pending)
+                self._pending = ""
+            elif not self._PREFIX.startswith(head):
+                out.append(self._pending)
+                self._pending = ""
+                self._mode = "pass"
+        emitted = "".join(out)
+        self.emitted = self.emitted or bool(emitted.strip())
+        return emitted
+
+    def flush(self) -> str:
+        pending, self._pending = self._pending, ""
+        if self._mode == "drop":
+            return ""
+        self.emitted = self.emitted or bool(pending.strip())
+        return pending
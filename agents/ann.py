@@ -0,0 +1,187 @@
+import random
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from typing import TYPE_CHECKING, Any, Dict, List, Sequence
+
+from .matrix_backend import numpy_available
+
+if TYPE_CHECKING:  # pragma: no cover - typing only
+    from .vector_store import TfidfVectorStore
+
+# Forward-index entries projected per NumPy block when building signatures (bounds temporary memory).
+_BLOCK_NNZ = 1 << 16
+
+
+class LshIndex:
+    """
+    Approximate nearest-neighbour index over the store's TF-IDF vectors (CPU only, no model downloads).
+    - Signed random projections: each of `tables` tables hashes a vector to `bits` sign bits
+      of random +/-1 projections (SimHash), i.e. buckets of vectors with small angular distance.
+    - Buckets are stored as sorted (signature, doc id) arrays, so a lookup is two binary searches.
+    - Multi-probe: a query also visits the `probes` neighbouring buckets per table obtained by flipping
+      its least confident bits (smallest |projection|), which raises recall without more tables.
+    - A query collects the union of its buckets; if that exceeds `max_candidates`, the docs that
+      collide in the most tables are kept. The store re-ranks only those candidates exactly.
+    Uses NumPy when installed; otherwise a slower pure-Python build with identical semantics.
+    """
+
+    def __init__(
+        self, tables: int = 8, bits: int = 12, max_candidates: int = 1000, probes: int = 0, seed: int = 13
+    ) -> None:
+        if tables <= 0 or not 0 < bits <= 62:
+            raise ValueError("LSH needs tables >= 1 and 1 <= bits <= 62")
+        self.tables = tables
+        self.bits = bits
+        self.probes = max(0, min(probes, bits))
+        self.max_candidates = max_candidates
+        self.seed = seed
+        self.num_docs = 0
+        self._use_numpy = numpy_available()
+        self._projection: Any = None  # NumPy (terms x tables*bits) int8 matrix of +/-1
+        self._masks: List[int] = []  # pure-Python: per-term bitmask, bit set = +1
+        self._keys: List[Sequence[int]] = []  # per table: signatures sorted ascending
+        self._docs: List[Sequence[int]] = []  # per table: doc ids in signature order
+        self.build_seconds = 0.0
+        self.queries = 0
+        self.candidates_total = 0
+        self.lookup_seconds = 0.0
+
+    def build(self, store: "TfidfVectorStore") -> None:
+        started = time.perf_counter()
+        self.num_docs = store.num_docs
+        num_terms = len(store.posting_offsets) - 1
+        if self._use_numpy:
+            projected = self._build_numpy(store, num_terms)
+        else:
+            projected = self._build_python(store, num_terms)
+        self._keys, self._docs = [], []
+        for table_sigs in (self._pack_table(projected, table) for table in range(self.tables)):
+            order = sorted(range(self.num_docs), key=table_sigs.__getitem__)
+            self._keys.append(array("q", (table_sigs[idx] for idx in order)))
+            self._docs.append(array("i", order))
+        self.build_seconds = time.perf_counter() - started
+
+    def candidates(self, weights: Dict[int, float]) -> List[int]:
+        """Doc ids sharing at least one bucket with the query vector (term id -> weight)."""
+        started = time.perf_counter()
+        collisions: Counter[int] = Counter()
+        acc = self._project(weights)
+        for table in range(self.tables):
+            values = acc[table * self.bits : (table + 1) * self.bits]
+            signature = self._pack(values)
+            # Flip the bits whose projections are closest to the hyperplane first.
+            flips = sorted(range(self.bits), key=lambda bit: abs(values[bit]))[: self.probes]
+            keys = self._keys[table]
+            for probe in [signature] + [signature ^ (1 << bit) for bit in flips]:
+                lo, hi = bisect_left(keys, probe), bisect_right(keys, probe)
+                collisions.update(self._docs[table][lo:hi])
+        if self.max_candidates and len(collisions) > self.max_candidates:
+            found = [doc_idx for doc_idx, _ in collisions.most_common(self.max_candidates)]
+        else:
+            found = list(collisions)
+        self.queries += 1
+        self.candidates_total += len(found)
+        self.lookup_seconds += time.perf_counter() - started
+        return found
+
+    def stats(self) -> Dict[str, Any]:
+        buckets = sum(len(set(keys)) for keys in self._keys)
+        return {
+            "tables": self.tables,
+            "bits": self.bits,
+            "probes": self.probes,
+            "max_candidates": self.max_candidates,
+            "docs": self.num_docs,
+            "backend": "numpy" if self._use_numpy else "python",
+            "build_seconds": round(self.build_seconds, 3),
+            "avg_bucket_size": round(self.num_docs * self.tables / buckets, 2) if buckets else 0.0,
+            "queries": self.queries,
+            "avg_candidates": round(self.candidates_total / self.queries, 1) if self.queries else 0.0,
+            "avg_lookup_ms": round(1000 * self.lookup_seconds / self.queries, 3) if self.queries else 0.0,
+        }
+
+    def _project(self, weights: Dict[int, float]) -> Sequence[float]:
+        """Random projections of a sparse vector, `bits` consecutive values per table."""
+        total_bits = self.tables * self.bits
+        if self._use_numpy:
+            import numpy as np  # type: ignore
+
+            term_ids = [t for t in weights if t < self._projection.shape[0]]
+            if not term_ids:
+                return [0.0] * total_bits
+            values = np.asarray([weights[t] for t in term_ids], dtype=np.float32)
+            return (values @ self._projection[term_ids].astype(np.float32)).tolist()
+        acc = [0.0] * total_bits
+        for term_id, weight in weights.items():
+            if term_id >= len(self._masks):
+                continue
+            mask = self._masks[term_id]
+            for bit in range(total_bits):
+                acc[bit] += weight if (mask >> bit) & 1 else -weight
+        return acc
+
+    @staticmethod
+    def _pack(values: Sequence[float]) -> int:
+        """Signature bit i is set when projection i is positive."""
+        value = 0
+        for idx, projected in enumerate(values):
+            if projected > 0:
+                value |= 1 << idx
+        return value
+
+    def _pack_table(self, projected: Any, table: int) -> Sequence[int]:
+        lo, hi = table * self.bits, (table + 1) * self.bits
+        if self._use_numpy:
+            import numpy as np  # type: ignore
+
+            powers = 1 << np.arange(self.bits, dtype=np.int64)
+            return ((projected[:, lo:hi] > 0) * powers).sum(axis=1).tolist()
+        return [self._pack(row[lo:hi]) for row in projected]
+
+    def _build_numpy(self, store: "TfidfVectorStore", num_terms: int) -> Any:
+        import numpy as np  # type: ignore
+
+        total_bits = self.tables * self.bits
+        rng = np.random.default_rng(self.seed)
+        self._projection = (rng.integers(0, 2, size=(num_terms, total_bits), dtype=np.int8) * 2 - 1).astype(np.int8)
+
+        offsets = np.asarray(store.doc_term_offsets, dtype=np.int64)
+        term_ids = np.asarray(store.doc_term_ids, dtype=np.int64)
+        tfs = np.asarray(store.doc_term_tfs, dtype=np.float32)
+        idf = np.asarray(store.idf, dtype=np.float32)
+        denom = np.asarray(store.doc_lengths, dtype=np.float32) * np.asarray(store.doc_norms, dtype=np.float32)
+        row_of = np.repeat(np.arange(self.num_docs), np.diff(offsets))
+        weights = np.divide(tfs * idf[term_ids], denom[row_of], out=np.zeros_like(tfs), where=denom[row_of] > 0)
+
+        projected = np.zeros((self.num_docs, total_bits), dtype=np.float32)
+        doc = 0
+        while doc < self.num_docs:
+            # Take whole documents until the block holds ~_BLOCK_NNZ forward-index entries.
+            end = int(np.searchsorted(offsets, offsets[doc] + _BLOCK_NNZ, side="right")) - 1
+            end = min(max(end, doc + 1), self.num_docs)
+            lo, hi = int(offsets[doc]), int(offsets[end])
+            if hi > lo:
+                contrib = self._projection[term_ids[lo:hi]].astype(np.float32) * weights[lo:hi, None]
+                starts = offsets[doc:end] - lo
+                non_empty = np.flatnonzero(np.diff(offsets[doc : end + 1]) > 0)
+                projected[doc + non_empty] = np.add.reduceat(contrib, starts[non_empty], axis=0)
+            doc = end
+        return projected
+
+    def _build_python(self, store: "TfidfVectorStore", num_terms: int) -> List[Sequence[float]]:
+        total_bits = self.tables * self.bits
+        rng = random.Random(self.seed)
+        self._masks = [rng.getrandbits(total_bits) for _ in range(num_terms)]
+        projected: List[Sequence[float]] = []
+        for doc_idx in range(self.num_docs):
+            denom = store.doc_lengths[doc_idx] * store.doc_norms[doc_idx]
+            start, end = store.doc_term_offsets[doc_idx], store.doc_term_offsets[doc_idx + 1]
+            weights = {
+                store.doc_term_ids[pos]: store.doc_term_tfs[pos] * store.idf[store.doc_term_ids[pos]] / denom
+                for pos in range(start, end)
+                if denom
+            }
+            projected.append(self._project(weights))
+        return projected
@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class AgentsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "agents"
+
+    def ready(self) -> None:
+        # With `gunicorn --preload` this runs in the master, so workers fork with a warm index.
+        if settings.AGENT_WARMUP:
+            from .warmup import warm_up
+
+            warm_up(agents=True, freeze=settings.AGENT_WARMUP_GC_FREEZE)
@@ -0,0 +1,403 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import CancelledError as FutureCancelled
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from .deadline import DeadlineExceeded, check_deadline, remaining
+
+MISSING: Any = object()
+
+
+class LRUCache:
+    """
+    Thread-safe in-process LRU cache.
+    - Bounded by entry count; least recently used entries are evicted first.
+    - Entries expire after `ttl` seconds (0 disables expiry).
+    - Bound to a version: `validate(version)` drops everything when the version changes.
+    - Hit/miss/eviction/expiration/invalidation counters help size it.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 300.0, clock: Callable[[], float] = time.monotonic) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._version: Any = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def validate(self, version: Any) -> None:
+        """Clear the cache if `version` differs from the one the entries were computed under."""
+        with self._lock:
+            if version != self._version:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._version = version
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            expires_at, value = item
+            if expires_at and expires_at <= self._clock():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        if self.max_entries <= 0:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = self._clock() + ttl if ttl > 0 else 0.0
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one execution ("single-flight").
+    - `do(key, fn)`: threads; the first caller runs `fn`, the others block on its result.
+    - `ado(key, fn)`: asyncio tasks on the same event loop share one awaited `fn()`.
+    - Waiters give up at their own request deadline (`DeadlineExceeded`), not the leader's.
+    - If the leader ran out of its own time or was cancelled, its waiters do not inherit that:
+      they try again, and one of them becomes the new leader.
+    The result (or any other exception) goes to every waiter; nothing is kept once the call completes.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, "Future[Any]"] = {}
+        self._async_calls: Dict[Tuple[int, Hashable], "asyncio.Future[Any]"] = {}
+        self.executions = 0
+        self.coalesced = 0
+        self.retries = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        while True:
+            with self._lock:
+                flight = self._calls.get(key)
+                leader = flight is None
+                if flight is None:
+                    flight = self._calls[key] = Future()
+                    self.executions += 1
+                else:
+                    self.coalesced += 1
+            if leader:
+                return self._lead(key, flight, fn)
+            try:
+                return flight.result(timeout=_wait_budget())
+            except FutureTimeout:
+                raise DeadlineExceeded("single_flight") from None
+            except (DeadlineExceeded, FutureCancelled):
+                self._retry()
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        loop = asyncio.get_running_loop()
+        flight_key = (id(loop), key)
+        while True:
+            with self._lock:
+                flight = self._async_calls.get(flight_key)
+                leader = flight is None
+                if flight is None:
+                    flight = self._async_calls[flight_key] = loop.create_future()
+                    self.executions += 1
+                else:
+                    self.coalesced += 1
+            if leader:
+                return await self._alead(flight_key, flight, fn)
+            try:
+                # Shielded: a waiter timing out or being cancelled must not cancel the shared call.
+                return await asyncio.wait_for(asyncio.shield(flight), _wait_budget())
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded("single_flight") from None
+            except DeadlineExceeded:
+                self._retry()
+            except asyncio.CancelledError:
+                task = asyncio.current_task()
+                if not flight.cancelled() or (task is not None and task.cancelling()):
+                    raise  # this waiter itself was cancelled
+                self._retry()
+
+    def _lead(self, key: Hashable, flight: "Future[Any]", fn: Callable[[], Any]) -> Any:
+        # The flight leaves the table before waiters wake, so a retrying waiter starts a new one.
+        try:
+            result = fn()
+        except BaseException as exc:
+            self._land(self._calls, key)
+            flight.set_exception(exc)
+            raise
+        self._land(self._calls, key)
+        flight.set_result(result)
+        return result
+
+    async def _alead(
+        self, flight_key: Tuple[int, Hashable], flight: "asyncio.Future[Any]", fn: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            self._land(self._async_calls, flight_key)
+            flight.cancel()
+            raise
+        except BaseException as exc:
+            self._land(self._async_calls, flight_key)
+            flight.set_exception(exc)
+            flight.exception()  # mark retrieved: there may be no other waiter
+            raise
+        self._land(self._async_calls, flight_key)
+        flight.set_result(result)
+        return result
+
+    def _land(self, calls: Dict[Any, Any], key: Hashable) -> None:
+        with self._lock:
+            del calls[key]
+
+    def _retry(self) -> None:
+        """A waiter's leader gave up on its own deadline or was cancelled: go again if time is left."""
+        check_deadline("single_flight")
+        with self._lock:
+            self.retries += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "retries": self.retries,
+                "in_flight": len(self._calls) + len(self._async_calls),
+            }
+
+
+def _wait_budget() -> Optional[float]:
+    """How long a single-flight waiter may wait: the time left before its deadline (None: no deadline)."""
+    left = remaining()
+    if left is not None and left <= 0.0:
+        raise DeadlineExceeded("single_flight")
+    return left
+
+
+class SqliteCache:
+    """
+    Persistent key/value cache in a local SQLite database, shared by all worker processes on a host.
+    - WAL journal: readers never block the writer and vice versa; writers wait up to `busy_timeout`.
+    - Values are bytes; entries expire after `ttl` seconds (0 disables expiry).
+    - Bounded by `max_entries` and `max_bytes` (0 disables either); least recently used rows
+      (by last access) are evicted after writes, or after every `evict_interval`-th write of this
+      process for large tables (the caps are then exceeded by at most that many rows per process).
+    - One connection per thread and process (connections are never shared across a fork).
+    Hit/miss/eviction counters are per process (`counters()`); `stats()` adds the on-disk size.
+    """
+
+    _SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS entries ("
+        "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+        "created_at REAL NOT NULL, expires_at REAL NOT NULL, last_access REAL NOT NULL, meta REAL NOT NULL DEFAULT 0)"
+    )
+
+    def __init__(
+        self,
+        path: str,
+        ttl: float = 3600.0,
+        max_entries: int = 10000,
+        max_bytes: int = 64 * 1024 * 1024,
+        busy_timeout: float = 5.0,
+        evict_interval: int = 1,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.path = str(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.busy_timeout = busy_timeout
+        self.evict_interval = max(1, evict_interval)
+        self._clock = clock
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self.expirations = 0
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connect()
+        conn.execute(self._SCHEMA)
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        # Autocommit; every statement is its own short transaction.
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key: str, default: Any = MISSING) -> Any:
+        """The cached bytes for `key`, or `default`."""
+        found = self.get_with_meta(key)
+        return default if found is None else found[0]
+
+    def get_with_meta(self, key: str) -> Optional[Tuple[bytes, float]]:
+        """(value, meta) for a live entry, or None; `meta` is the number stored alongside it by `set`."""
+        conn = self._connect()
+        now = self._clock()
+        row = conn.execute("SELECT value, expires_at, meta FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self._count("misses")
+            return None
+        value, expires_at, meta = row
+        if expires_at and expires_at <= now:
+            conn.execute("DELETE FROM entries WHERE key = ? AND expires_at = ?", (key, expires_at))
+            self._count("expirations")
+            self._count("misses")
+            return None
+        conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+        self._count("hits")
+        return bytes(value), meta
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None, meta: float = 0.0) -> None:
+        now = self._clock()
+        conn = self._connect()
+        self._put(conn, key, value, ttl, meta, now)
+        self._count("writes")
+        self._evict(conn, now)
+
+    def update(
+        self, key: str, fn: Callable[[Optional[bytes]], bytes], ttl: Optional[float] = None, meta: float = 0.0
+    ) -> bytes:
+        """
+        Atomically replace `key` with `fn(current value or None)` and return the new value.
+        The read and the write share one IMMEDIATE transaction, so concurrent updates from any
+        process are serialised instead of overwriting each other.
+        """
+        now = self._clock()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT value, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+            current = bytes(row[0]) if row is not None and not (row[1] and row[1] <= now) else None
+            value = fn(current)
+            self._put(conn, key, value, ttl, meta, now)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._count("writes")
+        self._evict(conn, now)
+        return value
+
+    def _put(self, conn: sqlite3.Connection, key: str, value: bytes, ttl: Optional[float], meta: float, now: float) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = now + ttl if ttl > 0 else 0.0
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (key, value, size, created_at, expires_at, last_access, meta) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, sqlite3.Binary(value), len(value), now, expires_at, now, meta),
+        )
+
+    def delete(self, key: str) -> None:
+        self._connect().execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        self._connect().execute("DELETE FROM entries")
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        if self.writes % self.evict_interval:
+            return
+        expired = conn.execute("DELETE FROM entries WHERE expires_at > 0 AND expires_at <= ?", (now,)).rowcount
+        evicted = 0
+        if self.max_entries > 0:
+            evicted += conn.execute(
+                "DELETE FROM entries WHERE key IN "
+                "(SELECT key FROM entries ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            ).rowcount
+        if self.max_bytes > 0:
+            evicted += conn.execute(
+                "DELETE FROM entries WHERE key IN (SELECT key FROM "
+                "(SELECT key, SUM(size) OVER (ORDER BY last_access DESC, key) AS running FROM entries) "
+                "WHERE running > ?)",
+                (self.max_bytes,),
+            ).rowcount
+        if expired:
+            self._count("expirations", expired)
+        if evicted:
+            self._count("evictions", evicted)
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def __len__(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def counters(self) -> Dict[str, Any]:
+        """This process's hit/miss/write/eviction counters; cheap enough for every request (no query)."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """`counters()` plus the table's row count and size, which scans the table: keep it off hot paths."""
+        entries, size = self._connect().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {
+            "path": self.path,
+            "size": entries,
+            "bytes": size,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            **self.counters(),
+        }
@@ -0,0 +1,250 @@
+import json
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .index_format import IndexFile
+
+# Word spans are found on the UTF-8 bytes; multi-byte sequences never contain ASCII whitespace,
+# so every span boundary is also a valid character boundary.
+_WORD = re.compile(rb"\S+")
+_PAGE_SEPARATOR = b"\n"
+# Index section name -> (ChunkStore attribute, array typecode).
+_ARRAYS = {
+    "chunk_doc_text_offsets": ("doc_text_offsets", "q"),
+    "chunk_doc_page_offsets": ("doc_page_offsets", "q"),
+    "chunk_page_starts": ("page_starts", "q"),
+    "chunk_page_numbers": ("page_numbers", "i"),
+    "chunk_doc": ("chunk_doc", "i"),
+    "chunk_page": ("chunk_page", "i"),
+    "chunk_start": ("chunk_start", "q"),
+    "chunk_end": ("chunk_end", "q"),
+}
+
+
+class ChunkRecord:
+    """One chunk as an offset record: document id, first page number and a [start, end) byte range."""
+
+    __slots__ = ("doc", "page", "start", "end")
+
+    def __init__(self, doc: int, page: int, start: int, end: int) -> None:
+        self.doc = doc
+        self.page = page
+        self.start = start
+        self.end = end
+
+    def __repr__(self) -> str:
+        return f"ChunkRecord(doc={self.doc}, page={self.page}, start={self.start}, end={self.end})"
+
+
+class ChunkStore(Sequence[Dict[str, str]]):
+    """
+    Compact chunk storage: every page's text is kept once, chunks are offset records into it.
+    - Text lives in one UTF-8 blob (pages of a document separated by a newline).
+    - Chunks, pages and documents are parallel int arrays, so a chunk costs four numbers
+      instead of a string (overlapping neighbours share the same bytes).
+    - `store[i]` materialises the {"text", "source", "id"} dict only when a chunk is returned.
+    - Built in memory (bytearray + arrays) or opened zero-copy from the mmap'd index.
+    """
+
+    def __init__(self) -> None:
+        self.text: Any = bytearray()
+        # Per document: (manifest key, display name); its text/pages live in [offsets[d], offsets[d + 1]).
+        self.documents: List[Tuple[str, str]] = []
+        self.doc_text_offsets: Sequence[int] = array("q", [0])
+        self.doc_page_offsets: Sequence[int] = array("q", [0])
+        self.page_starts: Sequence[int] = array("q")
+        self.page_numbers: Sequence[int] = array("i")
+        # Per chunk; chunk_doc is non-decreasing because documents are appended whole.
+        self.chunk_doc: Sequence[int] = array("i")
+        self.chunk_page: Sequence[int] = array("i")
+        self.chunk_start: Sequence[int] = array("q")
+        self.chunk_end: Sequence[int] = array("q")
+
+    def __len__(self) -> int:
+        return len(self.chunk_doc)
+
+    def __getitem__(self, idx):  # type: ignore[override]
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(idx)
+        return {"text": self.chunk_text(idx), "source": self.chunk_source(idx), "id": self.chunk_id(idx)}
+
+    def record(self, idx: int) -> ChunkRecord:
+        return ChunkRecord(self.chunk_doc[idx], self.chunk_page[idx], self.chunk_start[idx], self.chunk_end[idx])
+
+    def chunk_text(self, idx: int) -> str:
+        raw = bytes(self.text[self.chunk_start[idx] : self.chunk_end[idx]]).decode("utf-8", errors="replace")
+        return " ".join(raw.split())
+
+    def chunk_source(self, idx: int) -> str:
+        name = self.documents[self.chunk_doc[idx]][1]
+        first = self.chunk_page[idx]
+        last = self.page_numbers[bisect_right(self.page_starts, self.chunk_end[idx] - 1) - 1]
+        pages = f"page {first}" if last == first else f"pages {first}-{last}"
+        return f"{name} (book) - {pages}"
+
+    def chunk_id(self, idx: int) -> str:
+        doc = self.chunk_doc[idx]
+        return f"{self.documents[doc][0]}#chunk-{idx - bisect_left(self.chunk_doc, doc)}"
+
+    def add_document(self, key: str, name: str) -> int:
+        self.documents.append((key, name))
+        self.doc_text_offsets.append(len(self.text))
+        self.doc_page_offsets.append(len(self.page_starts))
+        return len(self.documents) - 1
+
+    def add_page(self, doc: int, page_number: int, text: str) -> Tuple[int, bytes]:
+        """Append a page of the last document; returns (blob offset of the page, its UTF-8 bytes)."""
+        if doc != len(self.documents) - 1:
+            raise ValueError("Pages must be appended to the most recent document")
+        if len(self.text) > self.doc_text_offsets[doc]:
+            self.text.extend(_PAGE_SEPARATOR)
+        encoded = text.encode("utf-8")
+        offset = len(self.text)
+        self.text.extend(encoded)
+        self.page_starts.append(offset)
+        self.page_numbers.append(page_number)
+        self.doc_text_offsets[doc + 1] = len(self.text)
+        self.doc_page_offsets[doc + 1] = len(self.page_starts)
+        return offset, encoded
+
+    def add_chunk(self, doc: int, page: int, start: int, end: int) -> int:
+        self.chunk_doc.append(doc)
+        self.chunk_page.append(page)
+        self.chunk_start.append(start)
+        self.chunk_end.append(end)
+        return len(self.chunk_doc) - 1
+
+    def take(self, keep: Sequence[int]) -> "ChunkStore":
+        """
+        New in-memory store holding only the `keep` chunks (whole documents, in the given order).
+        Text and page tables are copied once per document; chunk offsets are rebased.
+        """
+        taken = ChunkStore()
+        doc_map: Dict[int, int] = {}
+        shift = 0
+        for idx in keep:
+            old_doc = self.chunk_doc[idx]
+            if old_doc not in doc_map:
+                key, name = self.documents[old_doc]
+                new_doc = doc_map[old_doc] = taken.add_document(key, name)
+                text_start, text_end = self.doc_text_offsets[old_doc], self.doc_text_offsets[old_doc + 1]
+                shift = len(taken.text) - text_start
+                taken.text.extend(self.text[text_start:text_end])
+                for page in range(self.doc_page_offsets[old_doc], self.doc_page_offsets[old_doc + 1]):
+                    taken.page_starts.append(self.page_starts[page] + shift)
+                    taken.page_numbers.append(self.page_numbers[page])
+                taken.doc_text_offsets[new_doc + 1] = len(taken.text)
+                taken.doc_page_offsets[new_doc + 1] = len(taken.page_starts)
+            start, end = self.chunk_start[idx] + shift, self.chunk_end[idx] + shift
+            taken.add_chunk(doc_map[old_doc], self.chunk_page[idx], start, end)
+        return taken
+
+    def sections(self) -> Dict[str, Tuple[str, Any]]:
+        sections: Dict[str, Tuple[str, Any]] = {
+            "chunk_text": ("B", self.text),
+            "chunk_documents": ("B", json.dumps(self.documents).encode("utf-8")),
+        }
+        for name, (attr, typecode) in _ARRAYS.items():
+            sections[name] = (typecode, getattr(self, attr))
+        return sections
+
+    @classmethod
+    def from_index(cls, index: IndexFile) -> Optional["ChunkStore"]:
+        """Zero-copy store over an index file, or None if the index holds plain metadata records."""
+        if "chunk_text" not in index.sections:
+            return None
+        store = cls()
+        store.text = index.blob("chunk_text")
+        store.documents = [(key, name) for key, name in index.json("chunk_documents")]
+        for name, (attr, typecode) in _ARRAYS.items():
+            setattr(store, attr, index.array(name, typecode))
+        return store
+
+    def to_json(self) -> Dict[str, Any]:
+        # Offsets are byte offsets; the decoded text re-encodes to the same bytes on import.
+        payload: Dict[str, Any] = {"text": bytes(self.text).decode("utf-8"), "documents": self.documents}
+        for name, (attr, _) in _ARRAYS.items():
+            payload[name] = list(getattr(self, attr))
+        return payload
+
+    @classmethod
+    def from_json(cls, payload: Dict[str, Any]) -> "ChunkStore":
+        store = cls()
+        store.text = bytearray(payload["text"].encode("utf-8"))
+        store.documents = [(key, name) for key, name in payload["documents"]]
+        for name, (attr, typecode) in _ARRAYS.items():
+            setattr(store, attr, array(typecode, payload[name]))
+        return store
+
+
+class Chunker:
+    """
+    Streaming word-window chunker over a ChunkStore.
+    - `feed` appends a page's text to the store and yields chunk ids as soon as a window of
+      `chunk_size` words is complete; consecutive windows share `overlap` words.
+    - With `span_pages` the window carries over page boundaries within a document,
+      otherwise every page is chunked on its own (the short tail of a page becomes its own chunk).
+    - Only the current window's word offsets are buffered, never chunk text.
+    """
+
+    def __init__(self, store: ChunkStore, chunk_size: int = 900, overlap: int = 100, span_pages: bool = True) -> None:
+        if not 0 <= overlap < chunk_size:
+            raise ValueError("Chunk overlap must be smaller than the chunk size")
+        self.store = store
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.span_pages = span_pages
+        self._doc: Optional[int] = None
+        self._key: Optional[str] = None
+        # Buffered words as parallel (start, end, page) lists; _fresh counts words not yet in any chunk.
+        self._starts: List[int] = []
+        self._ends: List[int] = []
+        self._pages: List[int] = []
+        self._fresh = 0
+
+    def feed(self, key: str, name: str, page_number: int, text: str) -> Iterator[int]:
+        if key != self._key:
+            yield from self.flush()
+            self._key = key
+            self._doc = self.store.add_document(key, name)
+        assert self._doc is not None
+        offset, encoded = self.store.add_page(self._doc, page_number, text)
+        for match in _WORD.finditer(encoded):
+            self._starts.append(offset + match.start())
+            self._ends.append(offset + match.end())
+            self._pages.append(page_number)
+            self._fresh += 1
+            if len(self._starts) == self.chunk_size:
+                yield self._emit(self.chunk_size)
+                del self._starts[: self.chunk_size - self.overlap]
+                del self._ends[: self.chunk_size - self.overlap]
+                del self._pages[: self.chunk_size - self.overlap]
+                self._fresh = 0
+        if not self.span_pages:
+            yield from self._flush_window()
+
+    def flush(self) -> Iterator[int]:
+        """Emit the partial window of the current document (call once the stream ends)."""
+        yield from self._flush_window()
+        self._key = None
+        self._doc = None
+
+    def discard(self) -> None:
+        """Drop the buffered window without emitting it (e.g. the document hit its chunk cap)."""
+        self._starts, self._ends, self._pages = [], [], []
+        self._fresh = 0
+
+    def _flush_window(self) -> Iterator[int]:
+        if self._fresh:
+            yield self._emit(len(self._starts))
+        self.discard()
+
+    def _emit(self, count: int) -> int:
+        assert self._doc is not None
+        return self.store.add_chunk(self._doc, self._pages[0], self._starts[0], self._ends[count - 1])
@@ -0,0 +1,233 @@
+import logging
+import math
+import re
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+
+from .tokenizer import tokenize
+
+logger = logging.getLogger(__name__)
+
+# "<name> (book) - page 3" / "<name> (book) - pages 3-5", as produced by ChunkStore.chunk_source.
+_SOURCE_PAGES = re.compile(r"^(?P<name>.*) - pages? (?P<first>\d+)(?:-(?P<last>\d+))?$")
+_CHUNK_ID = re.compile(r"^(?P<key>.*)#chunk-(?P<first>\d+)(?:-(?P<last>\d+))?$")
+# Remaining budget below which a chunk is dropped rather than trimmed.
+_MIN_TRIM_TOKENS = 32
+
+TokenEstimator = Callable[[str], int]
+
+
+def build_token_estimator(name: str) -> TokenEstimator:
+    """
+    Token counter used for prompt budgets:
+    - "chars": ~4 characters per token (fast, language-agnostic; the default).
+    - "words": ~0.75 words per token.
+    - "tiktoken": exact cl100k_base counts when tiktoken is installed (falls back to "chars").
+    """
+    if name == "tiktoken":
+        try:
+            import tiktoken  # type: ignore
+
+            encoding = tiktoken.get_encoding("cl100k_base")
+            return lambda text: len(encoding.encode(text, disallowed_special=()))
+        except Exception as exc:  # ImportError, or the encoding could not be loaded offline
+            logger.warning("tiktoken unavailable (%s); estimating tokens from characters", exc)
+            name = "chars"
+    if name == "words":
+        return lambda text: math.ceil(len(text.split()) * 4 / 3)
+    if name != "chars":
+        raise ValueError(f"Unknown token estimator {name!r} (expected chars, words or tiktoken)")
+    return lambda text: math.ceil(len(text) / 4)
+
+
+class ContextPacker:
+    """
+    Fits retrieved RAG chunks into a per-request token budget before they reach the prompt.
+    - Merges chunks that are neighbours in the same document (consecutive chunk ids), dropping
+      the words they share through the chunker's overlap; the merged chunk cites the combined page range.
+    - Picks up to `max_chunks` of them with maximal marginal relevance: retrieval rank traded off
+      (`mmr_lambda`) against cosine similarity to chunks already picked, so near-duplicates lose out.
+    - Adds chunks in that order while they fit `token_budget` (counting the "[source] " tag);
+      the first one that does not fit is cut at a word boundary, the rest are dropped.
+    Every packed chunk keeps its `source`, so the [source] tags and the Sources line stay valid.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = 2000,
+        max_chunks: int = 3,
+        candidates: int = 6,
+        mmr_lambda: float = 0.7,
+        estimator: str = "chars",
+    ) -> None:
+        self.token_budget = token_budget
+        self.max_chunks = max(1, max_chunks)
+        self.candidates = max(self.max_chunks, candidates)
+        self.mmr_lambda = mmr_lambda
+        self.estimator = estimator
+        self.count_tokens = build_token_estimator(estimator)
+
+    def pack(self, chunks: Sequence[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """Return (packed chunks, stats); `chunks` are search results in rank order."""
+        units = self._merge_neighbours(chunks)
+        selected = self._mmr(units)
+        packed: List[Dict[str, Any]] = []
+        used = 0
+        trimmed = 0
+        for chunk in selected:
+            cost = self.chunk_tokens(chunk)
+            if self.token_budget <= 0 or used + cost <= self.token_budget:
+                packed.append(chunk)
+                used += cost
+                continue
+            remaining = self.token_budget - used
+            if remaining >= _MIN_TRIM_TOKENS or not packed:
+                cut = self._trim(chunk, remaining)
+                if cut is not None:
+                    packed.append(cut)
+                    used += self.chunk_tokens(cut)
+                    trimmed += 1
+            break
+        stats = {
+            "candidates": len(chunks),
+            "merged": len(chunks) - len(units),
+            "selected": len(packed),
+            "trimmed": trimmed,
+            "context_tokens": used,
+            "budget": self.token_budget,
+            "estimator": self.estimator,
+        }
+        return packed, stats
+
+    def chunk_tokens(self, chunk: Dict[str, Any]) -> int:
+        return self.count_tokens(f"[{chunk.get('source', 'unknown')}] {chunk.get('text', '')}")
+
+    def _merge_neighbours(self, chunks: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Fold each chunk into an earlier-ranked neighbour from the same document when possible."""
+        units: List[Dict[str, Any]] = []
+        spans: List[Optional[Tuple[str, int, int]]] = []
+        for chunk in chunks:
+            span = _chunk_span(chunk)
+            if span is not None and any(
+                seen is not None and seen[0] == span[0] and seen[1] <= span[1] and span[2] <= seen[2] for seen in spans
+            ):
+                continue  # already covered by a kept (possibly merged) chunk
+            for pos, seen in enumerate(spans):
+                if span is None or seen is None or span[0] != seen[0]:
+                    continue
+                if span[1] == seen[2] + 1:
+                    merged = _join(units[pos], chunk)
+                elif seen[1] == span[2] + 1:
+                    merged = _join(chunk, units[pos])
+                else:
+                    continue
+                if merged is not None:
+                    units[pos] = merged
+                    spans[pos] = (span[0], min(span[1], seen[1]), max(span[2], seen[2]))
+                    break
+            else:
+                units.append(dict(chunk))
+                spans.append(span)
+        return units
+
+    def _mmr(self, units: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if len(units) <= 1:
+            return units[: self.max_chunks]
+        vectors = [Counter(tokenize(unit.get("text", ""))) for unit in units]
+        # Relevance from the retrieval rank (1.0 for the best hit, linearly down to 1/n).
+        relevance = [1.0 - idx / len(units) for idx in range(len(units))]
+        chosen: List[int] = []
+        remaining = list(range(len(units)))
+        while remaining and len(chosen) < self.max_chunks:
+            best = max(
+                remaining,
+                key=lambda idx: self.mmr_lambda * relevance[idx]
+                - (1 - self.mmr_lambda) * max((_cosine(vectors[idx], vectors[c]) for c in chosen), default=0.0),
+            )
+            chosen.append(best)
+            remaining.remove(best)
+        return [units[idx] for idx in chosen]
+
+    def _trim(self, chunk: Dict[str, Any], budget: int) -> Optional[Dict[str, Any]]:
+        """Longest word prefix of the chunk whose tagged text fits `budget` tokens (binary search)."""
+        words = chunk.get("text", "").split()
+        lo, hi = 0, len(words)
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self.chunk_tokens({**chunk, "text": " ".join(words[:mid]) + " ..."}) <= budget:
+                lo = mid
+            else:
+                hi = mid - 1
+        if lo == 0:
+            return None
+        return {**chunk, "text": " ".join(words[:lo]) + " ...", "trimmed": True}
+
+
+def _chunk_span(chunk: Dict[str, Any]) -> Optional[Tuple[str, int, int]]:
+    match = _CHUNK_ID.match(str(chunk.get("id", "")))
+    if not match:
+        return None
+    first = int(match.group("first"))
+    return match.group("key"), first, int(match.group("last") or first)
+
+
+def _join(left: Dict[str, Any], right: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Concatenate two neighbouring chunks (left precedes right), or None if their sources disagree."""
+    source = _merge_sources(left.get("source", ""), right.get("source", ""))
+    left_span, right_span = _chunk_span(left), _chunk_span(right)
+    if source is None or left_span is None or right_span is None:
+        return None
+    left_words = left.get("text", "").split()
+    right_words = right.get("text", "").split()
+    overlap = _overlap(left_words, right_words)
+    key = left_span[0]
+    return {
+        **left,
+        "text": " ".join(left_words + right_words[overlap:]),
+        "source": source,
+        "id": f"{key}#chunk-{left_span[1]}-{right_span[2]}",
+    }
+
+
+def _overlap(left: List[str], right: List[str]) -> int:
+    """Length of the longest suffix of `left` that is a prefix of `right`."""
+    for size in range(min(len(left), len(right)), 0, -1):
+        if left[-size:] == right[:size]:
+            return size
+    return 0
+
+
+def _merge_sources(left: str, right: str) -> Optional[str]:
+    if left == right:
+        return left
+    a, b = _SOURCE_PAGES.match(left), _SOURCE_PAGES.match(right)
+    if not a or not b or a.group("name") != b.group("name"):
+        return None
+    first = min(int(a.group("first")), int(b.group("first")))
+    last = max(int(a.group("last") or a.group("first")), int(b.group("last") or b.group("first")))
+    pages = f"page {first}" if first == last else f"pages {first}-{last}"
+    return f"{a.group('name')} - {pages}"
+
+
+def _cosine(a: Counter, b: Counter) -> float:
+    if not a or not b:
+        return 0.0
+    if len(a) > len(b):
+        a, b = b, a
+    dot = sum(count * b.get(term, 0) for term, count in a.items())
+    if not dot:
+        return 0.0
+    norm = math.sqrt(sum(v * v for v in a.values())) * math.sqrt(sum(v * v for v in b.values()))
+    return dot / norm
+
+
+def build_default_packer() -> ContextPacker:
+    return ContextPacker(
+        token_budget=settings.RAG_CONTEXT_TOKEN_BUDGET,
+        max_chunks=settings.RAG_CONTEXT_MAX_CHUNKS,
+        candidates=settings.RAG_CONTEXT_CANDIDATES,
+        mmr_lambda=settings.RAG_CONTEXT_MMR_LAMBDA,
+        estimator=settings.RAG_CONTEXT_TOKEN_ESTIMATOR,
+    )
@@ -1,15 +1,15 @@
 import json
-from typing import Any, Dict, List, Optional
+import time
+from typing import Any, Dict, Iterator, List, Optional
 
-import requests
 from django.conf import settings
 
+from .metrics import span
+from .transport import AsyncHttpTransport, HttpTransport, shared_async_transport, shared_transport
 
-class DatabricksLLMClient:
-    """
-    Minimal Databricks Model Serving client for chat-style completions.
-    Assumes you have a serving endpoint that accepts OpenAI-compatible inputs.
-    """
+
+class _ServingEndpointClient:
+    """URL, auth and payload handling shared by the sync and async serving-endpoint clients."""
 
     def __init__(
         self,
@@ -17,35 +17,38 @@ class DatabricksLLMClient:
         api_token: str,
         serving_endpoint: str,
         model: Optional[str] = None,
+        transport: Any = None,
+        read_timeout: float = 60.0,
     ) -> None:
         self.host = host
         self.api_token = api_token
         self.serving_endpoint = serving_endpoint
         self.model = model
+        self.transport = transport
+        self.read_timeout = read_timeout
 
-    def chat(self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    def _url(self) -> str:
         if self.serving_endpoint.startswith("http"):
             # Allow a full invocations URL to be provided via env (with or without /api/2.0).
-            url = self.serving_endpoint
-        else:
-            if not self.host:
-                raise RuntimeError("DATABRICKS_HOST is required when serving endpoint is not a full URL")
-            # Use host + /serving-endpoints/... (no /api/2.0).
-            url = f"{self.host}/serving-endpoints/{self.serving_endpoint}/invocations"
+            return self.serving_endpoint
+        if not self.host:
+            raise RuntimeError("DATABRICKS_HOST is required when serving endpoint is not a full URL")
+        # Use host + /serving-endpoints/... (no /api/2.0).
+        return f"{self.host}/serving-endpoints/{self.serving_endpoint}/invocations"
+
+    def _headers(self) -> Dict[str, str]:
+        return {
+            "Authorization": f"Bearer {self.api_token}",
+            "Content-Type": "application/json",
+        }
+
+    def _payload(self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]]) -> Dict[str, Any]:
         payload: Dict[str, Any] = {"messages": messages}
         if tools:
             payload["tools"] = tools
         if self.model:
             payload["model"] = self.model
-
-        headers = {
-            "Authorization": f"Bearer {self.api_token}",
-            "Content-Type": "application/json",
-        }
-        response = requests.post(url, headers=headers, data=json.dumps(payload), timeout=60)
-        response.raise_for_status()
-        data = response.json()
-        return self._normalize_response(data)
+        return payload
 
     @staticmethod
     def _normalize_response(data: Dict[str, Any]) -> Dict[str, Any]:
@@ -70,20 +73,230 @@ class DatabricksLLMClient:
         return {"message": message, "tool_calls": tool_calls, "raw": data}
 
 
-def build_default_client() -> DatabricksLLMClient:
+class DatabricksLLMClient(_ServingEndpointClient):
+    """
+    Minimal Databricks Model Serving client for chat-style completions.
+    Assumes you have a serving endpoint that accepts OpenAI-compatible inputs.
+    Requests go through a pooled keep-alive transport with retries (see agents/transport.py).
+    """
+
+    def __init__(
+        self,
+        host: Optional[str],
+        api_token: str,
+        serving_endpoint: str,
+        model: Optional[str] = None,
+        transport: Optional[HttpTransport] = None,
+        read_timeout: float = 60.0,
+    ) -> None:
+        super().__init__(
+            host,
+            api_token,
+            serving_endpoint,
+            model,
+            transport if transport is not None else shared_transport(),
+            read_timeout,
+        )
+
+    def chat(self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        body = json.dumps(self._payload(messages, tools))
+        with span("llm_request") as timer:
+            response = self.transport.post(
+                self._url(), headers=self._headers(), data=body, read_timeout=self.read_timeout
+            )
+            response.raise_for_status()
+            data = response.json()
+            timer.llm_usage(data.get("usage"), len(body))
+        return self._normalize_response(data)
+
+    def chat_stream(
+        self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Streaming variant of `chat` (OpenAI-style `stream: true`, server-sent events).
+        Yields events as they arrive:
+        - {"type": "delta", "content": str}: a piece of the assistant message.
+        - {"type": "tool_call_delta", "index": int, "id": str|None, "name": str|None, "arguments": str}:
+          an incremental fragment of a tool call (arguments are JSON text split across deltas).
+        - {"type": "done", "message", "tool_calls", "raw", "ttft"}: the assembled result, same shape
+          as `chat` plus time-to-first-token in seconds (None if no content/tool delta arrived).
+        Endpoints that ignore `stream` and answer with plain JSON are handled as a single delta.
+        """
+        started = time.perf_counter()
+        payload = self._payload(messages, tools)
+        payload["stream"] = True
+        body = json.dumps(payload)
+        headers = {**self._headers(), "Accept": "text/event-stream"}
+        timer = span("llm_request")
+        try:
+            response = self.transport.post(
+                self._url(), headers=headers, data=body, read_timeout=self.read_timeout, stream=True
+            )
+        except Exception:
+            timer.end(failed=True)
+            raise
+        failed = True
+        try:
+            response.raise_for_status()
+            if "text/event-stream" not in response.headers.get("Content-Type", ""):
+                data = response.json()
+                timer.llm_usage(data.get("usage"), len(body))
+                result = self._normalize_response(data)
+                ttft = time.perf_counter() - started
+                failed = False
+                if result["message"]:
+                    yield {"type": "delta", "content": result["message"]}
+                yield {"type": "done", **result, "ttft": ttft}
+                return
+
+            parts: List[str] = []
+            calls: Dict[int, Dict[str, Any]] = {}
+            ttft: Optional[float] = None
+            raw: Dict[str, Any] = {"streamed": True, "chunks": 0}
+            for data in self._sse_events(response):
+                raw["chunks"] += 1
+                for key in ("id", "model", "usage"):
+                    if data.get(key):
+                        raw[key] = data[key]
+                for choice in data.get("choices") or []:
+                    delta = choice.get("delta") or choice.get("message") or {}
+                    if choice.get("finish_reason"):
+                        raw["finish_reason"] = choice["finish_reason"]
+                    content = delta.get("content")
+                    if content:
+                        if ttft is None:
+                            ttft = time.perf_counter() - started
+                        parts.append(content)
+                        yield {"type": "delta", "content": content}
+                    for call_delta in delta.get("tool_calls") or []:
+                        if ttft is None:
+                            ttft = time.perf_counter() - started
+                        yield self._merge_tool_call(calls, call_delta)
+            message = "".join(parts)
+            raw["message"] = message
+            tool_calls = [calls[idx] for idx in sorted(calls)]
+            timer.llm_usage(raw.get("usage"), len(body))
+            failed = False
+            yield {"type": "done", "message": message, "tool_calls": tool_calls, "raw": raw, "ttft": ttft}
+        finally:
+            response.close()
+            timer.end(failed=failed)
+
+    @staticmethod
+    def _sse_events(response: Any) -> Iterator[Dict[str, Any]]:
+        """Decode `data:` lines of an SSE body into JSON objects until `[DONE]`."""
+        buffer: List[str] = []
+        for line in response.iter_lines(decode_unicode=True):
+            if line is None:
+                continue
+            if line.startswith("data:"):
+                buffer.append(line[5:].lstrip())
+                continue
+            if line or not buffer:
+                continue  # comments, event/id fields, keep-alive blank lines
+            data, buffer = "\n".join(buffer), []
+            if data.strip() == "[DONE]":
+                return
+            try:
+                yield json.loads(data)
+            except json.JSONDecodeError:
+                continue
+        if buffer and "\n".join(buffer).strip() != "[DONE]":
+            try:
+                yield json.loads("\n".join(buffer))
+            except json.JSONDecodeError:
+                pass
+
+    @staticmethod
+    def _merge_tool_call(calls: Dict[int, Dict[str, Any]], call_delta: Dict[str, Any]) -> Dict[str, Any]:
+        """Fold one streamed tool-call fragment into `calls` (keyed by index) and describe it as an event."""
+        index = int(call_delta.get("index", len(calls)))
+        function = call_delta.get("function") or {}
+        call = calls.setdefault(index, {"id": None, "type": "function", "function": {"name": "", "arguments": ""}})
+        if call_delta.get("id"):
+            call["id"] = call_delta["id"]
+        if function.get("name"):
+            call["function"]["name"] += function["name"]
+        arguments = function.get("arguments") or ""
+        call["function"]["arguments"] += arguments
+        return {
+            "type": "tool_call_delta",
+            "index": index,
+            "id": call_delta.get("id"),
+            "name": function.get("name"),
+            "arguments": arguments,
+        }
+
+
+def _check_settings(serving_endpoints: Optional[List[str]] = None) -> None:
     missing = []
-    serving_endpoint = settings.DATABRICKS_SERVING_ENDPOINT
-    host_required = not (serving_endpoint and serving_endpoint.startswith("http"))
-    for key in ("DATABRICKS_API_TOKEN", "DATABRICKS_SERVING_ENDPOINT"):
-        if not getattr(settings, key):
-            missing.append(key)
+    endpoints = serving_endpoints or [settings.DATABRICKS_SERVING_ENDPOINT]
+    host_required = any(endpoint and not endpoint.startswith("http") for endpoint in endpoints)
+    if not settings.DATABRICKS_API_TOKEN:
+        missing.append("DATABRICKS_API_TOKEN")
+    if not all(endpoints):
+        missing.append("DATABRICKS_SERVING_ENDPOINT")
     if host_required and not settings.DATABRICKS_HOST:
         missing.append("DATABRICKS_HOST")
     if missing:
         raise RuntimeError(f"Missing Databricks settings: {', '.join(missing)}")
+
+
+def build_default_client() -> DatabricksLLMClient:
+    _check_settings()
     return DatabricksLLMClient(
         host=settings.DATABRICKS_HOST,
         api_token=settings.DATABRICKS_API_TOKEN,
         serving_endpoint=settings.DATABRICKS_SERVING_ENDPOINT,
         model=settings.DATABRICKS_MODEL or None,
+        transport=shared_transport(),
+        read_timeout=settings.DATABRICKS_READ_TIMEOUT,
+    )
+
+
+class AsyncDatabricksLLMClient(_ServingEndpointClient):
+    """
+    asyncio variant of DatabricksLLMClient (same endpoint, payload and response shape).
+    Uses the pooled AsyncHttpTransport, so many completions can be in flight on one event loop.
+    """
+
+    def __init__(
+        self,
+        host: Optional[str],
+        api_token: str,
+        serving_endpoint: str,
+        model: Optional[str] = None,
+        transport: Optional[AsyncHttpTransport] = None,
+        read_timeout: float = 60.0,
+    ) -> None:
+        super().__init__(
+            host,
+            api_token,
+            serving_endpoint,
+            model,
+            transport if transport is not None else shared_async_transport(),
+            read_timeout,
+        )
+
+    async def chat(self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        body = json.dumps(self._payload(messages, tools))
+        with span("llm_request") as timer:
+            response = await self.transport.post(
+                self._url(), headers=self._headers(), content=body, read_timeout=self.read_timeout
+            )
+            response.raise_for_status()
+            data = response.json()
+            timer.llm_usage(data.get("usage"), len(body))
+        return self._normalize_response(data)
+
+
+def build_default_async_client() -> AsyncDatabricksLLMClient:
+    _check_settings()
+    return AsyncDatabricksLLMClient(
+        host=settings.DATABRICKS_HOST,
+        api_token=settings.DATABRICKS_API_TOKEN,
+        serving_endpoint=settings.DATABRICKS_SERVING_ENDPOINT,
+        model=settings.DATABRICKS_MODEL or None,
+        transport=shared_async_transport(),
+        read_timeout=settings.DATABRICKS_READ_TIMEOUT,
     )
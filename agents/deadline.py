@@ -0,0 +1,75 @@
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+
+class DeadlineExceeded(Exception):
+    """The current request's deadline passed before `stage` could finish; its remaining work is abandoned."""
+
+    def __init__(self, stage: str) -> None:
+        super().__init__(f"Request deadline exceeded ({stage})")
+        self.stage = stage
+
+
+class Deadline:
+    """Absolute point in time (perf_counter clock) after which a request's result is no longer wanted."""
+
+    __slots__ = ("seconds", "expires")
+
+    def __init__(self, seconds: float, started: Optional[float] = None) -> None:
+        self.seconds = seconds
+        self.expires = (time.perf_counter() if started is None else started) + seconds
+
+    def remaining(self) -> float:
+        return self.expires - time.perf_counter()
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0.0
+
+
+_CURRENT: "contextvars.ContextVar[Optional[Deadline]]" = contextvars.ContextVar("agent_deadline", default=None)
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]) -> Iterator[Optional[Deadline]]:
+    """
+    Make `deadline` current for the enclosed code (None: no deadline). Like the request timings, it follows
+    asyncio tasks and `asyncio.to_thread`, and thread-pool work submitted in `contextvars.copy_context()`.
+    """
+    token = _CURRENT.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _CURRENT.reset(token)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _CURRENT.get()
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline (negative once passed); None without a deadline."""
+    deadline = _CURRENT.get()
+    return None if deadline is None else deadline.remaining()
+
+
+def expired() -> bool:
+    deadline = _CURRENT.get()
+    return deadline is not None and deadline.expired()
+
+
+def check_deadline(stage: str) -> None:
+    """Raise DeadlineExceeded if the current deadline has passed."""
+    if expired():
+        raise DeadlineExceeded(stage)
+
+
+def bounded_timeout(timeout: float, stage: str) -> float:
+    """`timeout` capped to the time left before the current deadline; raises DeadlineExceeded once it passed."""
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0.0:
+        raise DeadlineExceeded(stage)
+    return min(timeout, left)
@@ -0,0 +1,220 @@
+"""
+Versioned binary container for the RAG index.
+
+Layout (all integers little-endian):
+    header   : magic (8s) | version (u32) | section count (u32)
+    sections : per section -> name (24s, NUL padded) | offset (u64) | length (u64)
+    payload  : 8-byte aligned raw buffers (numeric arrays, UTF-8 blobs, JSON)
+
+Readers mmap the file and expose numeric sections as zero-copy memoryviews, so
+opening an index is O(1) in corpus size and forked workers share the same pages.
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+MAGIC = b"CTHKIDX\0"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<8sII")
+_NAME_SIZE = 24
+_SECTION = struct.Struct(f"<{_NAME_SIZE}sQQ")
+_LITTLE_ENDIAN = sys.byteorder == "little"
+
+
+class IndexFormatError(ValueError):
+    """Raised when an index file is truncated, foreign or from another format version."""
+
+
+def write_index(path: Path, sections: Dict[str, Tuple[str, Any]]) -> None:
+    """
+    Write sections atomically (temp file + rename) so open mmaps keep the old inode.
+    `sections` maps name -> (typecode, data); typecode "B" means raw bytes.
+    """
+    payloads: List[Tuple[bytes, bytes]] = []
+    for name, (typecode, data) in sections.items():
+        encoded = name.encode("ascii")
+        if len(encoded) > _NAME_SIZE:
+            raise ValueError(f"Section name too long: {name}")
+        payloads.append((encoded, _to_le_bytes(typecode, data)))
+
+    offset = _align(_HEADER.size + _SECTION.size * len(payloads))
+    table = []
+    for encoded, blob in payloads:
+        table.append(_SECTION.pack(encoded, offset, len(blob)))
+        offset = _align(offset + len(blob))
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as fh:
+        fh.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(payloads)))
+        fh.write(b"".join(table))
+        for _, blob in payloads:
+            fh.write(b"\0" * (_align(fh.tell()) - fh.tell()))
+            fh.write(blob)
+    os.replace(tmp_path, path)
+
+
+class IndexFile:
+    """Read-only, mmap-backed view over an index written by write_index."""
+
+    def __init__(self, path: Path) -> None:
+        with open(path, "rb") as fh:
+            try:
+                self._mmap = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as exc:  # empty file
+                raise IndexFormatError(str(exc)) from exc
+        self._view = memoryview(self._mmap)
+        if len(self._view) < _HEADER.size:
+            raise IndexFormatError("Index file truncated")
+        magic, version, count = _HEADER.unpack_from(self._view, 0)
+        if magic != MAGIC:
+            raise IndexFormatError("Not a CRYP-THYNK index file")
+        if version != FORMAT_VERSION:
+            raise IndexFormatError(f"Unsupported index format version {version}")
+        self.sections: Dict[str, Tuple[int, int]] = {}
+        for idx in range(count):
+            raw_name, offset, length = _SECTION.unpack_from(self._view, _HEADER.size + idx * _SECTION.size)
+            if offset + length > len(self._view):
+                raise IndexFormatError("Index file truncated")
+            self.sections[raw_name.rstrip(b"\0").decode("ascii")] = (offset, length)
+
+    @property
+    def size(self) -> int:
+        return len(self._view)
+
+    def blob(self, name: str) -> memoryview:
+        try:
+            offset, length = self.sections[name]
+        except KeyError as exc:
+            raise IndexFormatError(f"Missing section {name}") from exc
+        return self._view[offset : offset + length]
+
+    def array(self, name: str, typecode: str) -> Sequence:
+        """Zero-copy typed view on little-endian hosts; a byte-swapped copy elsewhere."""
+        raw = self.blob(name)
+        if _LITTLE_ENDIAN:
+            return raw.cast(typecode)
+        arr = array(typecode, raw.tobytes())
+        arr.byteswap()
+        return arr
+
+    def json(self, name: str) -> Any:
+        return json.loads(self.blob(name).tobytes().decode("utf-8"))
+
+
+class MmapVocabulary(Mapping[str, int]):
+    """
+    Term -> id mapping read straight from the index.
+    Terms are stored sorted, so lookups binary-search the blob instead of building a dict at load time.
+    """
+
+    def __init__(self, blob: memoryview, offsets: Sequence[int], ids: Sequence[int]) -> None:
+        self._blob = blob
+        self._offsets = offsets
+        self._ids = ids
+
+    def _term_at(self, rank: int) -> bytes:
+        return self._blob[self._offsets[rank] : self._offsets[rank + 1]].tobytes()
+
+    def get(self, term: str, default: Optional[int] = None) -> Optional[int]:  # type: ignore[override]
+        needle = term.encode("utf-8")
+        lo, hi = 0, len(self._ids)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._term_at(mid) < needle:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self._ids) and self._term_at(lo) == needle:
+            return self._ids[lo]
+        return default
+
+    def __getitem__(self, term: str) -> int:
+        term_id = self.get(term)
+        if term_id is None:
+            raise KeyError(term)
+        return term_id
+
+    def __contains__(self, term: object) -> bool:
+        return isinstance(term, str) and self.get(term) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        for rank in range(len(self._ids)):
+            yield self._term_at(rank).decode("utf-8")
+
+    def items(self) -> Iterator[Tuple[str, int]]:  # type: ignore[override]
+        """Sequential (term, id) scan without a binary search per key."""
+        for rank in range(len(self._ids)):
+            yield self._term_at(rank).decode("utf-8"), self._ids[rank]
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+class RecordSequence(Sequence[Dict[str, Any]]):
+    """Offset-indexed JSON records; each record is decoded only when accessed."""
+
+    def __init__(self, blob: memoryview, offsets: Sequence[int]) -> None:
+        self._blob = blob
+        self._offsets = offsets
+
+    def __getitem__(self, idx):  # type: ignore[override]
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(idx)
+        raw = self._blob[self._offsets[idx] : self._offsets[idx + 1]]
+        return json.loads(raw.tobytes().decode("utf-8"))
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+
+def vocabulary_sections(vocabulary: Mapping[str, int]) -> Dict[str, Tuple[str, Any]]:
+    """Encode a vocabulary as sorted term blob + offsets + term ids."""
+    blob = bytearray()
+    offsets = array("q", [0])
+    ids = array("i")
+    for term, term_id in sorted((t.encode("utf-8"), i) for t, i in vocabulary.items()):
+        blob.extend(term)
+        offsets.append(len(blob))
+        ids.append(term_id)
+    return {
+        "terms": ("B", bytes(blob)),
+        "term_offsets": ("q", offsets),
+        "term_ids": ("i", ids),
+    }
+
+
+def record_sections(prefix: str, records: Sequence[Dict[str, Any]]) -> Dict[str, Tuple[str, Any]]:
+    """Encode records as a JSON-per-record blob plus an offset table."""
+    blob = bytearray()
+    offsets = array("q", [0])
+    for record in records:
+        blob.extend(json.dumps(record, separators=(",", ":")).encode("utf-8"))
+        offsets.append(len(blob))
+    return {prefix: ("B", bytes(blob)), f"{prefix}_offsets": ("q", offsets)}
+
+
+def _to_le_bytes(typecode: str, data: Any) -> bytes:
+    if typecode == "B":
+        return bytes(data)
+    if _LITTLE_ENDIAN and isinstance(data, memoryview) and data.format == typecode:
+        return data.tobytes()
+    arr = data if isinstance(data, array) and data.typecode == typecode else array(typecode, data)
+    if not _LITTLE_ENDIAN:
+        arr = array(typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def _align(offset: int, alignment: int = 8) -> int:
+    return (offset + alignment - 1) // alignment * alignment
@@ -0,0 +1,158 @@
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (document key, 1-based page number, page text)
+PageRecord = Tuple[str, int, str]
+
+# Worker-local PdfReader, so consecutive page ranges of one PDF do not re-parse its xref table.
+_WORKER_READER: Dict[str, Any] = {}
+
+
+@dataclass
+class IngestStats:
+    """Throughput counters for one ingestion run."""
+
+    documents: int = 0
+    pages: int = 0
+    chunks: int = 0
+    started_at: float = field(default_factory=time.perf_counter)
+    finished_at: Optional[float] = None
+
+    @property
+    def elapsed(self) -> float:
+        end = self.finished_at if self.finished_at is not None else time.perf_counter()
+        return max(end - self.started_at, 1e-9)
+
+    @property
+    def pages_per_s(self) -> float:
+        return self.pages / self.elapsed
+
+    @property
+    def chunks_per_s(self) -> float:
+        return self.chunks / self.elapsed
+
+    def finish(self) -> None:
+        self.finished_at = time.perf_counter()
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "documents": self.documents,
+            "pages": self.pages,
+            "chunks": self.chunks,
+            "seconds": round(self.elapsed, 3),
+            "pages_per_s": round(self.pages_per_s, 1),
+            "chunks_per_s": round(self.chunks_per_s, 1),
+        }
+
+    def summary(self) -> str:
+        return (
+            f"ingested {self.pages} pages / {self.chunks} chunks from {self.documents} documents "
+            f"in {self.elapsed:.1f}s ({self.pages_per_s:.1f} pages/s, {self.chunks_per_s:.1f} chunks/s)"
+        )
+
+
+def pdf_page_count(path: Path) -> int:
+    try:
+        from PyPDF2 import PdfReader  # type: ignore
+    except ImportError:
+        return 0
+    return len(PdfReader(str(path)).pages)
+
+
+def extract_page_range(path: str, start: int, end: int) -> List[Tuple[int, str]]:
+    """Worker entry point: text of pages [start, end) (0-based) as (1-based page number, text)."""
+    from PyPDF2 import PdfReader  # type: ignore
+
+    reader = _WORKER_READER.get(path)
+    if reader is None:
+        _WORKER_READER.clear()
+        reader = _WORKER_READER[path] = PdfReader(path)
+    return [(idx + 1, reader.pages[idx].extract_text() or "") for idx in range(start, end)]
+
+
+class PageStream:
+    """
+    Streams PDF page text in document/page order.
+    - Page extraction is split into page-range tasks and fanned out over a process pool.
+    - At most `max_in_flight` tasks are outstanding, which bounds the text held in memory.
+    - With workers == 1 (the default) pages are extracted in-process, still one range at a time;
+      workers == 0 uses one process per CPU.
+    """
+
+    def __init__(
+        self,
+        workers: int = 1,
+        pages_per_task: int = 8,
+        max_in_flight: int = 0,
+        progress_every: int = 100,
+        on_progress: Optional[Callable[[IngestStats], None]] = None,
+    ) -> None:
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self.pages_per_task = max(1, pages_per_task)
+        self.max_in_flight = max_in_flight if max_in_flight > 0 else 2 * self.workers
+        self.progress_every = progress_every
+        self.on_progress = on_progress
+
+    def stream(self, documents: Sequence[Tuple[str, Path]], max_pages: int, stats: IngestStats) -> Iterator[PageRecord]:
+        tasks = self._tasks(documents, max_pages, stats)
+        if self.workers <= 1:
+            for key, path, start, end in tasks:
+                for page_number, text in extract_page_range(str(path), start, end):
+                    yield self._record(key, page_number, text, stats)
+            return
+
+        pool = ProcessPoolExecutor(max_workers=self.workers)
+        pending: Deque[Tuple[str, "Future[List[Tuple[int, str]]]"]] = deque()
+        try:
+            for key, path, start, end in tasks:
+                pending.append((key, pool.submit(extract_page_range, str(path), start, end)))
+                if len(pending) >= self.max_in_flight:
+                    yield from self._drain_one(pending, stats)
+            while pending:
+                yield from self._drain_one(pending, stats)
+        finally:
+            # Consumers may stop early (e.g. per-document chunk cap); drop work nobody will read.
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def _tasks(
+        self, documents: Sequence[Tuple[str, Path]], max_pages: int, stats: IngestStats
+    ) -> Iterator[Tuple[str, Path, int, int]]:
+        for key, path in documents:
+            try:
+                total = pdf_page_count(path)
+            except Exception as exc:  # pragma: no cover - defensive: unreadable PDF
+                logger.warning("Skipping %s: %s", path, exc)
+                continue
+            if max_pages:
+                total = min(total, max_pages)
+            stats.documents += 1
+            for start in range(0, total, self.pages_per_task):
+                yield key, path, start, min(start + self.pages_per_task, total)
+
+    def _drain_one(
+        self, pending: Deque[Tuple[str, "Future[List[Tuple[int, str]]]"]], stats: IngestStats
+    ) -> Iterator[PageRecord]:
+        key, future = pending.popleft()
+        try:
+            pages = future.result()
+        except Exception as exc:  # pragma: no cover - defensive: corrupt page range
+            logger.warning("Page extraction failed for %s: %s", key, exc)
+            return
+        for page_number, text in pages:
+            yield self._record(key, page_number, text, stats)
+
+    def _record(self, key: str, page_number: int, text: str, stats: IngestStats) -> PageRecord:
+        stats.pages += 1
+        if self.progress_every and stats.pages % self.progress_every == 0:
+            logger.info(stats.summary())
+            if self.on_progress:
+                self.on_progress(stats)
+        return key, page_number, text
@@ -0,0 +1,235 @@
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+
+from .cache import SqliteCache
+
+logger = logging.getLogger(__name__)
+
+# Per-request cache modes:
+# - readwrite: serve hits, store misses
+# - readonly: serve hits, never store
+# - refresh: always call the endpoint and overwrite the entry
+# - bypass: neither read nor write
+CACHE_MODES = ("readwrite", "readonly", "refresh", "bypass")
+# Bump when the canonical form or the stored response shape changes.
+_KEY_VERSION = 1
+
+
+def cache_key(model: str, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]]) -> str:
+    """
+    Stable hash of a chat request. Canonicalisation: dict keys sorted, None-valued fields dropped
+    (an absent `content` and `content: null` mean the same), tool schemas put in a canonical order.
+    Message order and text are kept verbatim.
+    """
+    canonical_tools = sorted(
+        (_canonical(tool) for tool in tools or []),
+        key=lambda tool: json.dumps(tool, sort_keys=True),
+    )
+    payload = {
+        "v": _KEY_VERSION,
+        "model": model,
+        "messages": [_canonical(message) for message in messages],
+        "tools": canonical_tools,
+    }
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def _canonical(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {key: _canonical(item) for key, item in value.items() if item is not None}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    return value
+
+
+class CachedLLMClient:
+    """
+    Completion cache in front of an LLM client (`chat` / `chat_stream`, e.g. DatabricksLLMClient).
+    - Keyed on the canonicalised messages, tool schemas and model/endpoint (see `cache_key`).
+    - Stored in a SqliteCache, so every worker process on the host shares the hits.
+    - `cache_mode` selects readwrite / readonly / refresh / bypass per call.
+    - Results carry a `cache` entry: status (hit, miss, refresh, bypass), lookup time and, for hits,
+      the latency of the original call that was saved. Process counters are in `counters()`; `stats()` adds
+      the table size, which scans the table.
+    Only successful completions are stored; errors always reach the caller.
+    """
+
+    def __init__(self, llm: Any, cache: SqliteCache, default_mode: str = "readwrite") -> None:
+        if default_mode not in CACHE_MODES:
+            raise ValueError(f"Unknown LLM cache mode {default_mode!r} (expected one of {', '.join(CACHE_MODES)})")
+        self.llm = llm
+        self.cache = cache
+        self.default_mode = default_mode
+        self._lock = threading.Lock()
+        self.saved_seconds = 0.0
+        self.bypassed = 0
+
+    @property
+    def model(self) -> str:
+        return getattr(self.llm, "model", None) or getattr(self.llm, "serving_endpoint", "") or ""
+
+    def chat(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]] = None,
+        cache_mode: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        mode = self._mode(cache_mode)
+        key = cache_key(self.model, messages, tools)
+        hit, info = self._lookup(key, mode)
+        if hit is not None:
+            return {**hit, "cache": info}
+        started = time.perf_counter()
+        result = self.llm.chat(messages=messages, tools=tools)
+        elapsed = time.perf_counter() - started
+        self._store(key, mode, result, elapsed)
+        return {**result, "cache": {**info, "llm_ms": round(1000 * elapsed, 1)}}
+
+    def chat_stream(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]] = None,
+        cache_mode: Optional[str] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """`chat_stream` of the wrapped client; a hit is replayed as one delta followed by `done`."""
+        mode = self._mode(cache_mode)
+        key = cache_key(self.model, messages, tools)
+        hit, info = self._lookup(key, mode)
+        if hit is not None:
+            if hit.get("message"):
+                yield {"type": "delta", "content": hit["message"]}
+            yield {"type": "done", **hit, "ttft": info["lookup_ms"] / 1000, "cache": info}
+            return
+        started = time.perf_counter()
+        for event in self.llm.chat_stream(messages=messages, tools=tools):
+            if event["type"] == "done":
+                elapsed = time.perf_counter() - started
+                result = {name: event.get(name) for name in ("message", "tool_calls", "raw")}
+                self._store(key, mode, result, elapsed)
+                event = {**event, "cache": {**info, "llm_ms": round(1000 * elapsed, 1)}}
+            yield event
+
+    def counters(self) -> Dict[str, Any]:
+        return {
+            **self.cache.counters(),
+            "default_mode": self.default_mode,
+            "bypassed": self.bypassed,
+            "saved_ms": round(1000 * self.saved_seconds, 1),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.cache.stats(), **self.counters()}
+
+    def _mode(self, cache_mode: Optional[str]) -> str:
+        mode = cache_mode or self.default_mode
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown LLM cache mode {mode!r} (expected one of {', '.join(CACHE_MODES)})")
+        return mode
+
+    def _lookup(self, key: str, mode: str) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+        info: Dict[str, Any] = {"status": mode if mode in ("bypass", "refresh") else "miss", "key": key[:16]}
+        if mode in ("bypass", "refresh"):
+            with self._lock:
+                self.bypassed += 1
+            info["lookup_ms"] = 0.0
+            return None, info
+        started = time.perf_counter()
+        try:
+            found = self.cache.get_with_meta(key)
+            hit = json.loads(found[0]) if found is not None else None
+        except Exception as exc:  # a broken cache must never fail the request
+            logger.warning("LLM cache lookup failed: %s", exc)
+            found = hit = None
+        lookup = time.perf_counter() - started
+        info["lookup_ms"] = round(1000 * lookup, 3)
+        if hit is None or found is None:
+            return None, info
+        saved = max(0.0, found[1] - lookup)
+        with self._lock:
+            self.saved_seconds += saved
+        info.update(status="hit", saved_ms=round(1000 * saved, 1))
+        return hit, info
+
+    def _store(self, key: str, mode: str, result: Dict[str, Any], elapsed: float) -> None:
+        if mode in ("readonly", "bypass"):
+            return
+        try:
+            stored = {
+                "message": result.get("message", ""),
+                "tool_calls": result.get("tool_calls") or [],
+                "raw": result.get("raw"),
+            }
+            value = json.dumps(stored).encode("utf-8")
+            self.cache.set(key, value, meta=elapsed)
+        except Exception as exc:  # pragma: no cover - defensive
+            logger.warning("LLM cache store failed: %s", exc)
+
+
+class AsyncCachedLLMClient(CachedLLMClient):
+    """CachedLLMClient for an async client (e.g. AsyncDatabricksLLMClient); SQLite access runs in a thread."""
+
+    async def chat(  # type: ignore[override]
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]] = None,
+        cache_mode: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        mode = self._mode(cache_mode)
+        key = cache_key(self.model, messages, tools)
+        hit, info = await asyncio.to_thread(self._lookup, key, mode)
+        if hit is not None:
+            return {**hit, "cache": info}
+        started = time.perf_counter()
+        result = await self.llm.chat(messages=messages, tools=tools)
+        elapsed = time.perf_counter() - started
+        await asyncio.to_thread(self._store, key, mode, result, elapsed)
+        return {**result, "cache": {**info, "llm_ms": round(1000 * elapsed, 1)}}
+
+    def chat_stream(  # type: ignore[override]
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]] = None,
+        cache_mode: Optional[str] = None,
+    ) -> Any:
+        """The wrapped client's `chat_stream`, uncached (streams are not replayed from the cache here)."""
+        return self.llm.chat_stream(messages=messages, tools=tools)
+
+
+_SHARED_CACHE: Optional[SqliteCache] = None
+_SHARED_CACHE_LOCK = threading.Lock()
+
+
+def shared_llm_cache() -> SqliteCache:
+    """Process-wide SqliteCache from settings (one per process; the database file is shared)."""
+    global _SHARED_CACHE
+    with _SHARED_CACHE_LOCK:
+        if _SHARED_CACHE is None:
+            _SHARED_CACHE = SqliteCache(
+                settings.LLM_CACHE_PATH,
+                ttl=settings.LLM_CACHE_TTL,
+                max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+                max_bytes=settings.LLM_CACHE_MAX_MB * 1024 * 1024,
+                evict_interval=settings.LLM_CACHE_EVICT_INTERVAL,
+            )
+        return _SHARED_CACHE
+
+
+def build_default_llm_cache(llm: Any) -> Any:
+    """Wrap `llm` in a CachedLLMClient per settings, or return it unchanged when LLM_CACHE_MODE is off."""
+    if settings.LLM_CACHE_MODE == "off":
+        return llm
+    return CachedLLMClient(llm, shared_llm_cache(), default_mode=settings.LLM_CACHE_MODE)
+
+
+def build_default_async_llm_cache(llm: Any) -> Any:
+    if settings.LLM_CACHE_MODE == "off":
+        return llm
+    return AsyncCachedLLMClient(llm, shared_llm_cache(), default_mode=settings.LLM_CACHE_MODE)
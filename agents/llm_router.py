@@ -0,0 +1,451 @@
+import asyncio
+import contextvars
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+
+from .databricks_client import (
+    AsyncDatabricksLLMClient,
+    DatabricksLLMClient,
+    _check_settings,
+    build_default_async_client,
+    build_default_client,
+)
+from .deadline import DeadlineExceeded
+from .transport import shared_async_transport, shared_transport
+
+# Latency samples kept per endpoint for quantiles (hedge delay, p50/p95 in stats).
+_LATENCY_WINDOW = 256
+
+
+class EndpointState:
+    """Routing state and counters of one serving endpoint."""
+
+    def __init__(self, name: str, client: Any) -> None:
+        self.name = name
+        self.client = client
+        self.ewma: Optional[float] = None  # seconds
+        self.outstanding = 0
+        self.latencies: Deque[float] = deque(maxlen=_LATENCY_WINDOW)
+        self.consecutive_failures = 0
+        self.open_until = 0.0  # circuit open until this clock time (0 = closed)
+        self.probing = False  # a half-open trial request is in flight
+        self.requests = 0
+        self.errors = 0
+        self.circuit_opens = 0
+        self.hedges = 0  # backup requests sent to this endpoint
+        self.hedge_wins = 0
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def state(self, now: float) -> str:
+        if not self.open_until:
+            return "closed"
+        return "open" if self.open_until > now else "half_open"
+
+
+class _RouterBase:
+    """
+    Endpoint selection, circuit breaking and metrics shared by LLMRouter and AsyncLLMRouter.
+    - Selection: lowest EWMA latency x (outstanding + 1); endpoints without samples go first.
+    - Circuit breaker: `failure_threshold` consecutive failures (connection errors, 429, 5xx) open
+      the circuit for `cooldown` seconds; then one trial request is let through (half-open) and its
+      outcome closes or re-opens it. Client errors (other 4xx) are the caller's fault and not counted.
+    - Hedging (optional): if the chosen endpoint has not answered after its `hedge_quantile` latency
+      (at least `hedge_min_delay`, once `hedge_min_samples` latencies are known), a backup request goes
+      to the next best endpoint; the first success wins and the other request is cancelled.
+    A failed request is retried on the next endpoint until every endpoint has been tried once.
+    """
+
+    def __init__(
+        self,
+        endpoints: Sequence[Tuple[str, Any]],
+        ewma_alpha: float = 0.3,
+        failure_threshold: int = 3,
+        cooldown: float = 30.0,
+        hedge: bool = False,
+        hedge_quantile: float = 0.95,
+        hedge_min_delay: float = 0.05,
+        hedge_min_samples: int = 20,
+        model: Optional[str] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if not endpoints:
+            raise ValueError("LLM router needs at least one endpoint")
+        self.endpoints = [EndpointState(name, client) for name, client in endpoints]
+        self.ewma_alpha = ewma_alpha
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_min_samples = hedge_min_samples
+        # Replicas serve the same model, so caches key on it rather than on the endpoint that answered.
+        self.model = model or "|".join(sorted(state.name for state in self.endpoints))
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.hedges_fired = 0
+        self.failovers = 0
+
+    def _select(self, exclude: Sequence[EndpointState] = ()) -> Optional[EndpointState]:
+        """Pick the best available endpoint and count the request as outstanding on it."""
+        with self._lock:
+            now = self._clock()
+            best: Optional[EndpointState] = None
+            best_score = 0.0
+            for state in self.endpoints:
+                if state in exclude:
+                    continue
+                circuit = state.state(now)
+                if circuit == "open" or (circuit == "half_open" and state.probing):
+                    continue
+                score = 0.0 if state.ewma is None else state.ewma * (state.outstanding + 1)
+                if best is None or score < best_score or (score == best_score and random.random() < 0.5):
+                    best, best_score = state, score
+            if best is not None:
+                best.outstanding += 1
+                if best.state(now) == "half_open":
+                    best.probing = True
+            return best
+
+    def _release(self, state: EndpointState, elapsed: Optional[float], failure: bool) -> None:
+        """Record the outcome of a request; `elapsed` is None when it was cancelled or not the endpoint's fault."""
+        with self._lock:
+            state.outstanding -= 1
+            state.requests += 1
+            if failure:
+                state.errors += 1
+                state.consecutive_failures += 1
+                if state.probing or state.consecutive_failures >= self.failure_threshold:
+                    state.open_until = self._clock() + self.cooldown
+                    state.circuit_opens += 1
+            elif elapsed is not None:
+                state.consecutive_failures = 0
+                state.open_until = 0.0
+                state.latencies.append(elapsed)
+                state.ewma = elapsed if state.ewma is None else (
+                    self.ewma_alpha * elapsed + (1 - self.ewma_alpha) * state.ewma
+                )
+            state.probing = False
+
+    def _hedge_delay(self, state: EndpointState) -> Optional[float]:
+        if not self.hedge or len(self.endpoints) < 2 or len(state.latencies) < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay, state.quantile(self.hedge_quantile) or 0.0)
+
+    def _record_failover(self) -> None:
+        with self._lock:
+            self.failovers += 1
+
+    def _record_hedge(self, backup: EndpointState) -> None:
+        with self._lock:
+            self.hedges_fired += 1
+            backup.hedges += 1
+
+    def _record_hedge_win(self, winner: EndpointState) -> None:
+        with self._lock:
+            winner.hedge_wins += 1
+
+    @staticmethod
+    def _endpoint_failure(exc: BaseException) -> bool:
+        """
+        Whether an error says something about the endpoint (vs. a bad request that fails anywhere, or the
+        request's own deadline running out).
+        """
+        if isinstance(exc, DeadlineExceeded):
+            return False
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+        return status is None or status == 429 or status >= 500
+
+    def _no_endpoint(self, last_error: Optional[BaseException]) -> BaseException:
+        if last_error is not None:
+            return last_error
+        return RuntimeError("No LLM endpoint available (all circuits open)")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = self._clock()
+            endpoints = []
+            for state in self.endpoints:
+                p50, p95 = state.quantile(0.5), state.quantile(0.95)
+                endpoints.append(
+                    {
+                        "name": state.name,
+                        "state": state.state(now),
+                        "ewma_ms": round(1000 * state.ewma, 1) if state.ewma is not None else None,
+                        "p50_ms": round(1000 * p50, 1) if p50 is not None else None,
+                        "p95_ms": round(1000 * p95, 1) if p95 is not None else None,
+                        "outstanding": state.outstanding,
+                        "requests": state.requests,
+                        "errors": state.errors,
+                        "consecutive_failures": state.consecutive_failures,
+                        "circuit_opens": state.circuit_opens,
+                        "hedges": state.hedges,
+                        "hedge_wins": state.hedge_wins,
+                    }
+                )
+            return {
+                "endpoints": endpoints,
+                "hedge": self.hedge,
+                "hedges_fired": self.hedges_fired,
+                "failovers": self.failovers,
+            }
+
+    @staticmethod
+    def _route(state: EndpointState, attempts: int, hedged: bool) -> Dict[str, Any]:
+        return {"endpoint": state.name, "attempts": attempts, "hedged": hedged}
+
+
+class LLMRouter(_RouterBase):
+    """
+    `DatabricksLLMClient.chat` / `chat_stream` over several serving endpoints (see _RouterBase).
+    Hedged requests run on a small thread pool; a losing request that is already on the wire cannot be
+    interrupted, so it is abandoned (it still finishes and feeds its endpoint's latency stats).
+    Streaming calls are routed and failed over before the first event, but never hedged.
+    """
+
+    def __init__(self, endpoints: Sequence[Tuple[str, Any]], hedge_workers: int = 8, **kwargs: Any) -> None:
+        super().__init__(endpoints, **kwargs)
+        self.hedge_workers = hedge_workers
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def chat(self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        tried: List[EndpointState] = []
+        last_error: Optional[BaseException] = None
+        while True:
+            state = self._select(exclude=tried)
+            if state is None:
+                raise self._no_endpoint(last_error)
+            tried.append(state)
+            try:
+                result, winner, hedged = self._call(state, messages, tools, tried)
+            except Exception as exc:
+                if not self._endpoint_failure(exc):
+                    raise
+                last_error = exc
+                self._record_failover()
+                continue
+            return {**result, "route": self._route(winner, len(tried), hedged)}
+
+    def chat_stream(
+        self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None
+    ) -> Iterator[Dict[str, Any]]:
+        tried: List[EndpointState] = []
+        last_error: Optional[BaseException] = None
+        while True:
+            state = self._select(exclude=tried)
+            if state is None:
+                raise self._no_endpoint(last_error)
+            tried.append(state)
+            started = time.perf_counter()
+            outcome: Tuple[Optional[float], bool] = (None, False)
+            emitted = False
+            try:
+                for event in state.client.chat_stream(messages=messages, tools=tools):
+                    emitted = True
+                    if event["type"] == "done":
+                        event = {**event, "route": self._route(state, len(tried), False)}
+                        outcome = (time.perf_counter() - started, False)
+                    yield event
+                return
+            except Exception as exc:
+                outcome = (None, self._endpoint_failure(exc))
+                if emitted or not outcome[1]:
+                    raise
+                last_error = exc
+                self._record_failover()
+            finally:
+                self._release(state, *outcome)
+
+    def _call(
+        self,
+        state: EndpointState,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]],
+        tried: List[EndpointState],
+    ) -> Tuple[Dict[str, Any], EndpointState, bool]:
+        delay = self._hedge_delay(state)
+        if delay is None:
+            return self._invoke(state, messages, tools), state, False
+        pool = self._executor()
+        # Copies of the caller's context, so the calls' spans count toward the current request.
+        primary = pool.submit(contextvars.copy_context().run, self._invoke, state, messages, tools)
+        done, _ = wait([primary], timeout=delay)
+        backup_state = None if done else self._select(exclude=tried)
+        if backup_state is None:
+            return primary.result(), state, False
+        tried.append(backup_state)
+        self._record_hedge(backup_state)
+        backup = pool.submit(contextvars.copy_context().run, self._invoke, backup_state, messages, tools)
+        futures = {primary: state, backup: backup_state}
+        pending = set(futures)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for loser in pending:
+                        loser.cancel()
+                    self._record_hedge_win(futures[future])
+                    return future.result(), futures[future], True
+                error = future.exception()
+        assert error is not None
+        raise error
+
+    def _invoke(
+        self, state: EndpointState, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            result = state.client.chat(messages=messages, tools=tools)
+        except Exception as exc:
+            self._release(state, None, self._endpoint_failure(exc))
+            raise
+        self._release(state, time.perf_counter() - started, False)
+        return result
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.hedge_workers, thread_name_prefix="llm-hedge")
+            return self._pool
+
+
+class AsyncLLMRouter(_RouterBase):
+    """asyncio variant of LLMRouter over async clients; the losing hedged request is really cancelled."""
+
+    async def chat(self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        tried: List[EndpointState] = []
+        last_error: Optional[BaseException] = None
+        while True:
+            state = self._select(exclude=tried)
+            if state is None:
+                raise self._no_endpoint(last_error)
+            tried.append(state)
+            try:
+                result, winner, hedged = await self._call(state, messages, tools, tried)
+            except Exception as exc:
+                if not self._endpoint_failure(exc):
+                    raise
+                last_error = exc
+                self._record_failover()
+                continue
+            return {**result, "route": self._route(winner, len(tried), hedged)}
+
+    async def _call(
+        self,
+        state: EndpointState,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]],
+        tried: List[EndpointState],
+    ) -> Tuple[Dict[str, Any], EndpointState, bool]:
+        delay = self._hedge_delay(state)
+        if delay is None:
+            return await self._invoke(state, messages, tools), state, False
+        primary = asyncio.ensure_future(self._invoke(state, messages, tools))
+        done, _ = await asyncio.wait([primary], timeout=delay)
+        backup_state = None if done else self._select(exclude=tried)
+        if backup_state is None:
+            return await primary, state, False
+        tried.append(backup_state)
+        self._record_hedge(backup_state)
+        tasks = {primary: state, asyncio.ensure_future(self._invoke(backup_state, messages, tools)): backup_state}
+        pending = set(tasks)
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self._record_hedge_win(tasks[task])
+                        return task.result(), tasks[task], True
+                    error = task.exception()
+        finally:
+            for loser in pending:
+                loser.cancel()
+        assert error is not None
+        raise error
+
+    async def _invoke(
+        self, state: EndpointState, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            result = await state.client.chat(messages=messages, tools=tools)
+        except asyncio.CancelledError:
+            self._release(state, None, False)
+            raise
+        except Exception as exc:
+            self._release(state, None, self._endpoint_failure(exc))
+            raise
+        self._release(state, time.perf_counter() - started, False)
+        return result
+
+
+def _router_options() -> Dict[str, Any]:
+    return {
+        "failure_threshold": settings.LLM_ROUTER_FAILURE_THRESHOLD,
+        "cooldown": settings.LLM_ROUTER_COOLDOWN,
+        "hedge": settings.LLM_ROUTER_HEDGE,
+        "hedge_quantile": settings.LLM_ROUTER_HEDGE_QUANTILE,
+        "hedge_min_delay": settings.LLM_ROUTER_HEDGE_MIN_DELAY,
+        "model": settings.DATABRICKS_MODEL or None,
+    }
+
+
+def _endpoint_specs() -> List[str]:
+    return [spec.strip() for spec in settings.DATABRICKS_SERVING_ENDPOINTS.split(",") if spec.strip()]
+
+
+def build_default_router() -> Any:
+    """LLMRouter over DATABRICKS_SERVING_ENDPOINTS, or the single-endpoint client when fewer than two are set."""
+    specs = _endpoint_specs()
+    if len(specs) < 2:
+        return build_default_client()
+    _check_settings(specs)
+    clients = [
+        (
+            spec,
+            DatabricksLLMClient(
+                host=settings.DATABRICKS_HOST,
+                api_token=settings.DATABRICKS_API_TOKEN,
+                serving_endpoint=spec,
+                model=settings.DATABRICKS_MODEL or None,
+                transport=shared_transport(),
+                read_timeout=settings.DATABRICKS_READ_TIMEOUT,
+            ),
+        )
+        for spec in specs
+    ]
+    return LLMRouter(clients, **_router_options())
+
+
+def build_default_async_router() -> Any:
+    specs = _endpoint_specs()
+    if len(specs) < 2:
+        return build_default_async_client()
+    _check_settings(specs)
+    clients = [
+        (
+            spec,
+            AsyncDatabricksLLMClient(
+                host=settings.DATABRICKS_HOST,
+                api_token=settings.DATABRICKS_API_TOKEN,
+                serving_endpoint=spec,
+                model=settings.DATABRICKS_MODEL or None,
+                transport=shared_async_transport(),
+                read_timeout=settings.DATABRICKS_READ_TIMEOUT,
+            ),
+        )
+        for spec in specs
+    ]
+    return AsyncLLMRouter(clients, **_router_options())
@@ -0,0 +1,21 @@
+import json
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError
+
+from agents.warmup import readiness, warm_up
+
+
+class Command(BaseCommand):
+    help = "Build (or refresh) the RAG index cache and the agent clients, then report warm-up time and index size."
+
+    def add_arguments(self, parser: Any) -> None:
+        parser.add_argument("--index-only", action="store_true", help="Only build the RAG index, not the agents.")
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        if readiness()["status"] != "ready":  # AGENT_WARMUP already warmed this process in AgentsConfig.ready
+            warm_up(agents=not options["index_only"])
+        state = readiness()
+        self.stdout.write(json.dumps(state, indent=2))
+        if state["status"] != "ready":
+            raise CommandError(f"Warm-up failed: {state.get('errors')}")
@@ -0,0 +1,122 @@
+from typing import TYPE_CHECKING, Any, Dict, List, Sequence, Tuple
+
+if TYPE_CHECKING:  # pragma: no cover - typing only
+    from .vector_store import TfidfVectorStore
+
+
+def numpy_available() -> bool:
+    try:
+        import numpy  # type: ignore  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def scipy_available() -> bool:
+    try:
+        from scipy import sparse  # type: ignore  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+# Largest (terms x docs) float32 block the "auto" backend builds without SciPy; bigger indexes keep the postings path.
+DENSE_MAX_BYTES = 64 * 1024 * 1024
+
+
+def dense_nbytes(num_terms: int, num_docs: int) -> int:
+    """Size of the dense fallback matrix for an index of this shape."""
+    return num_terms * num_docs * 4
+
+
+class MatrixScorer:
+    """
+    Optional NumPy (+ SciPy sparse) scoring backend for TfidfVectorStore.
+    - Holds the term-document weight matrix as one contiguous array (CSR when SciPy is installed).
+    - Scores a whole batch of queries with a single matrix product.
+    - Picks top-k per query with argpartition instead of a full sort.
+    """
+
+    def __init__(self, store: "TfidfVectorStore") -> None:
+        import numpy as np  # type: ignore
+
+        self._np = np
+        self.num_docs = store.num_docs
+        self.num_terms = len(store.posting_offsets) - 1
+        offsets = np.asarray(store.posting_offsets, dtype=np.int64)
+        docs = np.asarray(store.posting_docs, dtype=np.int32)
+        tfs = np.asarray(store.posting_tfs, dtype=np.float64)
+        terms = np.repeat(np.arange(self.num_terms, dtype=np.int32), np.diff(offsets))
+        lengths = np.asarray(store.doc_lengths, dtype=np.float64)
+
+        if store.scoring == "bm25":
+            df = np.diff(offsets).astype(np.float64)
+            idf = np.log(1.0 + (self.num_docs - df + 0.5) / (df + 0.5))
+            avg_len = store.avg_doc_length or 1.0
+            k1, b = store.bm25_k1, store.bm25_b
+            length_norm = 1.0 - b + b * (lengths[docs] / avg_len)
+            data = idf[terms] * tfs * (k1 + 1.0) / (tfs + k1 * length_norm)
+        elif store.scoring == "keyword":
+            data = np.ones_like(tfs)
+        else:
+            idf = np.asarray(store.idf, dtype=np.float64)
+            denom = lengths[docs] * np.asarray(store.doc_norms, dtype=np.float64)[docs]
+            data = np.divide(tfs * idf[terms], denom, out=np.zeros_like(tfs), where=denom > 0)
+
+        self.matrix: Any
+        try:
+            from scipy import sparse  # type: ignore
+        except ImportError:
+            # Dense fallback: one (terms x docs) float32 block.
+            self.sparse = False
+            self.matrix = np.zeros((self.num_terms, self.num_docs), dtype=np.float32)
+            self.matrix[terms, docs] = data
+        else:
+            # The postings already are CSR rows keyed by term id.
+            self.sparse = True
+            self.matrix = sparse.csr_matrix(
+                (data.astype(np.float32), docs, offsets), shape=(self.num_terms, self.num_docs)
+            )
+
+    def nbytes(self) -> int:
+        if self.sparse:
+            return int(self.matrix.data.nbytes + self.matrix.indices.nbytes + self.matrix.indptr.nbytes)
+        return int(self.matrix.nbytes)
+
+    def score_batch(self, query_weights: Sequence[Dict[int, float]]) -> Any:
+        """Return a dense (queries x docs) score matrix from one matrix product."""
+        np = self._np
+        rows: List[int] = []
+        cols: List[int] = []
+        vals: List[float] = []
+        for row, weights in enumerate(query_weights):
+            for term_id, weight in weights.items():
+                rows.append(row)
+                cols.append(term_id)
+                vals.append(weight)
+        shape = (len(query_weights), self.num_terms)
+        if self.sparse:
+            from scipy import sparse  # type: ignore
+
+            q_matrix = sparse.csr_matrix((np.asarray(vals, dtype=np.float32), (rows, cols)), shape=shape)
+            return (q_matrix @ self.matrix).toarray()
+        q_matrix = np.zeros(shape, dtype=np.float32)
+        q_matrix[rows, cols] = vals
+        return q_matrix @ self.matrix
+
+    def top_k(self, scores: Any, k: int) -> List[List[Tuple[int, float]]]:
+        """Per-row top-k (doc index, score) pairs with positive scores, best first."""
+        np = self._np
+        results: List[List[Tuple[int, float]]] = []
+        if k <= 0 or self.num_docs == 0:
+            return [[] for _ in range(scores.shape[0])]
+        kk = min(k, self.num_docs)
+        for row in scores:
+            if kk < self.num_docs:
+                candidates = np.argpartition(-row, kk - 1)[:kk]
+            else:
+                candidates = np.arange(self.num_docs)
+            # Best score first, ties broken by doc index like the pure-Python path.
+            order = candidates[np.lexsort((candidates, -row[candidates]))]
+            results.append([(int(idx), float(row[idx])) for idx in order if row[idx] > 0])
+        return results
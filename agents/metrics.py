@@ -0,0 +1,269 @@
+import contextvars
+import math
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+FAST_SECONDS_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+TOKEN_BUCKETS = (128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+BYTE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# name -> (type, help, histogram buckets)
+METRICS: Dict[str, Tuple[str, str, Sequence[float]]] = {
+    "agent_requests_total": ("counter", "Agent API requests by endpoint and HTTP status.", ()),
+    "agent_request_seconds": ("histogram", "Agent API request latency by endpoint.", SECONDS_BUCKETS),
+    "agent_stage_seconds": ("histogram", "Time spent per stage (span) of an agent request.", SECONDS_BUCKETS),
+    "agent_stage_errors_total": ("counter", "Stages that ended with an exception.", ()),
+    "agent_llm_tokens_total": ("counter", "LLM tokens reported in `usage`, by kind (prompt/completion).", ()),
+    "agent_llm_prompt_tokens": ("histogram", "Prompt tokens per LLM call (from `usage`).", TOKEN_BUCKETS),
+    "agent_llm_prompt_bytes": ("histogram", "Request body size per LLM call.", BYTE_BUCKETS),
+    "agent_response_uncompressed_bytes": ("histogram", "JSON response size before compression.", BYTE_BUCKETS),
+    "agent_response_bytes": ("histogram", "JSON response size sent, by content coding.", BYTE_BUCKETS),
+    "agent_response_encode_seconds": ("histogram", "JSON serialisation time, by encoder.", FAST_SECONDS_BUCKETS),
+    "agent_response_compress_seconds": ("histogram", "Response compression time, by coding.", FAST_SECONDS_BUCKETS),
+    "agent_admission_in_flight": ("gauge", "Agent runs currently admitted.", ()),
+    "agent_admission_queue_depth": ("gauge", "Requests waiting for an admission slot.", ()),
+    "agent_admission_wait_seconds": ("histogram", "Time admitted requests waited in the queue.", SECONDS_BUCKETS),
+    "agent_admission_shed_total": ("counter", "Requests rejected with 429, by reason (queue_full/queue_timeout).", ()),
+    "agent_llm_cache_entries": ("gauge", "Rows in the LLM cache database (counted when metrics are scraped).", ()),
+    "agent_llm_cache_bytes": ("gauge", "Stored size of the LLM cache database's values.", ()),
+    "agent_deadline_exceeded_total": ("counter", "Requests abandoned at their deadline, by endpoint and stage.", ()),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot: above the largest bound (+Inf)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    In-process counters, gauges and histograms rendered in the Prometheus text format (version 0.0.4).
+    - Metric names, types and buckets come from METRICS; samples are keyed by their label set.
+    - Thread-safe; one registry per process (`shared_metrics`), so each worker exposes its own numbers.
+    - With `enabled=False` every update is a no-op.
+    """
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._gauges: Dict[Tuple[str, Labels], float] = {}
+        self._histograms: Dict[Tuple[str, Labels], _Histogram] = {}
+
+    def inc(self, name: str, amount: float = 1.0, **labels: str) -> None:
+        if not self.enabled:
+            return
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + amount
+
+    def set(self, name: str, value: float, **labels: str) -> None:
+        if not self.enabled:
+            return
+        key = (name, _labels(labels))
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        if not self.enabled:
+            return
+        key = (name, _labels(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(METRICS[name][2])
+            histogram.observe(value)
+
+    def render(self) -> str:
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            histograms = {key: (list(h.counts), h.sum, h.count, h.buckets) for key, h in self._histograms.items()}
+        lines: List[str] = []
+        for name, (kind, help_text, _) in METRICS.items():
+            values = {"counter": counters, "gauge": gauges}.get(kind)
+            series = sorted(key for key in (histograms if values is None else values) if key[0] == name)
+            if not series:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key in series:
+                labels = key[1]
+                if values is not None:
+                    lines.append(f"{name}{_format_labels(labels)} {_number(values[key])}")
+                    continue
+                counts, total, count, buckets = histograms[key]
+                cumulative = 0
+                for bound, bucket_count in zip(list(buckets) + [math.inf], counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == math.inf else _number(bound)
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_number(total)}")
+                lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+
+class RequestTimings:
+    """
+    Per-request totals of the spans that ended while it was current (see `collect_timings`):
+    milliseconds per stage (summed when a stage repeats, e.g. concurrent tool calls) and LLM usage.
+    """
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._stages: Dict[str, float] = {}
+        self._llm: Dict[str, int] = {}
+
+    def add_stage(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self._stages[stage] = self._stages.get(stage, 0.0) + seconds
+
+    def add_llm(self, **values: int) -> None:
+        with self._lock:
+            for key, value in values.items():
+                self._llm[key] = self._llm.get(key, 0) + value
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Flat numbers: `<stage>_ms` for every stage, `total_ms` so far, and `llm_*` call/token/byte counts."""
+        with self._lock:
+            timings: Dict[str, Any] = {f"{stage}_ms": round(1000 * s, 1) for stage, s in self._stages.items()}
+            timings.update(self._llm)
+        timings["total_ms"] = round(1000 * (time.perf_counter() - self.started), 1)
+        return timings
+
+
+_CURRENT: "contextvars.ContextVar[Optional[RequestTimings]]" = contextvars.ContextVar("agent_timings", default=None)
+
+
+@contextmanager
+def collect_timings() -> Iterator[RequestTimings]:
+    """
+    Make a fresh RequestTimings current for the enclosed code. Context variables follow asyncio tasks and
+    `asyncio.to_thread`; work submitted to a thread pool must run in `contextvars.copy_context()` to be counted.
+    """
+    timings = RequestTimings()
+    token = _CURRENT.set(timings)
+    try:
+        yield timings
+    finally:
+        _CURRENT.reset(token)
+
+
+def current_timings() -> Optional[RequestTimings]:
+    return _CURRENT.get()
+
+
+class Span:
+    """
+    Times one stage: feeds `agent_stage_seconds{stage=...}` and the current request's timings when it ends.
+    Usable as a (sync) context manager, also around `await` and `yield`; `llm_usage` attaches token counts.
+    """
+
+    __slots__ = ("stage", "started", "elapsed", "_timings")
+
+    def __init__(self, stage: str) -> None:
+        self.stage = stage
+        self.started = time.perf_counter()
+        self.elapsed: Optional[float] = None
+        self._timings = _CURRENT.get()
+
+    def __enter__(self) -> "Span":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        self.end(failed=exc_type is not None and not issubclass(exc_type, GeneratorExit))
+
+    def end(self, failed: bool = False) -> float:
+        elapsed = self.elapsed = time.perf_counter() - self.started
+        registry = shared_metrics()
+        registry.observe("agent_stage_seconds", elapsed, stage=self.stage)
+        if failed:
+            registry.inc("agent_stage_errors_total", stage=self.stage)
+        if self._timings is not None:
+            self._timings.add_stage(self.stage, elapsed)
+        return elapsed
+
+    def llm_usage(self, usage: Any, prompt_bytes: int) -> None:
+        """Record one LLM call: its request size and the prompt/completion tokens of its `usage` field."""
+        registry = shared_metrics()
+        registry.observe("agent_llm_prompt_bytes", prompt_bytes)
+        values = {"llm_calls": 1, "llm_prompt_bytes": prompt_bytes}
+        if isinstance(usage, dict):
+            prompt, completion = usage.get("prompt_tokens"), usage.get("completion_tokens")
+            if isinstance(prompt, int):
+                registry.inc("agent_llm_tokens_total", prompt, kind="prompt")
+                registry.observe("agent_llm_prompt_tokens", prompt)
+                values["llm_prompt_tokens"] = prompt
+            if isinstance(completion, int):
+                registry.inc("agent_llm_tokens_total", completion, kind="completion")
+                values["llm_completion_tokens"] = completion
+        if self._timings is not None:
+            self._timings.add_llm(**values)
+
+
+def span(stage: str) -> Span:
+    return Span(stage)
+
+
+def observe_request(endpoint: str, status: int, seconds: float) -> None:
+    registry = shared_metrics()
+    registry.inc("agent_requests_total", endpoint=endpoint, status=str(status))
+    registry.observe("agent_request_seconds", seconds, endpoint=endpoint)
+
+
+def _labels(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    return repr(int(value)) if float(value).is_integer() else repr(value)
+
+
+_SHARED: Optional[MetricsRegistry] = None
+_SHARED_LOCK = threading.Lock()
+
+
+def shared_metrics() -> MetricsRegistry:
+    """Process-wide registry behind /api/agent/metrics/ (disabled when METRICS_ENABLED is false)."""
+    global _SHARED
+    if _SHARED is None:
+        with _SHARED_LOCK:
+            if _SHARED is None:
+                _SHARED = MetricsRegistry(enabled=settings.METRICS_ENABLED)
+    return _SHARED
@@ -1,18 +1,31 @@
-import re
+import hashlib
+import logging
+from array import array
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple, Union
+from typing import Any, Dict, Generator, Iterator, List, Optional, Sequence, Set, Tuple, Union
 
 from django.conf import settings
 
+from .cache import MISSING, LRUCache
+from .chunk_store import Chunker, ChunkStore
+from .ingest import IngestStats, PageRecord, PageStream
+from .metrics import span
+from .tokenizer import TermInterner, tokenize
 from .vector_store import TfidfVectorStore
 
+logger = logging.getLogger(__name__)
+
 
 class RagPipeline:
     """
     RAG pipeline that:
-    - Parses only the first N pages of the PDF.
-    - Builds/caches a lightweight TF-IDF vector store for similarity search.
+    - Indexes one PDF or a directory of PDFs (first N pages / M chunks of each document).
+    - Keeps a per-document manifest so rebuilds only reparse added, changed or removed PDFs.
+    - Streams pages (in-process, or from a process pool) through the chunker straight into the index builder.
+    - Keeps page text once in a ChunkStore; chunks are offset records that may span pages.
+    - Builds/caches a sparse inverted-index store (TF-IDF cosine, BM25 or keyword overlap) for similarity search.
     - Returns chunks with source metadata for citation.
+    - Caches query results (LRU + TTL), invalidated whenever the index version changes.
     """
 
     def __init__(
@@ -22,50 +35,233 @@ class RagPipeline:
         llama_api_key: Optional[str] = None,
         cache_path: Optional[Union[str, Path]] = None,
         max_pages: int = 10,
+        scoring: str = "tfidf",
+        backend: str = "auto",
+        ingest_workers: int = 1,
+        pages_per_task: int = 8,
+        max_in_flight: int = 0,
+        query_cache_size: int = 1024,
+        query_cache_ttl: float = 300.0,
+        ann_tables: int = 0,
+        ann_bits: int = 12,
+        ann_candidates: int = 1000,
+        ann_probes: int = 0,
+        ann_min_docs: int = 5000,
+        chunk_size: int = 900,
+        chunk_overlap: int = 100,
+        chunk_span_pages: bool = True,
     ) -> None:
         self.pdf_path = Path(pdf_path)
         self.max_chunks = max_chunks
         self.llama_api_key = llama_api_key
         self.cache_path = Path(cache_path) if cache_path else None
         self.max_pages = max_pages
-        self.chunks: List[Dict[str, str]] = []
+        self.scoring = scoring
+        self.backend = backend
+        self.ingest_workers = ingest_workers
+        self.pages_per_task = pages_per_task
+        self.max_in_flight = max_in_flight
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.chunk_span_pages = chunk_span_pages
+        self.ann_options = {
+            "ann_tables": ann_tables,
+            "ann_bits": ann_bits,
+            "ann_candidates": ann_candidates,
+            "ann_probes": ann_probes,
+            "ann_min_docs": ann_min_docs,
+        }
+        self.chunks: Sequence[Dict[str, str]] = []
         self.vector_store: Optional[TfidfVectorStore] = None
-        self._load_pdf()
+        self.last_refresh: Dict[str, Any] = {}
+        self.query_cache = LRUCache(max_entries=query_cache_size, ttl=query_cache_ttl)
+        # Keyword fallback index: (chunk list it was built from, vocabulary, term id -> chunk positions).
+        self._keyword_index: Optional[Tuple[Sequence[Dict[str, str]], TermInterner, Dict[int, array]]] = None
+        self._load_corpus()
 
-    def _load_pdf(self) -> None:
-        pdf_mtime = self.pdf_path.stat().st_mtime if self.pdf_path.exists() else None
+    def _discover_documents(self) -> Dict[str, Path]:
+        """Map manifest keys (path relative to RAG_PDF_PATH) to PDF files."""
+        if self.pdf_path.is_dir():
+            return {
+                path.relative_to(self.pdf_path).as_posix(): path
+                for path in sorted(self.pdf_path.rglob("*.pdf"))
+                if path.is_file()
+            }
+        if self.pdf_path.exists():
+            return {self.pdf_path.name: self.pdf_path}
+        return {}
 
-        if self.cache_path:
-            vs = TfidfVectorStore(self.cache_path)
-            if vs.load(expected_pdf=str(self.pdf_path), expected_mtime=pdf_mtime):
-                self.vector_store = vs
-                self.chunks = vs.metadatas
+    def _load_corpus(self) -> None:
+        documents = self._discover_documents()
+        store = TfidfVectorStore(self.cache_path, scoring=self.scoring, backend=self.backend, **self.ann_options)
+        cached = bool(self.cache_path) and store.open_cache() and store.source_pdf == str(self.pdf_path)
+        # Caches from before the offset-based chunk store hold full chunk strings; rebuild those.
+        cached = cached and isinstance(store.metadatas, ChunkStore)
+        if not cached:
+            if not documents:
                 return
+            store = TfidfVectorStore(self.cache_path, scoring=self.scoring, backend=self.backend, **self.ann_options)
 
-        if not self.pdf_path.exists():
-            return
-        page_texts = self._parse_with_llamaparse() or self._parse_with_pypdf()
-        if not page_texts:
-            return
-        chunks: List[Dict[str, str]] = []
-        chunk_id = 0
-        for page_number, text in page_texts:
-            for chunk in self._split_page_text(text, page_number, chunk_id):
-                chunks.append(chunk)
-                chunk_id += 1
-                if len(chunks) >= self.max_chunks:
-                    break
-            if len(chunks) >= self.max_chunks:
-                break
-        self.chunks = chunks
-        self.vector_store = TfidfVectorStore(self.cache_path)
-        self.vector_store.build(
-            documents=chunks, source_pdf=str(self.pdf_path), source_mtime=pdf_mtime
+        # Index order follows the manifest: unchanged documents keep their chunk rows, the rest is appended.
+        old_manifest = store.manifest if cached else {}
+        manifest: Dict[str, Dict[str, Any]] = {}
+        digests: Dict[str, str] = {}
+        keep: List[int] = []
+        refreshed = False
+        position = 0
+        for key, entry in old_manifest.items():
+            n_chunks = len(entry.get("chunk_ids", []))
+            path = documents.get(key)
+            current = self._unchanged_entry(path, entry, digests, key) if path is not None else None
+            if current is not None:
+                manifest[key] = current
+                refreshed = refreshed or current is not entry
+                keep.extend(range(position, position + n_chunks))
+            position += n_chunks
+
+        changed = [key for key in documents if key not in manifest]
+        removed = sum(1 for key in old_manifest if key not in documents)
+        new_entries: Dict[str, Dict[str, Any]] = {}
+        for key in changed:
+            stat = documents[key].stat()
+            new_entries[key] = {
+                "sha256": digests.get(key) or self._content_hash(documents[key]),
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+                "pages": 0,
+                "chunk_ids": [],
+            }
+
+        stats = IngestStats()
+        if not cached or changed or removed:
+            stream_order: List[str] = []
+            chunks = store.metadatas.take(keep) if cached else ChunkStore()  # type: ignore[union-attr]
+            store.update(
+                keep=keep,
+                documents=self._stream_chunks(changed, documents, new_entries, stream_order, stats, chunks),
+                metadatas=chunks,
+            )
+            # Chunk rows are appended in stream order; the manifest must list documents the same way.
+            for key in stream_order + [key for key in changed if key not in stream_order]:
+                manifest[key] = new_entries[key]
+        stats.finish()
+        if changed:
+            logger.info(stats.summary())
+
+        self.last_refresh = {
+            "unchanged": len(manifest) - len(changed),
+            "parsed": len(changed),
+            "removed": removed,
+            "chunks_added": stats.chunks,
+            "ingest": stats.as_dict(),
+        }
+        store.manifest = manifest
+        store.source_pdf = str(self.pdf_path)
+        store.source_mtime = max((path.stat().st_mtime for path in documents.values()), default=None)
+        self.vector_store = store
+        self.chunks = store.metadatas
+        if self.cache_path and (not cached or changed or removed or refreshed):
+            store.save()
+            # Serve from the file just written: mmap'd pages are shared by forked workers,
+            # while the freshly built in-memory arrays would be private to each process.
+            if self.cache_path.suffix != ".json" and store.open_cache():
+                self.chunks = store.metadatas
+
+    def _unchanged_entry(
+        self, path: Path, entry: Dict[str, Any], digests: Dict[str, str], key: str
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Return the manifest entry if the document content is unchanged, else None.
+        Size + mtime is the fast path; on mismatch the content hash decides (touch-only edits are kept).
+        """
+        stat = path.stat()
+        if entry.get("size") == stat.st_size and entry.get("mtime") == stat.st_mtime:
+            return entry
+        digest = self._content_hash(path)
+        digests[key] = digest
+        if digest != entry.get("sha256"):
+            return None
+        return {**entry, "size": stat.st_size, "mtime": stat.st_mtime}
+
+    @staticmethod
+    def _content_hash(path: Path) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as fh:
+            for block in iter(lambda: fh.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _stream_chunks(
+        self,
+        changed: List[str],
+        documents: Dict[str, Path],
+        entries: Dict[str, Dict[str, Any]],
+        stream_order: List[str],
+        stats: IngestStats,
+        chunks: ChunkStore,
+    ) -> Iterator[Dict[str, str]]:
+        """
+        Chunk pages as they arrive from the ingestion stream into `chunks`, recording page counts
+        and chunk ids in `entries`. Honours the per-document page/chunk caps.
+        Yields each new chunk's text for indexing; the text itself is not retained.
+        """
+        chunker = Chunker(chunks, self.chunk_size, self.chunk_overlap, self.chunk_span_pages)
+        capped: Set[str] = set()
+        current: Optional[str] = None
+        for key, page_number, text in self._stream_pages(changed, documents, stats):
+            if key != current:
+                if current is not None:
+                    yield from self._emit_chunks(chunker, chunker.flush(), entries[current], capped, current, stats)
+                current = key
+                stream_order.append(key)
+            entries[key]["pages"] += 1
+            if key in capped:
+                continue
+            fed = chunker.feed(key, documents[key].stem, page_number, text)
+            yield from self._emit_chunks(chunker, fed, entries[key], capped, key, stats)
+        if current is not None:
+            yield from self._emit_chunks(chunker, chunker.flush(), entries[current], capped, current, stats)
+
+    def _emit_chunks(
+        self,
+        chunker: Chunker,
+        new_chunks: Generator[int, None, None],
+        entry: Dict[str, Any],
+        capped: Set[str],
+        key: str,
+        stats: IngestStats,
+    ) -> Iterator[Dict[str, str]]:
+        chunk_ids: List[str] = entry["chunk_ids"]
+        for idx in new_chunks:
+            chunk_ids.append(chunker.store.chunk_id(idx))
+            stats.chunks += 1
+            yield {"text": chunker.store.chunk_text(idx)}
+            if self.max_chunks and len(chunk_ids) >= self.max_chunks:
+                # Stop pulling from the chunker so no chunk beyond the cap reaches the store.
+                new_chunks.close()
+                capped.add(key)
+                chunker.discard()
+                return
+
+    def _stream_pages(self, changed: List[str], documents: Dict[str, Path], stats: IngestStats) -> Iterator[PageRecord]:
+        pypdf_docs: List[Tuple[str, Path]] = []
+        for key in changed:
+            parsed = self._parse_with_llamaparse(documents[key])
+            if not parsed:
+                pypdf_docs.append((key, documents[key]))
+                continue
+            stats.documents += 1
+            for page_number, text in parsed:
+                stats.pages += 1
+                yield key, page_number, text
+        stream = PageStream(
+            workers=self.ingest_workers,
+            pages_per_task=self.pages_per_task,
+            max_in_flight=self.max_in_flight,
         )
-        if self.cache_path:
-            self.vector_store.save()
+        yield from stream.stream(pypdf_docs, self.max_pages, stats)
 
-    def _parse_with_llamaparse(self) -> List[Tuple[int, str]]:
+    def _parse_with_llamaparse(self, path: Path) -> List[Tuple[int, str]]:
         """
         Use LlamaParse (remote API) when LLAMA_PARSE_API_KEY is set and library installed.
         """
@@ -76,59 +272,104 @@ class RagPipeline:
         except ImportError:
             return []
         parser = LlamaParse(api_key=self.llama_api_key, result_type="text")
-        docs = parser.load_data(str(self.pdf_path))
+        docs = parser.load_data(str(path))
         if not docs:
             return []
         parsed: List[Tuple[int, str]] = []
         for idx, doc in enumerate(docs, start=1):
-            if idx > self.max_pages:
+            if self.max_pages and idx > self.max_pages:
                 break
             parsed.append((idx, getattr(doc, "text", "")))
         return parsed
 
-    def _parse_with_pypdf(self) -> List[Tuple[int, str]]:
-        try:
-            from PyPDF2 import PdfReader  # type: ignore
-        except ImportError:
-            return []
-        reader = PdfReader(str(self.pdf_path))
-        parsed: List[Tuple[int, str]] = []
-        for idx, page in enumerate(reader.pages, start=1):
-            if idx > self.max_pages:
-                break
-            parsed.append((idx, page.extract_text() or ""))
-        return parsed
+    def refresh(self) -> None:
+        """Re-scan the corpus and apply incremental index updates (invalidates the query cache)."""
+        self._load_corpus()
 
-    def _split_page_text(
-        self, text: str, page_number: int, start_id: int, chunk_size: int = 900, overlap: int = 100
-    ) -> List[Dict[str, str]]:
-        words = text.split()
-        chunks = []
-        start = 0
-        local_id = start_id
-        while start < len(words):
-            end = start + chunk_size
-            chunk = " ".join(words[start:end])
-            source = f"{self.pdf_path.stem} (book) - page {page_number}"
-            chunks.append({"text": chunk, "source": source, "id": f"{self.pdf_path.name}#chunk-{local_id}"})
-            start = end - overlap
-            local_id += 1
-        return chunks
+    def index_version(self) -> Tuple[Any, ...]:
+        if self.vector_store is None:
+            return (None, None, len(self.chunks))
+        return (self.vector_store.version, self.vector_store.source_mtime)
 
     def search(self, query: str, k: int = 3) -> List[Dict[str, str]]:
-        if self.vector_store:
-            return self.vector_store.search(query=query, k=k)
-        # Fallback keyword scoring if vector store is unavailable.
+        with span("rag_search"):
+            self.query_cache.validate(self.index_version())
+            key = self._cache_key(query, k)
+            cached = self.query_cache.get(key)
+            if cached is not MISSING:
+                return list(cached)
+            if self.vector_store:
+                results = self.vector_store.search(query=query, k=k)
+            else:
+                results = self._keyword_search(query, k)
+            self.query_cache.set(key, results)
+            return list(results)
+
+    def search_many(self, queries: List[str], k: int = 3) -> List[List[Dict[str, str]]]:
+        """Search several queries at once; results line up with `queries`. Only cache misses are scored."""
+        with span("rag_search_many"):
+            return self._search_many(queries, k)
+
+    def _search_many(self, queries: List[str], k: int) -> List[List[Dict[str, str]]]:
+        self.query_cache.validate(self.index_version())
+        keys = [self._cache_key(query, k) for query in queries]
+        results: List[List[Dict[str, str]]] = []
+        misses: List[int] = []
+        for idx, key in enumerate(keys):
+            cached = self.query_cache.get(key)
+            if cached is MISSING:
+                misses.append(idx)
+                results.append([])
+            else:
+                results.append(list(cached))
+        if misses:
+            pending = [queries[idx] for idx in misses]
+            if self.vector_store:
+                fresh = self.vector_store.search_many(queries=pending, k=k)
+            else:
+                fresh = [self._keyword_search(query, k) for query in pending]
+            for idx, found in zip(misses, fresh):
+                self.query_cache.set(keys[idx], found)
+                results[idx] = list(found)
+        return results
+
+    def _keyword_search(self, query: str, k: int) -> List[Dict[str, str]]:
+        """Fallback without a vector store: rank `self.chunks` by the number of distinct query terms they contain."""
         if not self.chunks:
             return []
-        scores: List[Tuple[int, Dict[str, str]]] = []
-        tokens = set(re.findall(r"\w+", query.lower()))
-        for chunk in self.chunks:
-            chunk_tokens = set(re.findall(r"\w+", chunk["text"].lower()))
-            score = len(tokens.intersection(chunk_tokens))
-            scores.append((score, chunk))
-        scores.sort(key=lambda item: item[0], reverse=True)
-        return [chunk for score, chunk in scores[:k] if score > 0]
+        vocabulary, postings = self._keyword_postings()
+        scores: Dict[int, int] = {}
+        query_ids = {vocabulary.get(term) for term in tokenize(query)}
+        query_ids.discard(None)
+        for term_id in query_ids:
+            for idx in postings.get(term_id, ()):  # type: ignore[arg-type]
+                scores[idx] = scores.get(idx, 0) + 1
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [self.chunks[idx] for idx, _ in ranked[:k]]
+
+    def _keyword_postings(self) -> Tuple[TermInterner, Dict[int, array]]:
+        """
+        Postings for the keyword fallback, built once per chunk list (not per query): each chunk's text
+        is tokenized and interned here, and a query only looks up its own term ids.
+        """
+        chunks = self.chunks
+        index = self._keyword_index
+        if index is None or index[0] is not chunks:
+            vocabulary = TermInterner()
+            postings: Dict[int, array] = {}
+            for idx, chunk in enumerate(chunks):
+                for term_id in set(vocabulary.intern_text(chunk["text"])):
+                    postings.setdefault(term_id, array("i")).append(idx)
+            index = self._keyword_index = (chunks, vocabulary, postings)
+        return index[1], index[2]
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return self.query_cache.stats()
+
+    @staticmethod
+    def _cache_key(query: str, k: int) -> Tuple[Tuple[str, ...], int]:
+        # Normalised token multiset: word order, case and punctuation do not change the ranking.
+        return tuple(sorted(tokenize(query))), k
 
 
 def build_default_rag() -> RagPipeline:
@@ -138,4 +379,19 @@ def build_default_rag() -> RagPipeline:
         llama_api_key=settings.LLAMA_PARSE_API_KEY or None,
         cache_path=settings.RAG_CACHE_PATH,
         max_pages=settings.RAG_MAX_PAGES,
+        scoring=settings.RAG_SCORING,
+        backend=settings.RAG_BACKEND,
+        ingest_workers=settings.RAG_INGEST_WORKERS,
+        pages_per_task=settings.RAG_INGEST_PAGES_PER_TASK,
+        max_in_flight=settings.RAG_INGEST_MAX_IN_FLIGHT,
+        query_cache_size=settings.RAG_QUERY_CACHE_SIZE,
+        query_cache_ttl=settings.RAG_QUERY_CACHE_TTL,
+        ann_tables=settings.RAG_ANN_TABLES,
+        ann_bits=settings.RAG_ANN_BITS,
+        ann_candidates=settings.RAG_ANN_CANDIDATES,
+        ann_probes=settings.RAG_ANN_PROBES,
+        ann_min_docs=settings.RAG_ANN_MIN_DOCS,
+        chunk_size=settings.RAG_CHUNK_SIZE,
+        chunk_overlap=settings.RAG_CHUNK_OVERLAP,
+        chunk_span_pages=settings.RAG_CHUNK_SPAN_PAGES,
     )
@@ -0,0 +1,160 @@
+import gzip
+import json
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpRequest, HttpResponse
+
+from .metrics import shared_metrics
+
+try:  # Optional: several times faster than the stdlib encoder on large traces.
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None  # type: ignore[assignment]
+
+try:  # Optional: brotli (or its CFFI build) for `Content-Encoding: br`.
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    try:
+        import brotlicffi as brotli  # type: ignore[no-redef]
+    except ImportError:
+        brotli = None  # type: ignore[assignment]
+
+# Top-level fields of an agent result that `fields` may select; `sources` is derived from `context_used`.
+RESULT_FIELDS = ("answer", "sources", "trace", "context_used", "tools_available")
+# verbosity -> fields kept (None: the full result, unchanged).
+VERBOSITY_FIELDS: Dict[str, Optional[Tuple[str, ...]]] = {
+    "answer": ("answer",),
+    "sources": ("answer", "sources"),
+    "full": None,
+}
+# Kept whenever present, whatever the selection.
+ALWAYS_KEPT = ("session_id", "session_seq", "timings")
+
+
+def resolve_fields(verbosity: Optional[str], fields: Any) -> Tuple[Optional[Tuple[str, ...]], Optional[str]]:
+    """
+    Fields to keep for a request: explicit `fields` (list or comma-separated string) win over `verbosity`,
+    which defaults to AGENT_RESPONSE_VERBOSITY. Returns (fields or None for everything, error message).
+    """
+    if fields:
+        names = fields.split(",") if isinstance(fields, str) else fields
+        if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+            return None, "'fields' must be a list or comma-separated string"
+        selected = tuple(dict.fromkeys(name.strip() for name in names if name.strip()))
+        unknown = [name for name in selected if name not in RESULT_FIELDS + ALWAYS_KEPT]
+        if unknown:
+            return None, f"Unknown fields: {', '.join(unknown)} (expected any of {', '.join(RESULT_FIELDS)})"
+        return selected, None
+    level = verbosity or settings.AGENT_RESPONSE_VERBOSITY
+    if level not in VERBOSITY_FIELDS:
+        return None, f"'verbosity' must be one of: {', '.join(VERBOSITY_FIELDS)}"
+    return VERBOSITY_FIELDS[level], None
+
+
+def shape_result(result: Dict[str, Any], fields: Optional[Sequence[str]]) -> Dict[str, Any]:
+    """Keep the selected fields of an agent result (plus ALWAYS_KEPT); None returns it unchanged."""
+    if fields is None:
+        return result
+    shaped: Dict[str, Any] = {}
+    for name in fields:
+        if name == "sources" and "sources" not in result:
+            shaped["sources"] = sorted({c.get("source", "unknown") for c in result.get("context_used") or []})
+        elif name in result:
+            shaped[name] = result[name]
+    for name in ALWAYS_KEPT:
+        if name in result:
+            shaped[name] = result[name]
+    return shaped
+
+
+def encode_json(data: Any, encoder: Optional[str] = None) -> Tuple[bytes, str]:
+    """
+    Serialise `data` to UTF-8 JSON with orjson when available (AGENT_JSON_ENCODER=auto/orjson), else the
+    stdlib encoder with Django's type support. Returns (body, encoder used).
+    orjson output is compact; values it cannot encode (e.g. ints beyond 64 bits) fall back to the stdlib.
+    """
+    encoder = encoder or settings.AGENT_JSON_ENCODER
+    if orjson is not None and encoder != "stdlib":
+        try:
+            return orjson.dumps(data, default=_orjson_default, option=orjson.OPT_NON_STR_KEYS), "orjson"
+        except TypeError:
+            pass  # orjson.JSONEncodeError subclasses TypeError
+    return json.dumps(data, cls=DjangoJSONEncoder, separators=(",", ":")).encode("utf-8"), "stdlib"
+
+
+def _orjson_default(value: Any) -> Any:
+    return DjangoJSONEncoder().default(value)
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Best supported content coding for an Accept-Encoding header: "br" (when brotli is installed) over
+    "gzip", respecting q-values (q=0 refuses). None means identity.
+    """
+    accepted: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name:
+            accepted[name.strip().lower()] = quality
+    candidates = (["br"] if brotli is not None else []) + ["gzip"]
+    best: Optional[str] = None
+    best_quality = 0.0
+    for coding in candidates:
+        quality = accepted.get(coding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=settings.AGENT_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=settings.AGENT_GZIP_LEVEL, mtime=0)
+
+
+def json_response(request: HttpRequest, data: Any, endpoint: str, status: int = 200) -> HttpResponse:
+    """
+    JSON response with the fast encoder and, for bodies of at least AGENT_COMPRESS_MIN_BYTES, the content
+    coding negotiated from Accept-Encoding. Sizes and timings go to the metrics registry and to a
+    `Server-Timing` header; `X-Uncompressed-Length` carries the size before compression.
+    """
+    started = time.perf_counter()
+    body, encoder = encode_json(data)
+    encoded = time.perf_counter()
+    raw_size = len(body)
+    encoding = None
+    if settings.AGENT_RESPONSE_COMPRESSION and raw_size >= settings.AGENT_COMPRESS_MIN_BYTES:
+        encoding = negotiate_encoding(request.headers.get("Accept-Encoding", ""))
+    if encoding:
+        body = compress(body, encoding)
+    compressed = time.perf_counter()
+
+    registry = shared_metrics()
+    registry.observe("agent_response_encode_seconds", encoded - started, encoder=encoder)
+    registry.observe("agent_response_uncompressed_bytes", raw_size, endpoint=endpoint)
+    registry.observe("agent_response_bytes", len(body), endpoint=endpoint, encoding=encoding or "identity")
+    timing: List[str] = [f'encode;dur={1000 * (encoded - started):.2f};desc="{encoder}"']
+    if encoding:
+        registry.observe("agent_response_compress_seconds", compressed - encoded, encoding=encoding)
+        timing.append(f'compress;dur={1000 * (compressed - encoded):.2f};desc="{encoding}"')
+
+    response = HttpResponse(body, status=status, content_type="application/json")
+    if encoding:
+        response["Content-Encoding"] = encoding
+    if settings.AGENT_RESPONSE_COMPRESSION:
+        response["Vary"] = "Accept-Encoding"
+    response["Content-Length"] = str(len(body))
+    response["X-Uncompressed-Length"] = str(raw_size)
+    response["Server-Timing"] = ", ".join(timing)
+    return response
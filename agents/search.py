@@ -1,67 +1,300 @@
 import html
 import re
-import requests
-from typing import Any, Dict, List, Optional
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
 
 from django.conf import settings
 
+from .cache import MISSING, LRUCache, SingleFlight
+from .deadline import DeadlineExceeded
+from .metrics import span
+from .transport import AsyncHttpTransport, HttpTransport, shared_async_transport, shared_transport
+
+DUCKDUCKGO_URL = "https://duckduckgo.com/html/"
+DUCKDUCKGO_HEADERS = {"User-Agent": "Mozilla/5.0 (compatible; RAG-Agent/1.0)"}
+_DUCKDUCKGO_RESULT = re.compile(r'<a[^>]*class="result__a"[^>]*href="([^"]+)"[^>]*>(.*?)</a>', re.IGNORECASE | re.DOTALL)
+
+
+class SearchError(RuntimeError):
+    """A search request failed (raised again from the negative cache while the failure is remembered)."""
+
+
+class _Failure:
+    __slots__ = ("message",)
+
+    def __init__(self, message: str) -> None:
+        self.message = message
+
+
+class SearchResultCache:
+    """
+    Search results shared by the sync and async clients of a process.
+    - TTL cache keyed on (endpoint, normalised query, limit); the query is case-folded and its
+      whitespace collapsed, so "One-time  pad" and "one-time pad" share an entry.
+    - Failures are cached too, for `negative_ttl` seconds, so a down endpoint is not hammered.
+    - Single-flight: concurrent identical searches (threads, or tasks on one event loop) share
+      one in-flight HTTP request.
+    Entries are returned as copies, so callers may modify them.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: float = 600.0,
+        negative_ttl: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.entries = LRUCache(max_entries=max_entries, ttl=ttl, clock=clock)
+        self.flights = SingleFlight()
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self.fetches = 0
+        self.failures = 0
+        self.negative_hits = 0
+
+    @staticmethod
+    def key(endpoint: Optional[str], query: str, limit: int) -> Tuple[str, str, int]:
+        return endpoint or "duckduckgo", " ".join(query.casefold().split()), limit
+
+    def fetch(self, key: Hashable, fetch: Callable[[], List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        found = self._lookup(key)
+        if found is not None:
+            return found
+        return _copy(self.flights.do(key, lambda: self._fill(key, fetch)))
+
+    async def afetch(self, key: Hashable, fetch: Callable[[], Awaitable[List[Dict[str, Any]]]]) -> List[Dict[str, Any]]:
+        found = self._lookup(key)
+        if found is not None:
+            return found
+
+        async def fill() -> List[Dict[str, Any]]:
+            self._count("fetches")
+            try:
+                results = await fetch()
+            except Exception as exc:
+                self._fail(key, exc)
+                raise
+            self.entries.set(key, results)
+            return results
+
+        return _copy(await self.flights.ado(key, fill))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = {"fetches": self.fetches, "failures": self.failures, "negative_hits": self.negative_hits}
+        return {**self.entries.stats(), **self.flights.stats(), **counters, "negative_ttl": self.negative_ttl}
+
+    def _lookup(self, key: Hashable) -> Optional[List[Dict[str, Any]]]:
+        cached = self.entries.get(key)
+        if cached is MISSING:
+            return None
+        if isinstance(cached, _Failure):
+            self._count("negative_hits")
+            raise SearchError(cached.message)
+        return _copy(cached)
+
+    def _fill(self, key: Hashable, fetch: Callable[[], List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        self._count("fetches")
+        try:
+            results = fetch()
+        except Exception as exc:
+            self._fail(key, exc)
+            raise
+        self.entries.set(key, results)
+        return results
+
+    def _fail(self, key: Hashable, exc: Exception) -> None:
+        self._count("failures")
+        # A request running out of time says nothing about the search endpoint; don't remember it.
+        if self.negative_ttl > 0 and not isinstance(exc, DeadlineExceeded):
+            self.entries.set(key, _Failure(f"{exc.__class__.__name__}: {exc}"), ttl=self.negative_ttl)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
 
 class WebSearchClient:
     """
     Minimal web search wrapper.
     - If SEARCH_API_ENDPOINT is set, calls it (adds api_key if provided).
-    - Otherwise falls back to a simple DuckDuckGo HTML scrape using requests.
+    - Otherwise falls back to a simple DuckDuckGo HTML scrape.
+    - Both go through the shared pooled transport (keep-alive, retries with backoff).
+    - With a SearchResultCache, repeated and concurrent identical searches reuse one fetch.
     """
 
-    def __init__(self, endpoint: Optional[str], api_key: Optional[str]) -> None:
+    def __init__(
+        self,
+        endpoint: Optional[str],
+        api_key: Optional[str],
+        transport: Optional[HttpTransport] = None,
+        read_timeout: float = 30.0,
+        cache: Optional[SearchResultCache] = None,
+        duckduckgo_url: str = DUCKDUCKGO_URL,
+    ) -> None:
         self.endpoint = endpoint
         self.api_key = api_key
+        self.transport = transport if transport is not None else shared_transport()
+        self.read_timeout = read_timeout
+        self.cache = cache
+        self.duckduckgo_url = duckduckgo_url
 
     def search(self, query: str, limit: int = 3) -> List[Dict[str, Any]]:
+        try:
+            with span("search_request"):
+                if self.cache is None:
+                    return self._fetch(query, limit)
+                return self.cache.fetch(self.cache.key(self.endpoint, query, limit), lambda: self._fetch(query, limit))
+        except Exception as exc:
+            if self.endpoint:
+                raise
+            return _failed(exc)
+
+    def _fetch(self, query: str, limit: int) -> List[Dict[str, Any]]:
         if not self.endpoint:
-            return self._duckduckgo(query, limit)
+            response = self.transport.get(
+                self.duckduckgo_url,
+                params={"q": query, "kl": "us-en"},
+                headers=DUCKDUCKGO_HEADERS,
+                read_timeout=self.read_timeout,
+            )
+            response.raise_for_status()
+            return _parse_duckduckgo(response.text, limit)
 
-        params = {"q": query, "num": limit}
-        if self.api_key:
-            params["api_key"] = self.api_key
-        response = requests.get(self.endpoint, params=params, timeout=30)
+        params = _api_params(query, limit, self.api_key)
+        response = self.transport.get(self.endpoint, params=params, read_timeout=self.read_timeout)
         response.raise_for_status()
-        data = response.json()
-        # Shape into a simple list of results.
-        results = []
-        if isinstance(data, dict):
-            items = data.get("results") or data.get("data") or data.get("organic_results") or []
-            for item in items[:limit]:
-                results.append(
-                    {
-                        "title": item.get("title") or item.get("name") or "result",
-                        "url": item.get("url") or item.get("link") or "",
-                        "snippet": item.get("snippet") or item.get("description") or "",
-                    }
-                )
-        return results
+        return _shape_results(response.json(), limit)
+
 
-    def _duckduckgo(self, query: str, limit: int) -> List[Dict[str, Any]]:
-        url = "https://duckduckgo.com/html/"
-        headers = {"User-Agent": "Mozilla/5.0 (compatible; RAG-Agent/1.0)"}
+class AsyncWebSearchClient:
+    """asyncio variant of WebSearchClient (same endpoints, cache and result shape) on the pooled AsyncHttpTransport."""
+
+    def __init__(
+        self,
+        endpoint: Optional[str],
+        api_key: Optional[str],
+        transport: Optional[AsyncHttpTransport] = None,
+        read_timeout: float = 30.0,
+        cache: Optional[SearchResultCache] = None,
+        duckduckgo_url: str = DUCKDUCKGO_URL,
+    ) -> None:
+        self.endpoint = endpoint
+        self.api_key = api_key
+        self.transport = transport if transport is not None else shared_async_transport()
+        self.read_timeout = read_timeout
+        self.cache = cache
+        self.duckduckgo_url = duckduckgo_url
+
+    async def search(self, query: str, limit: int = 3) -> List[Dict[str, Any]]:
         try:
-            response = requests.get(url, params={"q": query, "kl": "us-en"}, headers=headers, timeout=30)
+            with span("search_request"):
+                if self.cache is None:
+                    return await self._fetch(query, limit)
+                return await self.cache.afetch(
+                    self.cache.key(self.endpoint, query, limit), lambda: self._fetch(query, limit)
+                )
+        except Exception as exc:
+            if self.endpoint:
+                raise
+            return _failed(exc)
+
+    async def _fetch(self, query: str, limit: int) -> List[Dict[str, Any]]:
+        if not self.endpoint:
+            response = await self.transport.get(
+                self.duckduckgo_url,
+                params={"q": query, "kl": "us-en"},
+                headers=DUCKDUCKGO_HEADERS,
+                read_timeout=self.read_timeout,
+            )
             response.raise_for_status()
-            html_body = response.text
-        except Exception as exc:  # pragma: no cover - defensive
-            return [{"title": "Search failed", "url": "", "snippet": str(exc)}]
-
-        # Rough scrape for result links.
-        pattern = re.compile(r'<a[^>]*class="result__a"[^>]*href="([^"]+)"[^>]*>(.*?)</a>', re.IGNORECASE | re.DOTALL)
-        matches = pattern.findall(html_body)
-        results: List[Dict[str, Any]] = []
-        for href, title_html in matches[:limit]:
-            title = html.unescape(re.sub(r"<.*?>", "", title_html)).strip()
-            results.append({"title": title or "result", "url": href, "snippet": ""})
-        if not results:
-            return [{"title": "No results", "url": "", "snippet": "DuckDuckGo returned no results."}]
-        return results
+            return _parse_duckduckgo(response.text, limit)
+
+        params = _api_params(query, limit, self.api_key)
+        response = await self.transport.get(self.endpoint, params=params, read_timeout=self.read_timeout)
+        response.raise_for_status()
+        return _shape_results(response.json(), limit)
+
+
+def _api_params(query: str, limit: int, api_key: Optional[str]) -> Dict[str, Any]:
+    params: Dict[str, Any] = {"q": query, "num": limit}
+    if api_key:
+        params["api_key"] = api_key
+    return params
+
+
+def _shape_results(data: Any, limit: int) -> List[Dict[str, Any]]:
+    """Shape a search API response into a simple list of results."""
+    results = []
+    if isinstance(data, dict):
+        items = data.get("results") or data.get("data") or data.get("organic_results") or []
+        for item in items[:limit]:
+            results.append(
+                {
+                    "title": item.get("title") or item.get("name") or "result",
+                    "url": item.get("url") or item.get("link") or "",
+                    "snippet": item.get("snippet") or item.get("description") or "",
+                }
+            )
+    return results
+
+
+def _copy(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [dict(item) for item in results]
+
+
+def _failed(exc: Exception) -> List[Dict[str, Any]]:
+    # The DuckDuckGo fallback reports failures as a result instead of raising.
+    return [{"title": "Search failed", "url": "", "snippet": str(exc)}]
+
+
+def _parse_duckduckgo(html_body: str, limit: int) -> List[Dict[str, Any]]:
+    # Rough scrape for result links.
+    matches = _DUCKDUCKGO_RESULT.findall(html_body)
+    results: List[Dict[str, Any]] = []
+    for href, title_html in matches[:limit]:
+        title = html.unescape(re.sub(r"<.*?>", "", title_html)).strip()
+        results.append({"title": title or "result", "url": href, "snippet": ""})
+    if not results:
+        return [{"title": "No results", "url": "", "snippet": "DuckDuckGo returned no results."}]
+    return results
+
+
+_SHARED_CACHE: Optional[SearchResultCache] = None
+_SHARED_CACHE_LOCK = threading.Lock()
+
+
+def shared_search_cache() -> Optional[SearchResultCache]:
+    """Process-wide search cache from settings (None when SEARCH_CACHE_SIZE is 0)."""
+    global _SHARED_CACHE
+    if settings.SEARCH_CACHE_SIZE <= 0:
+        return None
+    with _SHARED_CACHE_LOCK:
+        if _SHARED_CACHE is None:
+            _SHARED_CACHE = SearchResultCache(
+                max_entries=settings.SEARCH_CACHE_SIZE,
+                ttl=settings.SEARCH_CACHE_TTL,
+                negative_ttl=settings.SEARCH_CACHE_NEGATIVE_TTL,
+            )
+        return _SHARED_CACHE
 
 
 def build_default_search_client() -> WebSearchClient:
-    return WebSearchClient(endpoint=settings.SEARCH_API_ENDPOINT, api_key=settings.SEARCH_API_KEY)
+    return WebSearchClient(
+        endpoint=settings.SEARCH_API_ENDPOINT,
+        api_key=settings.SEARCH_API_KEY,
+        transport=shared_transport(),
+        read_timeout=settings.SEARCH_READ_TIMEOUT,
+        cache=shared_search_cache(),
+    )
+
+
+def build_default_async_search_client() -> AsyncWebSearchClient:
+    return AsyncWebSearchClient(
+        endpoint=settings.SEARCH_API_ENDPOINT,
+        api_key=settings.SEARCH_API_KEY,
+        transport=shared_async_transport(),
+        read_timeout=settings.SEARCH_READ_TIMEOUT,
+        cache=shared_search_cache(),
+    )
@@ -0,0 +1,242 @@
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from django.conf import settings
+
+from .cache import SqliteCache
+
+Message = Dict[str, str]
+
+
+class Session(NamedTuple):
+    messages: List[Message]
+    seq: int  # number of turns appended so far (0 for a new or expired session)
+
+
+class SessionConflict(Exception):
+    """Another turn was appended to the session after this one read its history; this turn was not stored."""
+
+    def __init__(self, session_id: str, base_seq: int, seq: int) -> None:
+        super().__init__(f"Session {session_id!r} changed during this turn (read at seq {base_seq}, now {seq})")
+        self.session_id = session_id
+        self.base_seq = base_seq
+        self.seq = seq
+
+
+class SessionStore(ABC):
+    """
+    Conversation memory keyed by session id, bounded per session and in total.
+    - Per session: the last `max_messages` messages, then whole user/assistant pairs are dropped
+      from the front until the JSON history fits `max_session_bytes` (0 disables either cap).
+    - `append` is atomic and bumps the session's `seq`. A turn passes the `seq` it read its history
+      at (compare-and-set): if another turn on the same session landed in between, the later turn
+      is rejected with SessionConflict and nothing is written, so histories never interleave.
+    Backends: MemorySessionStore (one process) and SqliteSessionStore (shared by worker processes).
+    """
+
+    def __init__(self, max_messages: int = 20, max_session_bytes: int = 32 * 1024) -> None:
+        self.max_messages = max_messages
+        self.max_session_bytes = max_session_bytes
+        self._counter_lock = threading.Lock()
+        self.appends = 0
+        self.conflicts = 0
+
+    @abstractmethod
+    def get(self, session_id: str) -> Session:
+        ...
+
+    @abstractmethod
+    def append(self, session_id: str, messages: List[Message], base_seq: Optional[int] = None) -> int:
+        """Add `messages` to the session and return its new `seq`; SessionConflict if `base_seq` is stale."""
+
+    @abstractmethod
+    def delete(self, session_id: str) -> None:
+        ...
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_messages": self.max_messages,
+            "max_session_bytes": self.max_session_bytes,
+            "appends": self.appends,
+            "conflicts": self.conflicts,
+        }
+
+    def _merge(self, session_id: str, current: Session, messages: List[Message], base_seq: Optional[int]) -> Session:
+        with self._counter_lock:
+            if base_seq is not None and base_seq != current.seq:
+                self.conflicts += 1
+                raise SessionConflict(session_id, base_seq, current.seq)
+            self.appends += 1
+        return Session(self._trim(current.messages + messages), current.seq + 1)
+
+    def _trim(self, messages: List[Message]) -> List[Message]:
+        if self.max_messages > 0:
+            messages = messages[-self.max_messages :]
+        if self.max_session_bytes > 0:
+            while len(messages) > 2 and _size(messages) > self.max_session_bytes:
+                messages = messages[2:]
+        return messages
+
+
+class MemorySessionStore(SessionStore):
+    """
+    In-process SessionStore: an LRU of sessions capped at `max_sessions` and `max_bytes`
+    (JSON size of the stored histories), idle sessions expiring after `ttl` seconds (0 disables).
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 10000,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl: float = 86400.0,
+        clock: Callable[[], float] = time.monotonic,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(**kwargs)
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        # session id -> (expires_at, size, session)
+        self._sessions: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, session_id: str) -> Session:
+        with self._lock:
+            return self._live(session_id)
+
+    def append(self, session_id: str, messages: List[Message], base_seq: Optional[int] = None) -> int:
+        with self._lock:
+            updated = self._merge(session_id, self._live(session_id), messages, base_seq)
+            size = _size(updated.messages)
+            self._drop(session_id)
+            expires_at = self._clock() + self.ttl if self.ttl > 0 else 0.0
+            self._sessions[session_id] = (expires_at, size, updated)
+            self._bytes += size
+            while len(self._sessions) > 1 and (
+                (self.max_sessions > 0 and len(self._sessions) > self.max_sessions)
+                or (self.max_bytes > 0 and self._bytes > self.max_bytes)
+            ):
+                oldest = next(iter(self._sessions))
+                self._drop(oldest)
+                self.evictions += 1
+        return updated.seq
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._drop(session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **super().stats(),
+                "backend": "memory",
+                "sessions": len(self._sessions),
+                "bytes": self._bytes,
+                "max_sessions": self.max_sessions,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def _live(self, session_id: str) -> Session:
+        """The stored session (marked recently used), or an empty one; caller holds the lock."""
+        item = self._sessions.get(session_id)
+        if item is None:
+            return Session([], 0)
+        if item[0] and item[0] <= self._clock():
+            self._drop(session_id)
+            self.expirations += 1
+            return Session([], 0)
+        self._sessions.move_to_end(session_id)
+        return Session(list(item[2].messages), item[2].seq)
+
+    def _drop(self, session_id: str) -> None:
+        item = self._sessions.pop(session_id, None)
+        if item is not None:
+            self._bytes -= item[1]
+
+
+class SqliteSessionStore(SessionStore):
+    """
+    SessionStore in a SQLite database (WAL) shared by every worker process on the host.
+    Each session is one SqliteCache row, so `max_sessions`, `max_bytes` and the idle `ttl` are
+    enforced with its LRU eviction; appends are read-modify-write transactions (`SqliteCache.update`),
+    so the `seq` check holds across processes (a conflicting append rolls back).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_sessions: int = 100000,
+        max_bytes: int = 256 * 1024 * 1024,
+        ttl: float = 86400.0,
+        evict_interval: int = 64,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(**kwargs)
+        self.cache = SqliteCache(
+            path, ttl=ttl, max_entries=max_sessions, max_bytes=max_bytes, evict_interval=evict_interval
+        )
+
+    def get(self, session_id: str) -> Session:
+        return _decode(self.cache.get(session_id, None))
+
+    def append(self, session_id: str, messages: List[Message], base_seq: Optional[int] = None) -> int:
+        def merge(current: Optional[bytes]) -> bytes:
+            updated = self._merge(session_id, _decode(current), messages, base_seq)
+            return json.dumps({"seq": updated.seq, "messages": updated.messages}).encode("utf-8")
+
+        return json.loads(self.cache.update(session_id, merge))["seq"]
+
+    def delete(self, session_id: str) -> None:
+        self.cache.delete(session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        cache = self.cache.stats()
+        return {
+            **super().stats(),
+            "backend": "sqlite",
+            "path": cache["path"],
+            "sessions": cache["size"],
+            "bytes": cache["bytes"],
+            "max_sessions": cache["max_entries"],
+            "max_bytes": cache["max_bytes"],
+            "ttl": cache["ttl"],
+            "evictions": cache["evictions"],
+            "expirations": cache["expirations"],
+        }
+
+
+def _decode(value: Optional[bytes]) -> Session:
+    if value is None:
+        return Session([], 0)
+    stored = json.loads(value)
+    return Session(stored["messages"], stored["seq"])
+
+
+def _size(messages: List[Message]) -> int:
+    return len(json.dumps(messages, ensure_ascii=False).encode("utf-8"))
+
+
+def build_default_session_store() -> SessionStore:
+    limits = {
+        "max_sessions": settings.SESSION_MAX_SESSIONS,
+        "max_bytes": settings.SESSION_MAX_MB * 1024 * 1024,
+        "ttl": settings.SESSION_TTL,
+        "max_messages": settings.SESSION_MAX_MESSAGES,
+        "max_session_bytes": settings.SESSION_MAX_KB * 1024,
+    }
+    if settings.SESSION_STORE == "sqlite":
+        return SqliteSessionStore(settings.SESSION_STORE_PATH, **limits)
+    if settings.SESSION_STORE != "memory":
+        raise ValueError(f"Unknown SESSION_STORE {settings.SESSION_STORE!r} (expected memory or sqlite)")
+    return MemorySessionStore(**limits)
@@ -0,0 +1,47 @@
+import time
+
+from django.test import SimpleTestCase
+
+from agents.agent import Agent
+from agents.databricks_client import DatabricksLLMClient
+from agents.rag import RagPipeline
+from agents.tools import ToolRegistry
+from agents.transport import HttpTransport
+from bench.fakes import FakeLLMServer
+
+
+class RunBatchDeadlineTests(SimpleTestCase):
+    """Agent.run_batch against a local fake LLM: each item runs under its own deadline."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.server = FakeLLMServer(latency="fixed:200", tool_rate=0.0, answer_words=5).start()
+        cls.transport = HttpTransport(max_retries=0)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.stop()
+        cls.transport.close()
+        super().tearDownClass()
+
+    def setUp(self) -> None:
+        rag = RagPipeline("/nonexistent.pdf", cache_path=None)
+        rag.chunks = [{"text": "AES is a block cipher", "source": "a"}, {"text": "RSA keys", "source": "b"}]
+        llm = DatabricksLLMClient(None, "token", f"{self.server.url}/invocations", transport=self.transport)
+        self.agent = Agent(llm=llm, rag=rag, tools=ToolRegistry())
+
+    def test_batch_longer_than_one_item_timeout_answers_every_item(self) -> None:
+        queries = [f"what is aes {idx}" for idx in range(8)]
+        started = time.perf_counter()
+        items = list(self.agent.run_batch(queries, allow_search=False, concurrency=2, item_timeout=0.6))
+        elapsed = time.perf_counter() - started
+        self.assertGreater(elapsed, 0.6)  # four waves of 200 ms calls
+        self.assertEqual(sorted(item["index"] for item in items), list(range(8)))
+        self.assertEqual([item.get("error") for item in items], [None] * 8)
+
+    def test_item_overrunning_its_own_deadline_is_reported(self) -> None:
+        items = list(self.agent.run_batch(["what is aes", "rsa keys"], allow_search=False, item_timeout=0.05))
+        self.assertEqual(len(items), 2)
+        for item in items:
+            self.assertTrue(item["error"].startswith("DeadlineExceeded"), item)
@@ -0,0 +1,66 @@
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+from django.test import SimpleTestCase
+
+from agents.agent import Agent
+from agents.cache import SqliteCache
+from agents.llm_cache import AsyncCachedLLMClient, CachedLLMClient
+
+
+class _EchoLLM:
+    model = "echo"
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def chat(self, messages: List[Dict[str, Any]], tools: Any = None) -> Dict[str, Any]:
+        self.calls += 1
+        return {"message": messages[-1]["content"], "tool_calls": [], "raw": {}}
+
+    def chat_stream(self, messages: List[Dict[str, Any]], tools: Any = None) -> Iterator[Dict[str, Any]]:
+        yield {"type": "delta", "content": messages[-1]["content"]}
+        yield {"type": "done", "message": messages[-1]["content"], "tool_calls": [], "raw": {}}
+
+
+class LLMCacheTests(SimpleTestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = Path(self.tmp.name) / "llm_cache.sqlite3"
+
+    def test_evictions_run_every_interval_writes(self) -> None:
+        cache = SqliteCache(str(self.path), max_entries=2, evict_interval=4)
+        for index in range(3):
+            cache.set(f"k{index}", b"v")
+        self.assertEqual(len(cache), 3)
+        cache.set("k3", b"v")
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.counters()["evictions"], 2)
+
+    def test_run_summary_reads_counters_without_scanning_the_table(self) -> None:
+        cache = SqliteCache(str(self.path))
+        llm = CachedLLMClient(_EchoLLM(), cache)
+
+        def scan() -> Dict[str, Any]:
+            raise AssertionError("stats() scans the table")
+
+        cache.stats = scan  # type: ignore[method-assign]
+        messages = [{"role": "user", "content": "hello"}]
+        trace = [{"cache": llm.chat(messages)["cache"]}, {"cache": llm.chat(messages)["cache"]}]
+        agent = Agent.__new__(Agent)
+        agent.llm = llm
+        summary = agent._cache_summary(trace)
+        self.assertEqual((summary["calls"], summary["hits"], summary["hit_ratio"]), (2, 1, 0.5))
+        self.assertEqual(llm.llm.calls, 1)
+
+    def test_async_client_streams_uncached_through_the_wrapped_client(self) -> None:
+        inner = _EchoLLM()
+        llm = AsyncCachedLLMClient(inner, SqliteCache(str(self.path)))
+        messages = [{"role": "user", "content": "hi"}]
+        for _ in range(2):
+            events = list(llm.chat_stream(messages))
+            self.assertEqual(events[-1]["message"], "hi")
+            self.assertNotIn("cache", events[-1])
+        self.assertEqual(llm.counters()["writes"], 0)
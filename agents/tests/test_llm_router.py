@@ -0,0 +1,131 @@
+import asyncio
+from typing import Any, Dict, List
+
+from django.test import SimpleTestCase
+
+from agents.databricks_client import AsyncDatabricksLLMClient, DatabricksLLMClient
+from agents.llm_router import AsyncLLMRouter, LLMRouter
+from agents.transport import AsyncHttpTransport, HttpTransport
+from bench.fakes import FakeLLMServer, Latency
+
+MESSAGES: List[Dict[str, Any]] = [{"role": "user", "content": "What is a one-time pad?"}]
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class LLMRouterTests(SimpleTestCase):
+    """LLMRouter over local fake serving endpoints: failover, circuit breaking and hedging."""
+
+    def setUp(self) -> None:
+        self.transport = HttpTransport(max_retries=0)
+        self.addCleanup(self.transport.close)
+        self.servers: Dict[str, FakeLLMServer] = {}
+
+    def server(self, name: str, latency: str = "fixed:10", error_rate: float = 0.0) -> FakeLLMServer:
+        server = FakeLLMServer(latency=latency, tool_rate=0.0, answer_words=5, error_rate=error_rate).start()
+        self.addCleanup(server.stop)
+        self.servers[name] = server
+        return server
+
+    def requests(self, name: str) -> int:
+        return self.servers[name].stats()["requests"]
+
+    def router(self, read_timeout: float = 5.0, **kwargs: Any) -> LLMRouter:
+        endpoints = [
+            (name, DatabricksLLMClient(None, "token", server.url, transport=self.transport, read_timeout=read_timeout))
+            for name, server in self.servers.items()
+        ]
+        return LLMRouter(endpoints, **kwargs)
+
+    def test_fails_over_on_5xx(self) -> None:
+        self.server("down", error_rate=1.0)
+        self.server("up")
+        router = self.router()
+        for _ in range(4):
+            result = router.chat(MESSAGES)
+            self.assertEqual(result["route"]["endpoint"], "up")
+        self.assertGreaterEqual(self.requests("down"), 1)
+        self.assertEqual(router.stats()["failovers"], self.requests("down"))
+
+    def test_fails_over_on_timeout(self) -> None:
+        self.server("slow", latency="fixed:1000")
+        self.server("up")
+        router = self.router(read_timeout=0.2)
+        # Untried endpoints go first in random order; run until the slow one has been tried.
+        while not self.requests("slow"):
+            self.assertEqual(router.chat(MESSAGES)["route"]["endpoint"], "up")
+        stats = {state["name"]: state for state in router.stats()["endpoints"]}
+        self.assertEqual(stats["slow"]["errors"], 1)
+        self.assertGreaterEqual(router.stats()["failovers"], 1)
+
+    def test_circuit_opens_then_half_opens_with_one_trial(self) -> None:
+        down = self.server("down", error_rate=1.0)
+        self.server("up")
+        clock = _Clock()
+        router = self.router(failure_threshold=1, cooldown=30.0, clock=clock)
+        while not self.requests("down"):
+            router.chat(MESSAGES)
+        self.assertEqual(router.stats()["endpoints"][0]["state"], "open")
+        for _ in range(3):
+            router.chat(MESSAGES)
+        self.assertEqual(self.requests("down"), 1)  # open: skipped
+
+        clock.now = 31.0
+        self.assertEqual(router.stats()["endpoints"][0]["state"], "half_open")
+        down.error_rate = 0.0
+        while self.requests("down") < 2:
+            router.chat(MESSAGES)
+        self.assertEqual(router.stats()["endpoints"][0]["state"], "closed")
+
+    def test_failed_half_open_trial_reopens_the_circuit(self) -> None:
+        self.server("down", error_rate=1.0)
+        self.server("up")
+        clock = _Clock()
+        router = self.router(failure_threshold=2, cooldown=30.0, clock=clock)
+        while router.stats()["endpoints"][0]["state"] != "open":
+            router.chat(MESSAGES)
+        clock.now = 31.0
+        while router.stats()["endpoints"][0]["state"] == "half_open":
+            router.chat(MESSAGES)
+        down = router.stats()["endpoints"][0]
+        self.assertEqual((down["state"], down["circuit_opens"]), ("open", 2))
+
+    def test_hedges_a_slow_request_to_the_other_endpoint(self) -> None:
+        primary = self.server("primary")
+        self.server("backup")
+        router = self.router(hedge=True, hedge_min_samples=3, hedge_min_delay=0.05)
+        for _ in range(10):
+            router.chat(MESSAGES)
+        primary.latency = Latency("fixed:2000")
+        # Latency-weighted selection keeps picking the primary until its EWMA catches up.
+        router.endpoints[1].ewma = 1.0
+        fired = router.stats()["hedges_fired"]  # warm-up calls may have hedged on scheduling jitter
+        result = router.chat(MESSAGES)
+        self.assertEqual(result["route"], {"endpoint": "backup", "attempts": 2, "hedged": True})
+        self.assertEqual(router.stats()["hedges_fired"], fired + 1)
+
+
+class AsyncLLMRouterTests(SimpleTestCase):
+    def test_fails_over_on_5xx(self) -> None:
+        down = FakeLLMServer(latency="fixed:10", tool_rate=0.0, answer_words=5, error_rate=1.0).start()
+        up = FakeLLMServer(latency="fixed:10", tool_rate=0.0, answer_words=5).start()
+        self.addCleanup(down.stop)
+        self.addCleanup(up.stop)
+        transport = AsyncHttpTransport(max_retries=0)
+        endpoints = [
+            (name, AsyncDatabricksLLMClient(None, "token", server.url, transport=transport))
+            for name, server in (("down", down), ("up", up))
+        ]
+        router = AsyncLLMRouter(endpoints)
+
+        async def run() -> List[str]:
+            return [(await router.chat(MESSAGES))["route"]["endpoint"] for _ in range(4)]
+
+        self.assertEqual(asyncio.run(run()), ["up"] * 4)
+        self.assertEqual(router.stats()["failovers"], down.stats()["requests"])
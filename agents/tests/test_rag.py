@@ -0,0 +1,45 @@
+from typing import List
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from agents import rag as rag_module
+from agents import tokenizer
+from agents.rag import RagPipeline
+
+CHUNKS = [
+    {"text": "AES is a block cipher", "source": "a"},
+    {"text": "RSA keys and AES keys", "source": "b"},
+    {"text": "Nothing relevant here", "source": "c"},
+]
+
+
+class KeywordFallbackTests(SimpleTestCase):
+    """RagPipeline.search without a vector store (no corpus): keyword overlap on precomputed term ids."""
+
+    def setUp(self) -> None:
+        self.rag = RagPipeline("/nonexistent.pdf", cache_path=None, query_cache_size=0)
+        self.rag.chunks = list(CHUNKS)
+
+    def test_ranks_chunks_by_distinct_query_terms(self) -> None:
+        self.assertEqual([c["source"] for c in self.rag.search("aes keys", k=3)], ["b", "a"])
+        self.assertEqual(self.rag.search_many(["rsa", "zzz"], k=3), [[CHUNKS[1]], []])
+
+    def test_queries_never_tokenize_chunk_text(self) -> None:
+        self.rag.search("warm up", k=1)  # builds the fallback postings once
+        seen: List[str] = []
+
+        def recording(text: str) -> List[str]:
+            seen.append(text)
+            return tokenizer.TOKEN_PATTERN.findall(text.lower())
+
+        with mock.patch.object(rag_module, "tokenize", recording), mock.patch.object(tokenizer, "tokenize", recording):
+            self.assertEqual(self.rag.search("block cipher", k=1), [CHUNKS[0]])
+            self.rag.search_many(["rsa keys", "aes"], k=2)
+        self.assertTrue(seen)
+        self.assertFalse(set(seen) & {chunk["text"] for chunk in CHUNKS})
+
+    def test_replacing_the_chunks_rebuilds_the_postings(self) -> None:
+        self.rag.search("aes", k=1)
+        self.rag.chunks = [{"text": "Elliptic curves", "source": "d"}]
+        self.assertEqual(self.rag.search("curves", k=1), [{"text": "Elliptic curves", "source": "d"}])
@@ -0,0 +1,153 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List
+
+from django.test import SimpleTestCase
+
+from agents.cache import SingleFlight
+from agents.deadline import Deadline, DeadlineExceeded, deadline_scope
+from agents.search import AsyncWebSearchClient, SearchResultCache, WebSearchClient
+from agents.transport import HttpTransport
+from bench.fakes import FakeSearchServer
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class SearchResultCacheTests(SimpleTestCase):
+    """SearchResultCache in front of a local search API: hits, misses, expiry and single-flight."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.server = FakeSearchServer(latency="fixed:200").start()
+        cls.transport = HttpTransport(max_retries=0)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.stop()
+        cls.transport.close()
+        super().tearDownClass()
+
+    def setUp(self) -> None:
+        self.clock = _Clock()
+        self.cache = SearchResultCache(ttl=60.0, clock=self.clock)
+        self.client = WebSearchClient(
+            endpoint=f"{self.server.url}/search", api_key=None, transport=self.transport, cache=self.cache
+        )
+        self.requests_before = self.server.stats()["requests"]
+
+    def requests(self) -> int:
+        return self.server.stats()["requests"] - self.requests_before
+
+    def test_repeated_query_is_served_from_the_cache(self) -> None:
+        first = self.client.search("one-time pad")
+        second = self.client.search("One-time   PAD")
+        self.assertEqual(first, second)
+        self.assertEqual(self.requests(), 1)
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["fetches"]), (1, 1))
+
+    def test_different_query_or_limit_misses(self) -> None:
+        self.client.search("aes")
+        self.client.search("rsa")
+        self.client.search("aes", limit=5)
+        self.assertEqual(self.requests(), 3)
+        self.assertEqual(self.cache.stats()["hits"], 0)
+
+    def test_entries_expire_after_the_ttl(self) -> None:
+        self.client.search("aes")
+        self.clock.now = 59.0
+        self.client.search("aes")
+        self.assertEqual(self.requests(), 1)
+        self.clock.now = 61.0
+        self.client.search("aes")
+        self.assertEqual(self.requests(), 2)
+        self.assertEqual(self.cache.stats()["expirations"], 1)
+
+    def test_concurrent_identical_queries_share_one_request(self) -> None:
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(lambda _: self.client.search("diffie hellman"), range(8)))
+        self.assertTrue(all(result == results[0] for result in results))
+        self.assertEqual(self.requests(), 1)
+        stats = self.cache.stats()
+        self.assertEqual((stats["fetches"], stats["coalesced"]), (1, 7))
+
+    def test_concurrent_identical_async_queries_share_one_request(self) -> None:
+        client = AsyncWebSearchClient(endpoint=f"{self.server.url}/search", api_key=None, cache=self.cache)
+
+        async def search_all() -> List[Any]:
+            return await asyncio.gather(*(client.search("elgamal") for _ in range(5)))
+
+        results = asyncio.run(search_all())
+        self.assertTrue(all(result == results[0] for result in results))
+        self.assertEqual(self.requests(), 1)
+        self.assertEqual(self.cache.stats()["coalesced"], 4)
+
+
+class SingleFlightDeadlineTests(SimpleTestCase):
+    def test_waiter_gives_up_at_its_own_deadline(self) -> None:
+        flights = SingleFlight()
+        release = threading.Event()
+        leader = threading.Thread(target=flights.do, args=("k", lambda: release.wait(5) and "done"))
+        leader.start()
+        while not flights.stats()["in_flight"]:
+            time.sleep(0.001)
+        started = time.perf_counter()
+        with deadline_scope(Deadline(0.1)):
+            with self.assertRaises(DeadlineExceeded):
+                flights.do("k", lambda: "unused")
+        self.assertLess(time.perf_counter() - started, 1.0)
+        release.set()
+        leader.join()
+
+    def test_waiter_takes_over_when_the_leader_runs_out_of_time(self) -> None:
+        flights = SingleFlight()
+        joined = threading.Event()
+
+        def leader() -> None:
+            def fn() -> str:
+                joined.wait(5)
+                raise DeadlineExceeded("search")
+
+            with self.assertRaises(DeadlineExceeded):
+                flights.do("k", fn)
+
+        thread = threading.Thread(target=leader)
+        thread.start()
+        while not flights.stats()["in_flight"]:
+            time.sleep(0.001)
+        timer = threading.Timer(0.05, joined.set)
+        timer.start()
+        self.assertEqual(flights.do("k", lambda: "fresh"), "fresh")
+        thread.join()
+        stats = flights.stats()
+        self.assertEqual((stats["executions"], stats["retries"]), (2, 1))
+
+    def test_async_waiter_takes_over_when_the_leader_is_cancelled(self) -> None:
+        flights = SingleFlight()
+
+        async def scenario() -> str:
+            async def slow() -> str:
+                await asyncio.sleep(5)
+                return "stale"
+
+            async def fast() -> str:
+                return "fresh"
+
+            leader = asyncio.ensure_future(flights.ado("k", slow))
+            await asyncio.sleep(0)
+            waiter = asyncio.ensure_future(flights.ado("k", fast))
+            await asyncio.sleep(0)
+            leader.cancel()
+            return await waiter
+
+        self.assertEqual(asyncio.run(scenario()), "fresh")
+        self.assertEqual(flights.stats()["retries"], 1)
@@ -0,0 +1,76 @@
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import List
+
+from django.test import SimpleTestCase
+
+from agents.sessions import MemorySessionStore, SessionConflict, SessionStore, SqliteSessionStore
+
+
+def _turn(text: str) -> List[dict]:
+    return [{"role": "user", "content": text}, {"role": "assistant", "content": f"re: {text}"}]
+
+
+class _SessionStoreContract(ABC):
+    """Checks shared by both backends; `make_store` builds a fresh store."""
+
+    @abstractmethod
+    def make_store(self) -> SessionStore:
+        ...
+
+    def test_turn_read_at_the_current_seq_is_stored(self) -> None:
+        store = self.make_store()
+        self.assertEqual(store.append("s", _turn("one"), base_seq=0), 1)
+        self.assertEqual(store.append("s", _turn("two"), base_seq=1), 2)
+        session = store.get("s")
+        self.assertEqual((session.seq, len(session.messages)), (2, 4))
+
+    def test_stale_turn_is_rejected_and_not_stored(self) -> None:
+        store = self.make_store()
+        store.append("s", _turn("first"), base_seq=0)
+        with self.assertRaises(SessionConflict) as raised:
+            store.append("s", _turn("racing"), base_seq=0)
+        self.assertEqual((raised.exception.base_seq, raised.exception.seq), (0, 1))
+        session = store.get("s")
+        self.assertEqual([m["content"] for m in session.messages], ["first", "re: first"])
+        self.assertEqual(store.stats()["conflicts"], 1)
+
+    def test_concurrent_turns_never_interleave(self) -> None:
+        store = self.make_store()
+        start = threading.Barrier(8)
+        stored: List[int] = []
+
+        def turn(idx: int) -> None:
+            start.wait()
+            try:
+                stored.append(store.append("s", _turn(f"q{idx}"), base_seq=0))
+            except SessionConflict:
+                pass
+
+        threads = [threading.Thread(target=turn, args=(idx,)) for idx in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(stored, [1])
+        session = store.get("s")
+        self.assertEqual(len(session.messages), 2)
+        self.assertEqual(session.messages[1]["content"], f"re: {session.messages[0]['content']}")
+
+
+class MemorySessionStoreTests(_SessionStoreContract, SimpleTestCase):
+    def make_store(self) -> SessionStore:
+        return MemorySessionStore()
+
+    def test_store_interface_is_abstract(self) -> None:
+        with self.assertRaises(TypeError):
+            SessionStore()  # type: ignore[abstract]
+
+
+class SqliteSessionStoreTests(_SessionStoreContract, SimpleTestCase):
+    def make_store(self) -> SessionStore:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        return SqliteSessionStore(str(Path(tmp.name) / "sessions.sqlite3"))
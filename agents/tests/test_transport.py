@@ -0,0 +1,63 @@
+import asyncio
+
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase
+
+from agents.transport import AsyncHttpTransport
+from bench.fakes import FakeSearchServer
+
+try:
+    import httpx  # noqa: F401
+except ImportError:  # pragma: no cover - optional dependency
+    httpx = None
+
+
+class AsyncClientLifecycleTests(SimpleTestCase):
+    """AsyncHttpTransport keeps one pool per event loop and closes it with the loop."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.server = FakeSearchServer(latency="fixed:0").start()
+        cls.url = f"{cls.server.url}/search"
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.stop()
+        super().tearDownClass()
+
+    def setUp(self) -> None:
+        if httpx is None:
+            self.skipTest("httpx is not installed")
+        self.transport = AsyncHttpTransport(max_retries=0)
+
+    def test_sequential_requests_on_fresh_loops_leave_no_open_pool(self) -> None:
+        # Django runs async views under WSGI like this: a new event loop per request.
+        for query in ("aes", "rsa"):
+            response = async_to_sync(self.transport.get)(self.url, params={"q": query})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(self.transport.open_clients(), 0)
+
+    def test_asyncio_run_closes_the_client(self) -> None:
+        asyncio.run(self.transport.get(self.url, params={"q": "aes"}))
+        asyncio.run(self.transport.get(self.url, params={"q": "rsa"}))
+        self.assertEqual(self.transport.open_clients(), 0)
+
+    def test_requests_on_one_loop_share_a_pool(self) -> None:
+        async def two_requests() -> tuple:
+            await self.transport.get(self.url, params={"q": "aes"})
+            await self.transport.get(self.url, params={"q": "rsa"})
+            return self.transport.open_clients(), self.transport.stats()["pools"]
+
+        open_clients, pools = asyncio.run(two_requests())
+        self.assertEqual(open_clients, 1)
+        self.assertEqual(sum(pool["connections"] for pool in pools.values()), 1)
+        self.assertEqual(self.transport.open_clients(), 0)
+
+    def test_aclose_closes_the_running_loops_client(self) -> None:
+        async def request_then_close() -> int:
+            await self.transport.get(self.url, params={"q": "aes"})
+            await self.transport.aclose()
+            return self.transport.open_clients()
+
+        self.assertEqual(asyncio.run(request_then_close()), 0)
@@ -0,0 +1,37 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from agents import vector_store
+from agents.matrix_backend import numpy_available
+from agents.vector_store import TfidfVectorStore
+
+DOCUMENTS = [
+    {"text": "AES is a block cipher", "source": "a"},
+    {"text": "RSA keys and AES keys", "source": "b"},
+    {"text": "Nothing relevant here", "source": "c"},
+]
+
+
+class AutoMatrixBackendTests(SimpleTestCase):
+    """backend="auto" without SciPy builds the dense matrix only below DENSE_MAX_BYTES."""
+
+    def setUp(self) -> None:
+        if not numpy_available():
+            self.skipTest("numpy is not installed")
+        self.store = TfidfVectorStore(backend="auto")
+        self.store.build(DOCUMENTS, source_pdf=None, source_mtime=None)
+        patcher = mock.patch.object(vector_store, "scipy_available", lambda: False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_small_index_uses_the_dense_matrix(self) -> None:
+        self.store.warm()
+        self.assertIsNotNone(self.store._matrix)
+        self.assertEqual(self.store.search_many(["rsa"], k=1), [[DOCUMENTS[1]]])
+
+    def test_oversized_index_keeps_the_postings_path(self) -> None:
+        with mock.patch.object(vector_store, "DENSE_MAX_BYTES", 16):
+            self.store.warm()
+            self.assertIsNone(self.store._matrix)
+            self.assertEqual(self.store.search_many(["rsa", "cipher"], k=1), [[DOCUMENTS[1]], [DOCUMENTS[0]]])
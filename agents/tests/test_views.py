@@ -0,0 +1,37 @@
+import json
+from typing import Any, Dict, List
+from unittest import mock
+
+from django.test import RequestFactory, SimpleTestCase
+
+from agents import views
+from agents.sessions import MemorySessionStore
+
+
+class _RacingAgent:
+    """Agent stand-in whose run lets another turn land on the session before it answers."""
+
+    def __init__(self, store: MemorySessionStore) -> None:
+        self.store = store
+
+    def run(self, query: str, conversation_history: List[Dict[str, str]], **kwargs: Any) -> Dict[str, Any]:
+        self.store.append("s", [{"role": "user", "content": "racing"}], base_seq=None)
+        return {"answer": f"re: {query}", "trace": [], "context_used": []}
+
+
+class SessionConflictViewTests(SimpleTestCase):
+    def setUp(self) -> None:
+        self.store = MemorySessionStore()
+        for name, value in (("SESSION_STORE", self.store), ("AGENT_INSTANCE", _RacingAgent(self.store))):
+            patcher = mock.patch.object(views, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_conflict_returns_the_computed_answer(self) -> None:
+        request = RequestFactory().get("/api/agent/query/", {"query": "what is aes", "session_id": "s"})
+        response = views.agent_query(request)
+        self.assertEqual(response.status_code, 409)
+        body = json.loads(response.content)
+        self.assertEqual((body["session_id"], body["session_seq"]), ("s", 1))
+        self.assertEqual(body["result"]["answer"], "re: what is aes")
+        self.assertEqual([m["content"] for m in self.store.get("s").messages], ["racing"])
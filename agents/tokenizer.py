@@ -0,0 +1,48 @@
+import re
+from array import array
+from typing import Dict, Iterator, List, Mapping, Optional, Tuple
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Shared tokenizer for indexing, querying and cache keys: lowercase word characters."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def encode(text: str, vocabulary: Mapping[str, int]) -> List[int]:
+    """Map text to term ids of an existing vocabulary; unknown terms are dropped."""
+    ids: List[int] = []
+    for term in tokenize(text):
+        term_id = vocabulary.get(term)
+        if term_id is not None:
+            ids.append(term_id)
+    return ids
+
+
+class TermInterner:
+    """
+    Interns terms to dense integer ids at index time.
+    Ids are assigned in first-seen order and never change, so postings and per-chunk
+    term-id arrays built against one interner stay valid as more text is added.
+    """
+
+    def __init__(self, vocabulary: Optional[Mapping[str, int]] = None) -> None:
+        self.terms: Dict[str, int] = dict(vocabulary.items()) if vocabulary else {}
+
+    def intern(self, term: str) -> int:
+        return self.terms.setdefault(term, len(self.terms))
+
+    def intern_text(self, text: str) -> array:
+        """Tokenize and intern in one pass; returns the term-id sequence as a compact int array."""
+        terms = self.terms
+        return array("i", [terms.setdefault(term, len(terms)) for term in tokenize(text)])
+
+    def get(self, term: str) -> Optional[int]:
+        return self.terms.get(term)
+
+    def items(self) -> Iterator[Tuple[str, int]]:
+        return iter(self.terms.items())
+
+    def __len__(self) -> int:
+        return len(self.terms)
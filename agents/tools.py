@@ -1,10 +1,13 @@
+import asyncio
 from dataclasses import dataclass
-from typing import Any, Callable, Dict, List
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 
-from .search import WebSearchClient
+from .metrics import span
+from .search import AsyncWebSearchClient, WebSearchClient
 
 
 Handler = Callable[[Dict[str, Any]], str]
+AsyncHandler = Callable[[Dict[str, Any]], Awaitable[str]]
 
 
 @dataclass
@@ -13,6 +16,8 @@ class Tool:
     description: str
     parameters: Dict[str, Any]
     handler: Handler
+    # Optional native coroutine used by `ToolRegistry.acall`; without it the sync handler runs in a thread.
+    async_handler: Optional[AsyncHandler] = None
 
 
 class ToolRegistry:
@@ -40,13 +45,25 @@ class ToolRegistry:
         tool = self._tools.get(name)
         if not tool:
             raise ValueError(f"Tool {name} not registered")
-        return tool.handler(arguments or {})
+        with span(f"tool_{name}"):
+            return tool.handler(arguments or {})
+
+    async def acall(self, name: str, arguments: Dict[str, Any]) -> str:
+        tool = self._tools.get(name)
+        if not tool:
+            raise ValueError(f"Tool {name} not registered")
+        with span(f"tool_{name}"):
+            if tool.async_handler is not None:
+                return await tool.async_handler(arguments or {})
+            return await asyncio.to_thread(tool.handler, arguments or {})
 
     def names(self) -> List[str]:
         return list(self._tools.keys())
 
 
-def build_builtin_tools(search_client: WebSearchClient) -> ToolRegistry:
+def build_builtin_tools(
+    search_client: WebSearchClient, async_search_client: Optional[AsyncWebSearchClient] = None
+) -> ToolRegistry:
     registry = ToolRegistry()
 
     def web_search(args: Dict[str, Any]) -> str:
@@ -54,7 +71,15 @@ def build_builtin_tools(search_client: WebSearchClient) -> ToolRegistry:
         if not query:
             return "No query provided."
         results = search_client.search(query=query, limit=int(args.get("limit", 3)))
-        return "\n".join(f"- {item['title']}: {item['url']} ({item['snippet']})" for item in results)
+        return _format_search_results(results)
+
+    async def web_search_async(args: Dict[str, Any]) -> str:
+        query = args.get("query", "")
+        if not query:
+            return "No query provided."
+        assert async_search_client is not None
+        results = await async_search_client.search(query=query, limit=int(args.get("limit", 3)))
+        return _format_search_results(results)
 
     registry.register(
         Tool(
@@ -69,6 +94,7 @@ def build_builtin_tools(search_client: WebSearchClient) -> ToolRegistry:
                 "required": ["query"],
             },
             handler=web_search,
+            async_handler=web_search_async if async_search_client is not None else None,
         )
     )
 
@@ -114,6 +140,10 @@ def build_builtin_tools(search_client: WebSearchClient) -> ToolRegistry:
     return registry
 
 
+def _format_search_results(results: List[Dict[str, Any]]) -> str:
+    return "\n".join(f"- {item['title']}: {item['url']} ({item['snippet']})" for item in results)
+
+
 def add_tool(registry: ToolRegistry, tool: Tool) -> None:
     """Helper used by docs to show how to plug more tools in."""
     registry.register(tool)
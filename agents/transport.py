@@ -0,0 +1,439 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from .deadline import DeadlineExceeded, bounded_timeout, expired, remaining
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+
+class _BaseTransport:
+    """Retry policy, timeouts and per-host counters shared by the sync and async transports."""
+
+    def __init__(
+        self,
+        pool_connections: int = 10,
+        pool_maxsize: int = 10,
+        pool_block: bool = False,
+        connect_timeout: float = 3.05,
+        read_timeout: float = 60.0,
+        max_retries: int = 2,
+        backoff_base: float = 0.25,
+        backoff_max: float = 4.0,
+        retry_statuses: Iterable[int] = RETRY_STATUSES,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_statuses = frozenset(retry_statuses)
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, Dict[str, float]] = {}
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-host request counters and connection-pool usage."""
+        with self._lock:
+            hosts = {host: dict(counters) for host, counters in self._hosts.items()}
+        for host, counters in hosts.items():
+            requests_done = counters.get("requests", 0)
+            seconds = counters.pop("seconds", 0.0)
+            counters["avg_ms"] = round(1000 * seconds / requests_done, 2) if requests_done else 0.0
+        return {
+            "pool_connections": self.pool_connections,
+            "pool_maxsize": self.pool_maxsize,
+            "connect_timeout": self.connect_timeout,
+            "read_timeout": self.read_timeout,
+            "max_retries": self.max_retries,
+            "hosts": hosts,
+            "pools": self._pool_usage(),
+        }
+
+    @staticmethod
+    def _retry_fits(delay: float) -> bool:
+        """Whether a retry after `delay` seconds still starts before the request deadline (if any)."""
+        left = remaining()
+        return left is None or delay < left
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after:
+            try:
+                return min(max(float(retry_after), 0.0), self.backoff_max)
+            except ValueError:
+                pass  # HTTP-date form; fall back to computed backoff
+        # Full jitter: uniform in [0, min(cap, base * 2^attempt)].
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2**attempt)))
+
+    @staticmethod
+    def _host(url: str) -> str:
+        return urlsplit(url).netloc or url
+
+    def _count(self, host: str, name: str, delta: float) -> None:
+        with self._lock:
+            counters = self._hosts.setdefault(host, {})
+            counters[name] = counters.get(name, 0) + delta
+
+    def _finish(self, host: str, started: float, error: bool) -> None:
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            counters = self._hosts.setdefault(host, {})
+            counters["in_flight"] = counters.get("in_flight", 0) - 1
+            counters["requests"] = counters.get("requests", 0) + 1
+            counters["seconds"] = counters.get("seconds", 0.0) + elapsed
+            if error:
+                counters["errors"] = counters.get("errors", 0) + 1
+
+    def _pool_usage(self) -> Dict[str, Dict[str, int]]:
+        return {}
+
+
+class HttpTransport(_BaseTransport):
+    """
+    Shared HTTP transport for outbound API calls.
+    - One requests.Session with per-host connection pools (keep-alive), so repeated LLM and
+      search calls reuse TCP/TLS connections instead of handshaking every time.
+    - Bounded retries with full-jitter exponential backoff on 429/5xx and connection failures;
+      a Retry-After header is honoured (capped at `backoff_max`). Read timeouts are only retried
+      for idempotent methods, so a slow completion is never silently sent twice.
+    - Separate connect and read timeouts, both capped to the time left before the current request
+      deadline (agents/deadline.py); no attempt or retry starts after it, and a timeout past it
+      raises DeadlineExceeded.
+    - Per-host counters (requests, retries, errors, in-flight, latency) plus urllib3 pool usage.
+    The session is recreated after a fork so worker processes never share sockets.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._session: Optional[requests.Session] = None
+        self._adapter: Optional[HTTPAdapter] = None
+        self._pid = 0
+
+    @property
+    def session(self) -> requests.Session:
+        if self._session is None or self._pid != os.getpid():
+            with self._lock:
+                if self._session is None or self._pid != os.getpid():
+                    session = requests.Session()
+                    adapter = HTTPAdapter(
+                        pool_connections=self.pool_connections,
+                        pool_maxsize=self.pool_maxsize,
+                        pool_block=self.pool_block,
+                        max_retries=0,  # retries are handled here, with backoff and metrics
+                    )
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    self._session, self._adapter, self._pid = session, adapter, os.getpid()
+        return self._session
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        read_timeout: Optional[float] = None,
+        retries: Optional[int] = None,
+        **kwargs: Any,
+    ) -> requests.Response:
+        """
+        Send a request through the pooled session. `read_timeout`/`retries` override the defaults
+        per call. Returns the final response (which may still be a retryable status once retries are
+        exhausted); raises the last connection/timeout error if every attempt failed.
+        """
+        method = method.upper()
+        max_retries = self.max_retries if retries is None else max(0, retries)
+        host = self._host(url)
+        stage = f"{method} {host}"
+        attempt = 0
+        while True:
+            read = bounded_timeout(read_timeout or self.read_timeout, stage)
+            timeout: Tuple[float, float] = (min(self.connect_timeout, read), read)
+            self._count(host, "in_flight", 1)
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, timeout=timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                retryable = not isinstance(exc, requests.ReadTimeout) or method in IDEMPOTENT_METHODS
+                self._finish(host, started, error=True)
+                if isinstance(exc, requests.Timeout) and expired():
+                    raise DeadlineExceeded(stage) from exc
+                delay = self._backoff(attempt)
+                if not retryable or attempt >= max_retries or not self._retry_fits(delay):
+                    raise
+                logger.warning(
+                    "%s %s failed (%s); retry %d in %.2fs", method, host, exc.__class__.__name__, attempt + 1, delay
+                )
+            else:
+                self._finish(host, started, error=response.status_code >= 500)
+                if response.status_code not in self.retry_statuses or attempt >= max_retries:
+                    return response
+                delay = self._backoff(attempt, response.headers.get("Retry-After"))
+                if not self._retry_fits(delay):
+                    return response
+                logger.warning(
+                    "%s %s returned %d; retry %d in %.2fs", method, host, response.status_code, attempt + 1, delay
+                )
+                response.close()
+            attempt += 1
+            self._count(host, "retries", 1)
+            self._sleep(delay)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+            self._session = self._adapter = None
+
+    def _pool_usage(self) -> Dict[str, Dict[str, int]]:
+        """Connections opened, requests served and idle keep-alive connections per urllib3 pool."""
+        adapter = self._adapter
+        if adapter is None or self._pid != os.getpid():
+            return {}
+        usage: Dict[str, Dict[str, int]] = {}
+        pools = adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            if pool.pool is None:  # closed pool
+                continue
+            idle = sum(1 for conn in list(pool.pool.queue) if conn is not None)
+            usage[f"{key.key_scheme}://{key.key_host}:{key.key_port}"] = {
+                "connections_opened": pool.num_connections,
+                "requests": pool.num_requests,
+                "idle": idle,
+                "maxsize": pool.pool.maxsize,
+            }
+        return usage
+
+
+class AsyncHttpTransport(_BaseTransport):
+    """
+    asyncio counterpart of HttpTransport, built on httpx.AsyncClient when httpx is installed.
+    - One pooled keep-alive client per event loop: up to `max_connections` concurrent
+      connections, `pool_maxsize` of them kept alive when idle. A client is closed when its loop
+      shuts down (`asyncio.run` and Django's per-request loops under WSGI both do), so per-request
+      loops never leave pools and sockets behind.
+    - Same retry/backoff policy, deadline-capped connect/read timeouts and per-host counters as HttpTransport.
+    - Without httpx, each request runs on a sync HttpTransport in a worker thread, so the
+      event loop is never blocked (concurrency is then bounded by the default executor).
+    Requests take `content=` for raw bodies, as httpx does.
+    """
+
+    def __init__(self, *args: Any, max_connections: int = 100, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.max_connections = max_connections
+        # loop -> (client, async generator that closes it at the loop's shutdown_asyncgens()).
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Tuple[Any, AsyncIterator[None]]]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._fallback: Optional[HttpTransport] = None
+        try:
+            import httpx  # type: ignore # noqa: F401
+
+            self.backend = "httpx"
+        except ImportError:
+            self.backend = "thread"
+            self._fallback = HttpTransport(*args, **kwargs)
+
+    async def client(self) -> Any:
+        """The running loop's pooled client, created on first use."""
+        loop = asyncio.get_running_loop()
+        entry = self._clients.get(loop)
+        if entry is None:
+            import httpx  # type: ignore
+
+            client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.pool_maxsize),
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+            )
+            # Loops finalise their async generators before closing; this one closes the client then.
+            closer = _close_at_shutdown(client)
+            await closer.__anext__()
+            entry = self._clients[loop] = (client, closer)
+        return entry[0]
+
+    def open_clients(self) -> int:
+        """Clients (connection pools) not closed yet, across event loops."""
+        return sum(1 for client in self._live_clients() if not client.is_closed)
+
+    async def get(self, url: str, **kwargs: Any) -> Any:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs: Any) -> Any:
+        return await self.request("POST", url, **kwargs)
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        read_timeout: Optional[float] = None,
+        retries: Optional[int] = None,
+        **kwargs: Any,
+    ) -> Any:
+        """Async `HttpTransport.request`; returns an httpx.Response (requests.Response in thread mode)."""
+        if self._fallback is not None:
+            if "content" in kwargs:
+                kwargs["data"] = kwargs.pop("content")
+            return await asyncio.to_thread(
+                self._fallback.request, method, url, read_timeout=read_timeout, retries=retries, **kwargs
+            )
+
+        import httpx  # type: ignore
+
+        method = method.upper()
+        max_retries = self.max_retries if retries is None else max(0, retries)
+        host = self._host(url)
+        stage = f"{method} {host}"
+        attempt = 0
+        while True:
+            read = bounded_timeout(read_timeout or self.read_timeout, stage)
+            timeout = httpx.Timeout(read, connect=min(self.connect_timeout, read))
+            self._count(host, "in_flight", 1)
+            started = time.perf_counter()
+            try:
+                client = await self.client()
+                response = await client.request(method, url, timeout=timeout, **kwargs)
+            except httpx.TransportError as exc:
+                retryable = not isinstance(exc, httpx.ReadTimeout) or method in IDEMPOTENT_METHODS
+                self._finish(host, started, error=True)
+                if isinstance(exc, httpx.TimeoutException) and expired():
+                    raise DeadlineExceeded(stage) from exc
+                delay = self._backoff(attempt)
+                if not retryable or attempt >= max_retries or not self._retry_fits(delay):
+                    raise
+                logger.warning(
+                    "%s %s failed (%s); retry %d in %.2fs", method, host, exc.__class__.__name__, attempt + 1, delay
+                )
+            else:
+                self._finish(host, started, error=response.status_code >= 500)
+                if response.status_code not in self.retry_statuses or attempt >= max_retries:
+                    return response
+                delay = self._backoff(attempt, response.headers.get("Retry-After"))
+                if not self._retry_fits(delay):
+                    return response
+                logger.warning(
+                    "%s %s returned %d; retry %d in %.2fs", method, host, response.status_code, attempt + 1, delay
+                )
+                await response.aclose()
+            attempt += 1
+            self._count(host, "retries", 1)
+            await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        if self._fallback is not None:
+            return {**self._fallback.stats(), "backend": self.backend}
+        return {
+            **super().stats(),
+            "backend": self.backend,
+            "max_connections": self.max_connections,
+            "open_clients": self.open_clients(),
+        }
+
+    async def aclose(self) -> None:
+        """Close the running loop's client now (clients of other loops close with their loop)."""
+        entry = self._clients.pop(asyncio.get_running_loop(), None)
+        if entry is not None:
+            await entry[1].aclose()
+
+    def _live_clients(self) -> List[Any]:
+        return [client for client, _ in list(self._clients.values())]
+
+    def _pool_usage(self) -> Dict[str, Dict[str, int]]:
+        """Open and idle connections per origin over all open clients (read from httpcore's pools; best effort)."""
+        connections: List[Any] = []
+        for client in self._live_clients():
+            if client.is_closed:
+                continue
+            try:
+                connections.extend(client._transport._pool.connections)
+            except AttributeError:
+                continue
+        usage: Dict[str, Dict[str, int]] = {}
+        for conn in connections:
+            origin = str(getattr(conn, "_origin", "unknown"))
+            entry = usage.setdefault(origin, {"connections": 0, "idle": 0})
+            entry["connections"] += 1
+            entry["idle"] += 1 if conn.is_idle() else 0
+        return usage
+
+
+async def _close_at_shutdown(client: Any) -> AsyncIterator[None]:
+    try:
+        yield
+    finally:
+        await client.aclose()
+
+
+_SHARED: Optional[HttpTransport] = None
+_SHARED_ASYNC: Optional[AsyncHttpTransport] = None
+_SHARED_LOCK = threading.Lock()
+
+
+def build_default_transport() -> HttpTransport:
+    return HttpTransport(
+        pool_connections=settings.HTTP_POOL_CONNECTIONS,
+        pool_maxsize=settings.HTTP_POOL_MAXSIZE,
+        pool_block=settings.HTTP_POOL_BLOCK,
+        connect_timeout=settings.HTTP_CONNECT_TIMEOUT,
+        read_timeout=settings.HTTP_READ_TIMEOUT,
+        max_retries=settings.HTTP_MAX_RETRIES,
+        backoff_base=settings.HTTP_BACKOFF_BASE,
+        backoff_max=settings.HTTP_BACKOFF_MAX,
+    )
+
+
+def shared_transport() -> HttpTransport:
+    """Process-wide transport shared by the LLM and search clients."""
+    global _SHARED
+    if _SHARED is None:
+        with _SHARED_LOCK:
+            if _SHARED is None:
+                _SHARED = build_default_transport()
+    return _SHARED
+
+
+def build_default_async_transport() -> AsyncHttpTransport:
+    return AsyncHttpTransport(
+        pool_connections=settings.HTTP_POOL_CONNECTIONS,
+        pool_maxsize=settings.HTTP_POOL_MAXSIZE,
+        pool_block=settings.HTTP_POOL_BLOCK,
+        connect_timeout=settings.HTTP_CONNECT_TIMEOUT,
+        read_timeout=settings.HTTP_READ_TIMEOUT,
+        max_retries=settings.HTTP_MAX_RETRIES,
+        backoff_base=settings.HTTP_BACKOFF_BASE,
+        backoff_max=settings.HTTP_BACKOFF_MAX,
+        max_connections=settings.HTTP_ASYNC_MAX_CONNECTIONS,
+    )
+
+
+def shared_async_transport() -> AsyncHttpTransport:
+    """Process-wide async transport shared by the async LLM and search clients."""
+    global _SHARED_ASYNC
+    if _SHARED_ASYNC is None:
+        with _SHARED_LOCK:
+            if _SHARED_ASYNC is None:
+                _SHARED_ASYNC = build_default_async_transport()
+    return _SHARED_ASYNC
@@ -1,7 +1,12 @@
 from django.urls import path
 
-from .views import agent_query
+from .views import agent_batch, agent_metrics, agent_query, agent_query_async, agent_query_stream, agent_ready
 
 urlpatterns = [
     path("query/", agent_query, name="agent_query"),
+    path("query/stream/", agent_query_stream, name="agent_query_stream"),
+    path("query/async/", agent_query_async, name="agent_query_async"),
+    path("batch/", agent_batch, name="agent_batch"),
+    path("ready/", agent_ready, name="agent_ready"),
+    path("metrics/", agent_metrics, name="agent_metrics"),
 ]
@@ -1,110 +1,639 @@
+import heapq
+import itertools
 import json
 import math
-import re
+import time
+from array import array
+from bisect import bisect_left
 from collections import Counter
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from .ann import LshIndex
+from .chunk_store import ChunkStore
+from .index_format import IndexFile, MmapVocabulary, RecordSequence, record_sections, vocabulary_sections, write_index
+from .matrix_backend import DENSE_MAX_BYTES, MatrixScorer, dense_nbytes, numpy_available, scipy_available
+from .tokenizer import TermInterner, encode
+
+CACHE_FORMAT_VERSION = 4
+SCORING_MODES = ("tfidf", "bm25", "keyword")
+BACKENDS = ("auto", "python", "numpy")
+# Process-wide counter so every (re)loaded or rebuilt index gets a distinct version.
+_INDEX_VERSIONS = itertools.count(1)
 
 
 class TfidfVectorStore:
     """
-    Lightweight TF-IDF vector store for small corpora.
-    Stores vectors + metadata in JSON for reuse.
+    Sparse vector store backed by an inverted index.
+    - Posting lists are keyed by term id (CSR layout: offsets + doc ids + term freqs).
+    - Queries only touch the postings of their own terms; top-k uses a heap.
+    - Ranks by TF-IDF cosine (default), BM25, or plain query-term overlap ("keyword").
+    - Terms are interned to int ids once at index time; each chunk keeps a compact sorted term-id array.
+    - Optional NumPy/SciPy backend scores query batches in one matrix product (search_many).
+    - Supports incremental updates (drop/append documents) without re-tokenizing kept chunks.
+    - Optional LSH candidate generation (ann_tables > 0) for large corpora; candidates are re-ranked exactly.
+    Persists to a versioned, mmap-able binary index (JSON remains an import/export format).
     """
 
-    def __init__(self, cache_path: Optional[Path] = None) -> None:
+    def __init__(
+        self,
+        cache_path: Optional[Path] = None,
+        scoring: str = "tfidf",
+        bm25_k1: float = 1.5,
+        bm25_b: float = 0.75,
+        backend: str = "auto",
+        ann_tables: int = 0,
+        ann_bits: int = 12,
+        ann_candidates: int = 1000,
+        ann_probes: int = 0,
+        ann_min_docs: int = 5000,
+    ) -> None:
+        if scoring not in SCORING_MODES:
+            raise ValueError(f"Unknown scoring mode {scoring!r}; expected one of {', '.join(SCORING_MODES)}")
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+        if backend == "numpy" and not numpy_available():
+            raise RuntimeError("RAG backend 'numpy' requires numpy to be installed")
         self.cache_path = Path(cache_path) if cache_path else None
-        self.vocabulary: Dict[str, int] = {}
-        self.idf: List[float] = []
-        self.vectors: List[List[float]] = []
-        self.metadatas: List[Dict[str, str]] = []
+        self.scoring = scoring
+        self.bm25_k1 = bm25_k1
+        self.bm25_b = bm25_b
+        self.backend = backend
+        self._matrix: Optional[MatrixScorer] = None
+        # ANN is used only once the corpus has at least `ann_min_docs` chunks; below that exact search is cheap.
+        self.ann_tables = ann_tables
+        self.ann_bits = ann_bits
+        self.ann_candidates = ann_candidates
+        self.ann_probes = ann_probes
+        self.ann_min_docs = ann_min_docs
+        self._ann: Optional[LshIndex] = None
+        # Either in-memory arrays (after build) or zero-copy views into an mmap'd index file (after load).
+        self._index_file: Optional[IndexFile] = None
+        self.vocabulary: Mapping[str, int] = {}
+        self.idf: Sequence[float] = []
+        # postings for term t live in [posting_offsets[t], posting_offsets[t + 1]).
+        self.posting_offsets: Sequence[int] = array("q", [0])
+        self.posting_docs: Sequence[int] = array("i")
+        self.posting_tfs: Sequence[int] = array("i")
+        self.doc_lengths: Sequence[int] = array("i")
+        self.doc_norms: Sequence[float] = array("d")
+        # Forward index: sorted unique term ids (+ their tfs) of chunk d live in [doc_term_offsets[d], doc_term_offsets[d + 1]).
+        self.doc_term_offsets: Sequence[int] = array("q", [0])
+        self.doc_term_ids: Sequence[int] = array("i")
+        self.doc_term_tfs: Sequence[int] = array("i")
+        self._avg_doc_length: Optional[float] = None
+        self.version = 0
+        self.metadatas: Sequence[Dict[str, str]] = []
         self.source_pdf: Optional[str] = None
         self.source_mtime: Optional[float] = None
+        # Per-document bookkeeping for incremental rebuilds (content hash, page count, chunk ids).
+        self.manifest: Dict[str, Dict[str, Any]] = {}
+
+    @property
+    def num_docs(self) -> int:
+        return len(self.doc_lengths)
+
+    @property
+    def avg_doc_length(self) -> float:
+        if self._avg_doc_length is None:
+            self._avg_doc_length = (sum(self.doc_lengths) / self.num_docs) if self.num_docs else 0.0
+        return self._avg_doc_length
 
     def build(self, documents: List[Dict[str, str]], source_pdf: Optional[str], source_mtime: Optional[float]) -> None:
-        self.metadatas = documents
         self.source_pdf = source_pdf
         self.source_mtime = source_mtime
+        self.manifest = {}
+        self._set_index(
+            vocabulary={},
+            idf=array("d"),
+            posting_offsets=array("q", [0]),
+            posting_docs=array("i"),
+            posting_tfs=array("i"),
+            doc_lengths=array("i"),
+            doc_norms=array("d"),
+            doc_term_offsets=array("q", [0]),
+            doc_term_ids=array("i"),
+            doc_term_tfs=array("i"),
+            metadatas=[],
+        )
+        self._index_file = None
+        self.update(keep=[], documents=documents)
+
+    def update(
+        self,
+        keep: Sequence[int],
+        documents: Iterable[Dict[str, str]],
+        metadatas: Optional[Sequence[Dict[str, str]]] = None,
+    ) -> None:
+        """
+        Incrementally rebuild the index.
+        - `keep` lists existing doc indices to retain (in their new order); `documents` are appended.
+        - `metadatas`, if given, is the final per-row metadata (e.g. a ChunkStore filled while
+          `documents` streams); otherwise the kept rows' metadata plus the documents themselves.
+        - Only the new documents are tokenized (one at a time); postings of dropped docs are filtered out.
+        - Document frequencies come from the merged posting lists, so IDF is adjusted
+          without revisiting any chunk text.
+        """
+        old_terms = len(self.posting_offsets) - 1
+        remap = array("i", [-1]) * self.num_docs
+        for new_idx, old_idx in enumerate(keep):
+            remap[old_idx] = new_idx
+
+        interner = TermInterner(self.vocabulary)
+        doc_lengths = array("i", (self.doc_lengths[idx] for idx in keep))
+        doc_term_offsets = array("q", [0])
+        doc_term_ids = array("i")
+        doc_term_tfs = array("i")
+        for idx in keep:
+            start, end = self.doc_term_offsets[idx], self.doc_term_offsets[idx + 1]
+            doc_term_ids.extend(self.doc_term_ids[start:end])
+            doc_term_tfs.extend(self.doc_term_tfs[start:end])
+            doc_term_offsets.append(len(doc_term_ids))
+        rows: List[Dict[str, str]] = [] if metadatas is not None else [self.metadatas[idx] for idx in keep]
+        added: Dict[int, Tuple[array, array]] = {}
+        # Documents are consumed lazily so chunks can stream straight in from ingestion.
+        for doc in documents:
+            doc_idx = len(doc_lengths)
+            term_ids = interner.intern_text(doc.get("text", ""))
+            counts = Counter(term_ids)
+            for term_id, tf in counts.items():
+                if term_id not in added:
+                    added[term_id] = (array("i"), array("i"))
+                docs, tfs = added[term_id]
+                docs.append(doc_idx)
+                tfs.append(tf)
+            doc_lengths.append(len(term_ids))
+            for term_id in sorted(counts):
+                doc_term_ids.append(term_id)
+                doc_term_tfs.append(counts[term_id])
+            doc_term_offsets.append(len(doc_term_ids))
+            if metadatas is None:
+                rows.append(doc)
+        vocabulary = interner.terms
+        if metadatas is not None and len(metadatas) != len(doc_lengths):
+            raise ValueError(f"Got metadata for {len(metadatas)} rows, index has {len(doc_lengths)}")
 
-        tokenized = [self._tokenize(doc.get("text", "")) for doc in documents]
-        df_counter: Counter[str] = Counter()
-        for tokens in tokenized:
-            df_counter.update(set(tokens))
+        posting_offsets = array("q", [0])
+        posting_docs = array("i")
+        posting_tfs = array("i")
+        for term_id in range(len(vocabulary)):
+            if term_id < old_terms:
+                docs, tfs = self.postings(term_id)
+                for doc_idx, tf in zip(docs, tfs):
+                    new_idx = remap[doc_idx]
+                    if new_idx >= 0:
+                        posting_docs.append(new_idx)
+                        posting_tfs.append(tf)
+            if term_id in added:
+                docs, tfs = added[term_id]
+                posting_docs.extend(docs)
+                posting_tfs.extend(tfs)
+            posting_offsets.append(len(posting_docs))
 
-        vocab_items = sorted(df_counter.items(), key=lambda kv: kv[0])
-        self.vocabulary = {term: idx for idx, (term, _) in enumerate(vocab_items)}
-        n_docs = len(documents) or 1
-        self.idf = [math.log((n_docs + 1) / (df + 1)) + 1.0 for _, df in vocab_items]
+        n_docs = len(doc_lengths) or 1
+        idf = array(
+            "d",
+            (
+                math.log((n_docs + 1) / (posting_offsets[t + 1] - posting_offsets[t] + 1)) + 1.0
+                for t in range(len(vocabulary))
+            ),
+        )
+        sq_norms = array("d", [0.0]) * len(doc_lengths)
+        for term_id in range(len(vocabulary)):
+            term_idf = idf[term_id]
+            for pos in range(posting_offsets[term_id], posting_offsets[term_id + 1]):
+                doc_idx = posting_docs[pos]
+                weight = posting_tfs[pos] / doc_lengths[doc_idx] * term_idf
+                sq_norms[doc_idx] += weight * weight
 
-        self.vectors = []
-        for tokens in tokenized:
-            vec = self._tfidf_vector(tokens)
-            self.vectors.append(vec)
+        self._set_index(
+            vocabulary=vocabulary,
+            idf=idf,
+            posting_offsets=posting_offsets,
+            posting_docs=posting_docs,
+            posting_tfs=posting_tfs,
+            doc_lengths=doc_lengths,
+            doc_norms=array("d", (math.sqrt(v) for v in sq_norms)),
+            doc_term_offsets=doc_term_offsets,
+            doc_term_ids=doc_term_ids,
+            doc_term_tfs=doc_term_tfs,
+            metadatas=rows if metadatas is None else metadatas,
+        )
+        self._index_file = None
 
     def search(self, query: str, k: int = 3) -> List[Dict[str, str]]:
-        if not self.vectors or not self.metadatas:
+        if not self.num_docs or not self.metadatas:
             return []
-        q_vec = self._tfidf_vector(self._tokenize(query))
-        scores: List[tuple[float, Dict[str, str]]] = []
-        for vec, meta in zip(self.vectors, self.metadatas):
-            score = self._cosine(q_vec, vec)
-            scores.append((score, meta))
-        scores.sort(key=lambda item: item[0], reverse=True)
-        return [meta for score, meta in scores[:k] if score > 0]
+        ann = self._ann_index()
+        if ann is not None:
+            scores = self._score_candidates(query, ann)
+        else:
+            scores = self._score(query)
+        return [self.metadatas[doc_idx] for doc_idx in self._top_k(scores, k)]
+
+    def search_many(self, queries: List[str], k: int = 3) -> List[List[Dict[str, str]]]:
+        """Batch search: one scoring pass for all queries when the matrix backend is available."""
+        if not self.num_docs or not self.metadatas:
+            return [[] for _ in queries]
+        matrix = self._matrix_scorer()
+        if matrix is None or not queries or self._ann_index() is not None:
+            return [self.search(query, k=k) for query in queries]
+        scores = matrix.score_batch([self.query_weights(query) for query in queries])
+        return [[self.metadatas[doc_idx] for doc_idx, _ in row] for row in matrix.top_k(scores, k)]
+
+    def _matrix_scorer(self) -> Optional[MatrixScorer]:
+        if self.backend == "python" or (self.backend == "auto" and not self._auto_matrix()):
+            return None
+        if self._matrix is None:
+            self._matrix = MatrixScorer(self)
+        return self._matrix
+
+    def _auto_matrix(self) -> bool:
+        """The auto backend needs NumPy, plus SciPy unless the dense (terms x docs) block stays under the cap."""
+        if not numpy_available():
+            return False
+        num_terms = len(self.posting_offsets) - 1
+        return scipy_available() or dense_nbytes(num_terms, self.num_docs) <= DENSE_MAX_BYTES
+
+    def _ann_index(self) -> Optional[LshIndex]:
+        if self.ann_tables <= 0 or self.num_docs < max(self.ann_min_docs, 1):
+            return None
+        if self._ann is None:
+            ann = LshIndex(
+                tables=self.ann_tables, bits=self.ann_bits, max_candidates=self.ann_candidates, probes=self.ann_probes
+            )
+            ann.build(self)
+            self._ann = ann
+        return self._ann
+
+    def warm(self) -> None:
+        """Build the lazily created scoring structures (matrix backend, LSH tables) now."""
+        if self.num_docs:
+            self._matrix_scorer()
+            self._ann_index()
+
+    def memory_stats(self) -> Dict[str, Any]:
+        """
+        Bytes held by the index arrays and chunk store: `mapped_bytes` are views on the mmap'd index
+        file (shared by forked workers), `heap_bytes` are private in-memory copies, `matrix_bytes`
+        the matrix backend's weights (built per process unless warmed before the fork).
+        """
+        chunks = self.metadatas
+        buffers: List[Any] = [
+            self.idf,
+            self.posting_offsets,
+            self.posting_docs,
+            self.posting_tfs,
+            self.doc_lengths,
+            self.doc_norms,
+            self.doc_term_offsets,
+            self.doc_term_ids,
+            self.doc_term_tfs,
+        ]
+        if isinstance(chunks, ChunkStore):
+            buffers.extend(buffer for _, buffer in chunks.sections().values())
+        mapped = heap = 0
+        for buffer in buffers:
+            if isinstance(buffer, memoryview):
+                mapped += buffer.nbytes
+            elif isinstance(buffer, (array, bytes, bytearray)):
+                heap += len(buffer) * getattr(buffer, "itemsize", 1)
+        matrix = self._matrix.nbytes() if self._matrix is not None else 0
+        return {
+            "mapped": self._index_file is not None,
+            "index_file_bytes": self._index_file.size if self._index_file is not None else 0,
+            "mapped_bytes": mapped,
+            "heap_bytes": heap,
+            "matrix_bytes": matrix,
+        }
+
+    def ann_stats(self) -> Dict[str, Any]:
+        """LSH knobs plus build/lookup counters; `enabled` is False while exact search is in use."""
+        ann = self._ann_index()
+        if ann is None:
+            return {"enabled": False, "tables": self.ann_tables, "min_docs": self.ann_min_docs, "docs": self.num_docs}
+        return {"enabled": True, **ann.stats()}
+
+    def evaluate_ann(self, queries: Sequence[str], k: int = 3) -> Dict[str, Any]:
+        """
+        Measure the ANN trade-off on sample queries: mean recall@k against exact search
+        and mean latency of both paths (builds the LSH index even below `ann_min_docs`).
+        """
+        if not queries or not self.num_docs:
+            return {"queries": 0}
+        if self._ann is None:
+            self._ann = LshIndex(
+                tables=max(self.ann_tables, 1),
+                bits=self.ann_bits,
+                max_candidates=self.ann_candidates,
+                probes=self.ann_probes,
+            )
+            self._ann.build(self)
+        ann = self._ann
+        recall = exact_s = approx_s = 0.0
+        for query in queries:
+            started = time.perf_counter()
+            exact = self._top_k(self._score(query), k)
+            exact_s += time.perf_counter() - started
+            started = time.perf_counter()
+            approx = self._top_k(self._score_candidates(query, ann), k)
+            approx_s += time.perf_counter() - started
+            recall += len(set(exact) & set(approx)) / len(exact) if exact else 1.0
+        return {
+            "queries": len(queries),
+            "k": k,
+            f"recall@{k}": round(recall / len(queries), 4),
+            "exact_ms": round(1000 * exact_s / len(queries), 3),
+            "ann_ms": round(1000 * approx_s / len(queries), 3),
+            **ann.stats(),
+        }
+
+    @staticmethod
+    def _top_k(scores: Dict[int, float], k: int) -> List[int]:
+        top = heapq.nlargest(k, scores.items(), key=lambda item: (item[1], -item[0]))
+        return [doc_idx for doc_idx, score in top if score > 0]
+
+    def postings(self, term_id: int) -> Tuple[Sequence[int], Sequence[int]]:
+        """Return (doc ids, term frequencies) for one term."""
+        start, end = self.posting_offsets[term_id], self.posting_offsets[term_id + 1]
+        return self.posting_docs[start:end], self.posting_tfs[start:end]
+
+    def doc_terms(self, doc_idx: int) -> Sequence[int]:
+        """Sorted unique term ids of one chunk."""
+        return self.doc_term_ids[self.doc_term_offsets[doc_idx] : self.doc_term_offsets[doc_idx + 1]]
+
+    def doc_term_freq(self, doc_idx: int, term_id: int) -> int:
+        """Frequency of one term in one chunk (binary search over the chunk's term-id array)."""
+        start, end = self.doc_term_offsets[doc_idx], self.doc_term_offsets[doc_idx + 1]
+        pos = bisect_left(self.doc_term_ids, term_id, start, end)
+        if pos < end and self.doc_term_ids[pos] == term_id:
+            return self.doc_term_tfs[pos]
+        return 0
 
     def save(self) -> None:
         if not self.cache_path:
             return
+        if self.cache_path.suffix == ".json":
+            self.export_json(self.cache_path)
+            return
+        sections = {
+            "meta": ("B", json.dumps(self._source_meta()).encode("utf-8")),
+            "manifest": ("B", json.dumps(self.manifest).encode("utf-8")),
+            **vocabulary_sections(self.vocabulary),
+            "idf": ("d", self.idf),
+            "posting_offsets": ("q", self.posting_offsets),
+            "posting_docs": ("i", self.posting_docs),
+            "posting_tfs": ("i", self.posting_tfs),
+            "doc_lengths": ("i", self.doc_lengths),
+            "doc_norms": ("d", self.doc_norms),
+            "doc_term_offsets": ("q", self.doc_term_offsets),
+            "doc_term_ids": ("i", self.doc_term_ids),
+            "doc_term_tfs": ("i", self.doc_term_tfs),
+        }
+        if isinstance(self.metadatas, ChunkStore):
+            sections.update(self.metadatas.sections())
+        else:
+            sections.update(record_sections("metadatas", self.metadatas))
+        write_index(self.cache_path, sections)
+
+    def load(self, expected_pdf: Optional[str], expected_mtime: Optional[float]) -> bool:
+        """Load the cache only if it was built from `expected_pdf` at `expected_mtime`."""
+        return self._read_cache(
+            lambda meta: meta.get("source_pdf") == expected_pdf and meta.get("source_mtime") == expected_mtime
+        )
+
+    def open_cache(self) -> bool:
+        """Load whatever index is cached, skipping the staleness check (callers diff `manifest`)."""
+        return self._read_cache(lambda meta: True)
+
+    def export_json(self, path: Path) -> None:
+        """Write the whole index as one JSON document (portable import/export format)."""
         payload = {
-            "source_pdf": self.source_pdf,
-            "source_mtime": self.source_mtime,
-            "vocabulary": self.vocabulary,
-            "idf": self.idf,
-            "vectors": self.vectors,
-            "metadatas": self.metadatas,
+            "format_version": CACHE_FORMAT_VERSION,
+            **self._source_meta(),
+            "manifest": self.manifest,
+            "vocabulary": dict(self.vocabulary),
+            "idf": list(self.idf),
+            "posting_offsets": list(self.posting_offsets),
+            "posting_docs": list(self.posting_docs),
+            "posting_tfs": list(self.posting_tfs),
+            "doc_lengths": list(self.doc_lengths),
+            "doc_norms": list(self.doc_norms),
+            "doc_term_offsets": list(self.doc_term_offsets),
+            "doc_term_ids": list(self.doc_term_ids),
+            "doc_term_tfs": list(self.doc_term_tfs),
         }
-        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(self.cache_path, "w", encoding="utf-8") as fh:
+        if isinstance(self.metadatas, ChunkStore):
+            payload["chunks"] = self.metadatas.to_json()
+        else:
+            payload["metadatas"] = list(self.metadatas)
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as fh:
             json.dump(payload, fh)
 
-    def load(self, expected_pdf: Optional[str], expected_mtime: Optional[float]) -> bool:
+    def import_json(self, path: Path) -> bool:
+        """Load a JSON export regardless of its source PDF (no staleness check)."""
+        return self._load_json(Path(path), lambda meta: True)
+
+    def _read_cache(self, accept: Callable[[Dict[str, Any]], bool]) -> bool:
         if not self.cache_path or not self.cache_path.exists():
             return False
+        if self.cache_path.suffix == ".json":
+            return self._load_json(self.cache_path, accept)
+        return self._load_binary(self.cache_path, accept)
+
+    def _load_binary(self, path: Path, accept: Callable[[Dict[str, Any]], bool]) -> bool:
         try:
-            with open(self.cache_path, "r", encoding="utf-8") as fh:
+            index = IndexFile(path)
+            meta = index.json("meta")
+            if not accept(meta):
+                return False
+            vocabulary = MmapVocabulary(index.blob("terms"), index.array("term_offsets", "q"), index.array("term_ids", "i"))
+            self._set_index(
+                vocabulary=vocabulary,
+                idf=index.array("idf", "d"),
+                posting_offsets=index.array("posting_offsets", "q"),
+                posting_docs=index.array("posting_docs", "i"),
+                posting_tfs=index.array("posting_tfs", "i"),
+                doc_lengths=index.array("doc_lengths", "i"),
+                doc_norms=index.array("doc_norms", "d"),
+                doc_term_offsets=index.array("doc_term_offsets", "q"),
+                doc_term_ids=index.array("doc_term_ids", "i"),
+                doc_term_tfs=index.array("doc_term_tfs", "i"),
+                metadatas=self._binary_metadatas(index),
+            )
+            self.manifest = index.json("manifest")
+        except (OSError, ValueError):
+            return False
+        self._index_file = index
+        self.source_pdf = meta.get("source_pdf")
+        self.source_mtime = meta.get("source_mtime")
+        return True
+
+    @staticmethod
+    def _binary_metadatas(index: IndexFile) -> Sequence[Dict[str, str]]:
+        chunks = ChunkStore.from_index(index)
+        if chunks is not None:
+            return chunks
+        return RecordSequence(index.blob("metadatas"), index.array("metadatas_offsets", "q"))
+
+    def _load_json(self, path: Path, accept: Callable[[Dict[str, Any]], bool]) -> bool:
+        try:
+            with open(path, "r", encoding="utf-8") as fh:
                 data = json.load(fh)
         except Exception:
             return False
-        if data.get("source_pdf") != expected_pdf or data.get("source_mtime") != expected_mtime:
+        if data.get("format_version") != CACHE_FORMAT_VERSION:
+            # Older dense-vector caches are rebuilt rather than converted.
+            return False
+        if not accept(data):
             return False
         try:
-            self.vocabulary = {str(k): int(v) for k, v in data.get("vocabulary", {}).items()}
-            self.idf = [float(x) for x in data.get("idf", [])]
-            self.vectors = [[float(v) for v in row] for row in data.get("vectors", [])]
-            self.metadatas = data.get("metadatas", [])
+            self._set_index(
+                vocabulary={str(k): int(v) for k, v in data.get("vocabulary", {}).items()},
+                idf=array("d", data.get("idf", [])),
+                posting_offsets=array("q", data.get("posting_offsets", [0])),
+                posting_docs=array("i", data.get("posting_docs", [])),
+                posting_tfs=array("i", data.get("posting_tfs", [])),
+                doc_lengths=array("i", data.get("doc_lengths", [])),
+                doc_norms=array("d", data.get("doc_norms", [])),
+                doc_term_offsets=array("q", data.get("doc_term_offsets", [0])),
+                doc_term_ids=array("i", data.get("doc_term_ids", [])),
+                doc_term_tfs=array("i", data.get("doc_term_tfs", [])),
+                metadatas=ChunkStore.from_json(data["chunks"]) if "chunks" in data else data.get("metadatas", []),
+            )
         except Exception:
             return False
+        self._index_file = None
+        self.manifest = data.get("manifest") or {}
         self.source_pdf = data.get("source_pdf")
         self.source_mtime = data.get("source_mtime")
         return True
 
-    def _tokenize(self, text: str) -> List[str]:
-        return re.findall(r"\w+", text.lower())
-
-    def _tfidf_vector(self, tokens: List[str]) -> List[float]:
-        counts = Counter(tokens)
-        total = float(len(tokens) or 1)
-        vec = [0.0] * len(self.vocabulary)
-        for term, idx in self.vocabulary.items():
-            tf = counts.get(term, 0) / total
-            vec[idx] = tf * self.idf[idx] if idx < len(self.idf) else 0.0
-        norm = math.sqrt(sum(v * v for v in vec))
-        if norm > 0:
-            vec = [v / norm for v in vec]
-        return vec
+    def _set_index(
+        self,
+        vocabulary: Mapping[str, int],
+        idf: Sequence[float],
+        posting_offsets: Sequence[int],
+        posting_docs: Sequence[int],
+        posting_tfs: Sequence[int],
+        doc_lengths: Sequence[int],
+        doc_norms: Sequence[float],
+        doc_term_offsets: Sequence[int],
+        doc_term_ids: Sequence[int],
+        doc_term_tfs: Sequence[int],
+        metadatas: Sequence[Dict[str, str]],
+    ) -> None:
+        self.vocabulary = vocabulary
+        self.idf = idf
+        self.posting_offsets = posting_offsets
+        self.posting_docs = posting_docs
+        self.posting_tfs = posting_tfs
+        self.doc_lengths = doc_lengths
+        self.doc_norms = doc_norms
+        self.doc_term_offsets = doc_term_offsets
+        self.doc_term_ids = doc_term_ids
+        self.doc_term_tfs = doc_term_tfs
+        self.metadatas = metadatas
+        self._avg_doc_length = None
+        self._matrix = None
+        self._ann = None
+        self.version = next(_INDEX_VERSIONS)
 
-    @staticmethod
-    def _cosine(a: List[float], b: List[float]) -> float:
-        if not a or not b:
-            return 0.0
-        return sum(x * y for x, y in zip(a, b))
+    def _source_meta(self) -> Dict[str, Any]:
+        return {"source_pdf": self.source_pdf, "source_mtime": self.source_mtime}
+
+    def query_weights(self, query: str, scoring: Optional[str] = None) -> Dict[int, float]:
+        """
+        Sparse query vector (term id -> weight) for the active (or given) scoring mode.
+        Document scores are the dot product of this vector with the posting weights.
+        """
+        scoring = scoring or self.scoring
+        query_counts = Counter(encode(query, self.vocabulary))
+        if scoring == "keyword":
+            return {term_id: 1.0 for term_id in query_counts}
+        if scoring == "bm25":
+            return {term_id: float(qtf) for term_id, qtf in query_counts.items()}
+        # Cosine between L2-normalised TF-IDF vectors; the query's TF denominator cancels out.
+        weights = {term_id: qtf * self.idf[term_id] for term_id, qtf in query_counts.items()}
+        norm = math.sqrt(sum(w * w for w in weights.values()))
+        if norm == 0:
+            return {}
+        return {term_id: w / norm for term_id, w in weights.items()}
+
+    def bm25_idf(self, term_id: int) -> float:
+        df = self.posting_offsets[term_id + 1] - self.posting_offsets[term_id]
+        return math.log(1.0 + (self.num_docs - df + 0.5) / (df + 0.5))
+
+    def _score(self, query: str) -> Dict[int, float]:
+        """Accumulate per-document scores from the postings of the query terms only."""
+        q_weights = self.query_weights(query)
+        if not q_weights:
+            return {}
+        if self.scoring == "bm25":
+            return self._score_bm25(q_weights)
+        if self.scoring == "keyword":
+            return self._score_keyword(q_weights)
+        return self._score_tfidf(q_weights)
+
+    def _score_tfidf(self, q_weights: Dict[int, float]) -> Dict[int, float]:
+        scores: Dict[int, float] = {}
+        for term_id, q_weight in q_weights.items():
+            # Document weight is tf * idf / (len * norm); the idf factor is shared by the whole posting list.
+            scale = q_weight * self.idf[term_id]
+            docs, tfs = self.postings(term_id)
+            for doc_idx, tf in zip(docs, tfs):
+                denom = self.doc_lengths[doc_idx] * self.doc_norms[doc_idx]
+                if denom:
+                    scores[doc_idx] = scores.get(doc_idx, 0.0) + scale * tf / denom
+        return scores
+
+    def _score_bm25(self, q_weights: Dict[int, float]) -> Dict[int, float]:
+        avg_len = self.avg_doc_length
+        k1, b = self.bm25_k1, self.bm25_b
+        scores: Dict[int, float] = {}
+        for term_id, q_weight in q_weights.items():
+            scale = q_weight * self.bm25_idf(term_id)
+            docs, tfs = self.postings(term_id)
+            for doc_idx, tf in zip(docs, tfs):
+                length_norm = 1.0 - b + b * (self.doc_lengths[doc_idx] / avg_len) if avg_len else 1.0
+                scores[doc_idx] = scores.get(doc_idx, 0.0) + scale * tf * (k1 + 1.0) / (tf + k1 * length_norm)
+        return scores
+
+    def _score_keyword(self, q_weights: Dict[int, float]) -> Dict[int, float]:
+        # Number of distinct query terms each chunk contains.
+        scores: Dict[int, float] = {}
+        for term_id in q_weights:
+            docs, _ = self.postings(term_id)
+            for doc_idx in docs:
+                scores[doc_idx] = scores.get(doc_idx, 0.0) + 1.0
+        return scores
+
+    def _score_candidates(self, query: str, ann: LshIndex) -> Dict[int, float]:
+        """Exact scores for the LSH candidates only (hashed on the TF-IDF query vector)."""
+        q_weights = self.query_weights(query)
+        if not q_weights:
+            return {}
+        candidates = ann.candidates(self.query_weights(query, scoring="tfidf"))
+        avg_len = self.avg_doc_length
+        k1, b = self.bm25_k1, self.bm25_b
+        scores: Dict[int, float] = {}
+        for doc_idx in candidates:
+            length = self.doc_lengths[doc_idx]
+            denom = length * self.doc_norms[doc_idx]
+            score = 0.0
+            for term_id, q_weight in q_weights.items():
+                tf = self.doc_term_freq(doc_idx, term_id)
+                if not tf:
+                    continue
+                if self.scoring == "keyword":
+                    score += 1.0
+                elif self.scoring == "bm25":
+                    length_norm = 1.0 - b + b * (length / avg_len) if avg_len else 1.0
+                    score += q_weight * self.bm25_idf(term_id) * tf * (k1 + 1.0) / (tf + k1 * length_norm)
+                elif denom:
+                    score += q_weight * self.idf[term_id] * tf / denom
+            if score:
+                scores[doc_idx] = score
+        return scores
@@ -1,41 +1,456 @@
+import asyncio
+import functools
 import json
-from typing import Optional, Dict, List
+import logging
+import time
+from typing import Any, Callable, Dict, Iterator, NamedTuple, Optional, Tuple, TypeVar, Union
 
 from django.conf import settings
-from django.http import HttpRequest, JsonResponse
+from django.http import HttpRequest, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.http.response import HttpResponseBase
 from django.views.decorators.csrf import csrf_exempt
 
-from .agent import Agent
-from .databricks_client import build_default_client
-from .rag import build_default_rag
-from .search import build_default_search_client
+from .admission import Overloaded, shared_admission
+from .agent import Agent, AsyncAgent
+from .context import build_default_packer
+from .deadline import Deadline, DeadlineExceeded, deadline_scope
+from .llm_cache import CACHE_MODES, build_default_async_llm_cache, build_default_llm_cache, shared_llm_cache
+from .llm_router import build_default_async_router, build_default_router
+from .metrics import RequestTimings, collect_timings, current_timings, observe_request, shared_metrics
+from .rag import RagPipeline, build_default_rag
+from .responses import encode_json, json_response, resolve_fields, shape_result
+from .search import build_default_async_search_client, build_default_search_client
+from .sessions import SessionConflict, SessionStore, build_default_session_store
 from .tools import build_builtin_tools
+from .warmup import readiness
+
+logger = logging.getLogger(__name__)
+_Response = TypeVar("_Response", bound=HttpResponseBase)
+_View = TypeVar("_View", bound=Callable[..., Any])
 
 AGENT_INSTANCE: Optional[Agent] = None
-SESSION_MEMORY: Dict[str, List[Dict[str, str]]] = {}
-SESSION_MEMORY_MAX = 20  # total messages retained per session
+ASYNC_AGENT_INSTANCE: Optional[AsyncAgent] = None
+RAG_INSTANCE: Optional[RagPipeline] = None
+SESSION_STORE: Optional[SessionStore] = None
+SESSION_ID_MAX = 200
+# Session of requests that name none; shared, so its turns skip the conflict check (see _remember).
+DEFAULT_SESSION_ID = "default"
+
+
+def get_rag() -> RagPipeline:
+    """The process-wide RAG pipeline, shared by the sync and async agents."""
+    global RAG_INSTANCE
+    if RAG_INSTANCE is None:
+        RAG_INSTANCE = build_default_rag()
+    return RAG_INSTANCE
+
+
+def get_session_store() -> SessionStore:
+    global SESSION_STORE
+    if SESSION_STORE is None:
+        SESSION_STORE = build_default_session_store()
+    return SESSION_STORE
 
 
 def get_agent() -> Agent:
     global AGENT_INSTANCE
     if AGENT_INSTANCE is None:
-        rag = build_default_rag()
+        rag = get_rag()
         search_client = build_default_search_client()
         tools = build_builtin_tools(search_client)
-        llm = build_default_client()
-        AGENT_INSTANCE = Agent(llm=llm, rag=rag, tools=tools)
+        llm = build_default_llm_cache(build_default_router())
+        AGENT_INSTANCE = Agent(
+            llm=llm,
+            rag=rag,
+            tools=tools,
+            tool_concurrency=settings.AGENT_TOOL_CONCURRENCY,
+            tool_timeout=settings.AGENT_TOOL_TIMEOUT,
+            packer=build_default_packer(),
+            speculative_search=settings.AGENT_SPECULATIVE_SEARCH,
+            speculation_similarity=settings.AGENT_SPECULATION_SIMILARITY,
+            tool_workers=settings.AGENT_TOOL_WORKERS,
+        )
     return AGENT_INSTANCE
 
 
+def get_async_agent() -> AsyncAgent:
+    global ASYNC_AGENT_INSTANCE
+    if ASYNC_AGENT_INSTANCE is None:
+        rag = get_rag()
+        tools = build_builtin_tools(build_default_search_client(), build_default_async_search_client())
+        llm = build_default_async_llm_cache(build_default_async_router())
+        ASYNC_AGENT_INSTANCE = AsyncAgent(
+            llm=llm,
+            rag=rag,
+            tools=tools,
+            tool_concurrency=settings.AGENT_TOOL_CONCURRENCY,
+            tool_timeout=settings.AGENT_TOOL_TIMEOUT,
+            packer=build_default_packer(),
+            speculative_search=settings.AGENT_SPECULATIVE_SEARCH,
+            speculation_similarity=settings.AGENT_SPECULATION_SIMILARITY,
+        )
+    return ASYNC_AGENT_INSTANCE
+
+
+def _instrumented(endpoint: str) -> Callable[[_View], _View]:
+    """
+    Count the view's requests (`agent_requests_total`, `agent_request_seconds`) and make a RequestTimings
+    current while it runs, so spans of the agent run add up per request. A streaming response is counted
+    once its body has been sent; its generator collects its own timings.
+    """
+
+    def observe(response: HttpResponseBase, started: float) -> HttpResponseBase:
+        if isinstance(response, StreamingHttpResponse):
+            response.streaming_content = _counted(response.streaming_content, endpoint, response.status_code, started)
+        else:
+            observe_request(endpoint, response.status_code, time.perf_counter() - started)
+        return response
+
+    def decorate(view: _View) -> _View:
+        if asyncio.iscoroutinefunction(view):
+
+            @functools.wraps(view)
+            async def async_wrapper(request: HttpRequest, *args: Any, **kwargs: Any) -> HttpResponseBase:
+                started = time.perf_counter()
+                with collect_timings():
+                    response = await view(request, *args, **kwargs)
+                return observe(response, started)
+
+            return async_wrapper  # type: ignore[return-value]
+
+        @functools.wraps(view)
+        def wrapper(request: HttpRequest, *args: Any, **kwargs: Any) -> HttpResponseBase:
+            started = time.perf_counter()
+            with collect_timings():
+                response = view(request, *args, **kwargs)
+            return observe(response, started)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorate
+
+
+def _counted(content: Iterator[bytes], endpoint: str, status: int, started: float) -> Iterator[bytes]:
+    try:
+        yield from content
+    finally:
+        observe_request(endpoint, status, time.perf_counter() - started)
+
+
+def _request_timings() -> Dict[str, Any]:
+    timings = current_timings()
+    return timings.as_dict() if timings is not None else {}
+
+
 @csrf_exempt
-def agent_query(request: HttpRequest) -> JsonResponse:
+@_instrumented("query")
+def agent_query(request: HttpRequest) -> HttpResponse:
+    """
+    Answer one question (GET params or JSON body). Runs are admitted by the process-wide admission controller
+    (429 with Retry-After when shed) and abandoned at the request deadline (504). A turn that raced another
+    turn on the same session is not stored and gets 409 with the session's current `session_seq` and the
+    computed answer under `result`, so the client can keep it or resend the question.
+    """
     if request.method == "OPTIONS":
         resp = JsonResponse({"ok": True}, status=200)
         return _with_cors(resp)
+    received = time.perf_counter()
+    parsed = _parse_query_request(request)
+    if isinstance(parsed, JsonResponse):
+        return _with_cors(parsed)
+    query, allow_search, session_id = parsed.query, parsed.allow_search, parsed.session_id
+
+    try:
+        agent = get_agent()
+    except Exception as exc:
+        return _with_cors(JsonResponse({"error": f"Agent init failed: {exc}"}, status=500))
+
+    try:
+        with deadline_scope(_deadline(parsed, received)), shared_admission().slot():
+            session = get_session_store().get(session_id)
+            result = agent.run(
+                query=query,
+                allow_search=allow_search,
+                conversation_history=session.messages,
+                cache_mode=parsed.cache_mode,
+                speculative_search=parsed.speculative_search,
+            )
+        try:
+            result["session_seq"] = _remember(session_id, session.seq, query, result.get("answer", ""))
+        except SessionConflict as exc:
+            return _with_cors(_session_conflict(exc, shape_result(result, parsed.fields)))
+        result["session_id"] = session_id
+    except Overloaded as exc:
+        return _with_cors(_overloaded(exc))
+    except DeadlineExceeded as exc:
+        return _with_cors(_deadline_exceeded(exc, "query"))
+    except Exception as exc:
+        return _with_cors(JsonResponse({"error": f"Agent run failed: {exc.__class__.__name__}: {exc}"}, status=500))
+    if parsed.timings:
+        result["timings"] = _request_timings()
+    return _with_cors(json_response(request, shape_result(result, parsed.fields), "query"))
+
+
+@csrf_exempt
+@_instrumented("stream")
+def agent_query_stream(request: HttpRequest) -> HttpResponseBase:
+    """
+    Server-sent events variant of agent_query (same GET/POST parameters).
+    Events: `token` (answer text deltas), `tool_call`, then `done` with the full result
+    (answer, trace, sources, timings incl. server-side time to first token), or `error`.
+    With `timings`, the `done` timings also carry the per-stage totals.
+    A shed request gets a plain 429 before the stream starts; the admission slot is held until the stream
+    ends, and a deadline passing mid-stream ends it with an `error` event. A session conflict (see
+    agent_query) ends it with an `error` event carrying `"status": 409` and the `done` payload under `result`.
+    """
+    if request.method == "OPTIONS":
+        return _with_cors(JsonResponse({"ok": True}, status=200))
+    parsed = _parse_query_request(request)
+    if isinstance(parsed, JsonResponse):
+        return _with_cors(parsed)
+    query, allow_search, session_id = parsed.query, parsed.allow_search, parsed.session_id
+    received = time.perf_counter()
+    deadline = _deadline(parsed, received)
+
+    try:
+        agent = get_agent()
+    except Exception as exc:
+        return _with_cors(JsonResponse({"error": f"Agent init failed: {exc}"}, status=500))
+    try:
+        with deadline_scope(deadline):
+            ticket = shared_admission().acquire()
+    except Overloaded as exc:
+        return _with_cors(_overloaded(exc))
+
+    def events() -> Iterator[bytes]:
+        with deadline_scope(deadline), collect_timings() as timings:
+            yield from run_events(timings)
+
+    def run_events(timings: RequestTimings) -> Iterator[bytes]:
+        first_token: Optional[float] = None
+        try:
+            session = get_session_store().get(session_id)
+            agent_events = agent.run_stream(
+                query=query,
+                allow_search=allow_search,
+                conversation_history=session.messages,
+                cache_mode=parsed.cache_mode,
+                speculative_search=parsed.speculative_search,
+            )
+            for event in agent_events:
+                data = event["data"]
+                if event["event"] == "token" and first_token is None:
+                    first_token = time.perf_counter() - received
+                if event["event"] == "done":
+                    try:
+                        data["session_seq"] = _remember(session_id, session.seq, query, data.get("answer", ""))
+                    except SessionConflict as exc:
+                        conflict = _session_conflict_body(exc, shape_result(data, parsed.fields))
+                        yield _sse("error", {**conflict, "status": 409})
+                        return
+                    data["session_id"] = session_id
+                    if first_token is not None:
+                        data.setdefault("timings", {})["server_ttft_ms"] = round(1000 * first_token, 1)
+                        logger.info("stream ttft %.1fms for session %s", 1000 * first_token, session_id)
+                    if parsed.timings:
+                        data["timings"] = {**timings.as_dict(), **data.get("timings", {})}
+                    data = shape_result(data, parsed.fields)
+                yield _sse(event["event"], data)
+        except DeadlineExceeded as exc:
+            shared_metrics().inc("agent_deadline_exceeded_total", endpoint="stream", stage=exc.stage)
+            yield _sse("error", {"error": str(exc), "stage": exc.stage})
+        except Exception as exc:
+            yield _sse("error", {"error": f"Agent run failed: {exc.__class__.__name__}: {exc}"})
+
+    response = StreamingHttpResponse(_Releasing(events(), ticket.release), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # stop nginx from buffering the stream
+    return _with_cors(response)
+
+
+@csrf_exempt
+@_instrumented("batch")
+def agent_batch(request: HttpRequest) -> HttpResponseBase:
+    """
+    POST {"queries": [...], "allow_search", "cache", "concurrency", "verbosity", "fields", "timeout"}: answer up to
+    AGENT_BATCH_MAX_QUERIES independent questions (no session memory). Streams NDJSON in completion order:
+    one line per input, {"index", "query", "result"} or {"index", "query", "error"}, then a {"summary": ...} line.
+    Each item's run holds a slot of the shared admission controller, like a single query; a shed item gets an
+    `Overloaded` error line. Each item also gets its own deadline (`timeout`, else AGENT_REQUEST_TIMEOUT) from the
+    moment it is admitted, so a batch may run far longer than one query; an item that overruns it gets a
+    `DeadlineExceeded` error line.
+    """
+    if request.method == "OPTIONS":
+        return _with_cors(JsonResponse({"ok": True}, status=200))
+    if request.method != "POST":
+        return _with_cors(JsonResponse({"error": "Only POST allowed"}, status=405))
+    try:
+        payload = json.loads(request.body.decode("utf-8"))
+    except json.JSONDecodeError:
+        return _with_cors(JsonResponse({"error": "Invalid JSON"}, status=400))
+    queries = payload.get("queries") if isinstance(payload, dict) else None
+    if not isinstance(queries, list) or not queries:
+        return _with_cors(JsonResponse({"error": "'queries' must be a non-empty list"}, status=400))
+    if len(queries) > settings.AGENT_BATCH_MAX_QUERIES:
+        return _with_cors(
+            JsonResponse({"error": f"At most {settings.AGENT_BATCH_MAX_QUERIES} queries per batch"}, status=400)
+        )
+    cache_mode = payload.get("cache") or None
+    if cache_mode is not None and cache_mode not in CACHE_MODES:
+        return _with_cors(JsonResponse({"error": f"'cache' must be one of: {', '.join(CACHE_MODES)}"}, status=400))
+    try:
+        concurrency = int(payload.get("concurrency") or settings.AGENT_BATCH_CONCURRENCY)
+    except (TypeError, ValueError):
+        return _with_cors(JsonResponse({"error": "'concurrency' must be an integer"}, status=400))
+    concurrency = max(1, min(concurrency, settings.AGENT_BATCH_CONCURRENCY))
+    fields, fields_error = resolve_fields(payload.get("verbosity"), payload.get("fields"))
+    if fields_error:
+        return _with_cors(JsonResponse({"error": fields_error}, status=400))
+    item_timeout = _request_timeout(payload.get("timeout"))
+    if isinstance(item_timeout, JsonResponse):
+        return _with_cors(item_timeout)
+
+    try:
+        agent = get_agent()
+    except Exception as exc:
+        return _with_cors(JsonResponse({"error": f"Agent init failed: {exc}"}, status=500))
+
+    def lines() -> Iterator[bytes]:
+        started = time.perf_counter()
+        answered = failed = 0
+        items = agent.run_batch(
+            queries,
+            allow_search=bool(payload.get("allow_search", True)),
+            concurrency=concurrency,
+            cache_mode=cache_mode,
+            admission=shared_admission(),
+            item_timeout=item_timeout,
+        )
+        for item in items:
+            if "error" in item:
+                failed += 1
+            else:
+                answered += 1
+                item["result"] = shape_result(item["result"], fields)
+            yield _ndjson(item)
+        summary = {
+            "queries": len(queries),
+            "distinct": len({" ".join(q.split()) for q in queries if isinstance(q, str) and q.strip()}),
+            "answered": answered,
+            "errors": failed,
+            "concurrency": concurrency,
+            "elapsed_ms": round(1000 * (time.perf_counter() - started), 1),
+        }
+        yield _ndjson({"summary": summary})
+
+    return _with_cors(StreamingHttpResponse(lines(), content_type="application/x-ndjson"))
+
+
+@_instrumented("async")
+async def agent_query_async(request: HttpRequest) -> HttpResponse:
+    """
+    Native async variant of agent_query (same parameters and response) for ASGI servers.
+    LLM and search calls are awaited on a pooled async HTTP client, so one worker can keep
+    many slow completions in flight. Under WSGI Django runs it on a per-request event loop.
+    Shares agent_query's admission limit; queued requests wait without blocking the event loop.
+    """
+    if request.method == "OPTIONS":
+        return _with_cors(JsonResponse({"ok": True}, status=200))
+    received = time.perf_counter()
+    parsed = _parse_query_request(request)
+    if isinstance(parsed, JsonResponse):
+        return _with_cors(parsed)
+    query, allow_search, session_id = parsed.query, parsed.allow_search, parsed.session_id
+
+    try:
+        # First call loads/builds the RAG index; keep that off the event loop.
+        agent = ASYNC_AGENT_INSTANCE or await asyncio.to_thread(get_async_agent)
+    except Exception as exc:
+        return _with_cors(JsonResponse({"error": f"Agent init failed: {exc}"}, status=500))
+
+    try:
+        with deadline_scope(_deadline(parsed, received)):
+            async with shared_admission().aslot():
+                session = await asyncio.to_thread(get_session_store().get, session_id)
+                result = await agent.run(
+                    query=query,
+                    allow_search=allow_search,
+                    conversation_history=session.messages,
+                    cache_mode=parsed.cache_mode,
+                    speculative_search=parsed.speculative_search,
+                )
+        try:
+            result["session_seq"] = await asyncio.to_thread(
+                _remember, session_id, session.seq, query, result.get("answer", "")
+            )
+        except SessionConflict as exc:
+            return _with_cors(_session_conflict(exc, shape_result(result, parsed.fields)))
+        result["session_id"] = session_id
+    except Overloaded as exc:
+        return _with_cors(_overloaded(exc))
+    except DeadlineExceeded as exc:
+        return _with_cors(_deadline_exceeded(exc, "async"))
+    except Exception as exc:
+        return _with_cors(JsonResponse({"error": f"Agent run failed: {exc.__class__.__name__}: {exc}"}, status=500))
+    if parsed.timings:
+        result["timings"] = _request_timings()
+    return _with_cors(json_response(request, shape_result(result, parsed.fields), "async"))
+
+
+# csrf_exempt would wrap the coroutine in a sync view on Django 4.2; set the flag directly instead.
+agent_query_async.csrf_exempt = True  # type: ignore[attr-defined]
+
+
+def agent_ready(request: HttpRequest) -> JsonResponse:
+    """
+    Readiness probe: 200 once warm-up finished (or when AGENT_WARMUP is off and the agent builds lazily),
+    503 while warming up or after a failed warm-up. Reports warm-up time, index size and process memory.
+    """
+    state = readiness()
+    ready = state["status"] == "ready" or (state["status"] == "cold" and not settings.AGENT_WARMUP)
+    return _with_cors(JsonResponse({"ready": ready, **state}, status=200 if ready else 503))
+
+
+def agent_metrics(request: HttpRequest) -> HttpResponse:
+    """
+    Prometheus text exposition of this process's metrics: request and per-stage latency histograms,
+    stage errors, LLM token counters and prompt sizes. Each worker process serves its own numbers.
+    The LLM cache's table size is counted here, per scrape, rather than on every request.
+    """
+    registry = shared_metrics()
+    if not registry.enabled:
+        return _with_cors(HttpResponse("metrics disabled\n", status=404, content_type="text/plain"))
+    if settings.LLM_CACHE_MODE != "off":
+        cache = shared_llm_cache().stats()
+        registry.set("agent_llm_cache_entries", cache["size"])
+        registry.set("agent_llm_cache_bytes", cache["bytes"])
+    return _with_cors(HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8"))
+
+
+class QueryParams(NamedTuple):
+    query: str
+    allow_search: bool
+    session_id: str
+    cache_mode: Optional[str]  # per-request LLM cache mode (None = server default)
+    speculative_search: Optional[bool]  # prefetch web_search during the first LLM pass (None = server default)
+    timings: bool  # add per-stage timings to the response
+    fields: Optional[Tuple[str, ...]]  # result fields to return (None = everything)
+    timeout: float  # request deadline in seconds from arrival (0 = none)
+
+
+def _parse_query_request(request: HttpRequest) -> Union[QueryParams, JsonResponse]:
+    """Extract the query parameters from GET params or a JSON body."""
     if request.method == "GET":
         query = request.GET.get("query")
         allow_search = request.GET.get("allow_search", "true").lower() != "false"
-        session_id = request.GET.get("session_id") or "default"
+        session_id = request.GET.get("session_id") or DEFAULT_SESSION_ID
+        cache_mode = request.GET.get("cache") or None
+        speculate_raw = request.GET.get("speculative_search")
+        speculative_search = None if speculate_raw is None else speculate_raw.lower() == "true"
+        timings_raw = request.GET.get("timings")
+        timings = settings.AGENT_RESPONSE_TIMINGS if timings_raw is None else timings_raw.lower() == "true"
+        verbosity, fields_raw = request.GET.get("verbosity"), request.GET.get("fields")
+        timeout_raw: Any = request.GET.get("timeout")
     elif request.method == "POST":
         try:
             payload = json.loads(request.body.decode("utf-8"))
@@ -43,34 +458,119 @@ def agent_query(request: HttpRequest) -> JsonResponse:
             return JsonResponse({"error": "Invalid JSON"}, status=400)
         query = payload.get("query")
         allow_search = bool(payload.get("allow_search", True))
-        session_id = payload.get("session_id") or "default"
+        session_id = str(payload.get("session_id") or DEFAULT_SESSION_ID)
+        cache_mode = payload.get("cache") or None
+        speculative_search = None if payload.get("speculative_search") is None else bool(payload["speculative_search"])
+        timings = bool(payload.get("timings", settings.AGENT_RESPONSE_TIMINGS))
+        verbosity, fields_raw = payload.get("verbosity"), payload.get("fields")
+        timeout_raw = payload.get("timeout")
     else:
-        return _with_cors(JsonResponse({"error": "Only GET or POST allowed"}, status=405))
+        return JsonResponse({"error": "Only GET or POST allowed"}, status=405)
 
     if not query:
-        return _with_cors(JsonResponse({"error": "Missing 'query'"}, status=400))
+        return JsonResponse({"error": "Missing 'query'"}, status=400)
+    if len(session_id) > SESSION_ID_MAX:
+        return JsonResponse({"error": f"'session_id' is longer than {SESSION_ID_MAX} characters"}, status=400)
+    if cache_mode is not None and cache_mode not in CACHE_MODES:
+        return JsonResponse({"error": f"'cache' must be one of: {', '.join(CACHE_MODES)}"}, status=400)
+    fields, fields_error = resolve_fields(verbosity, fields_raw)
+    if fields_error:
+        return JsonResponse({"error": fields_error}, status=400)
+    timeout = _request_timeout(timeout_raw)
+    if isinstance(timeout, JsonResponse):
+        return timeout
+    return QueryParams(query, allow_search, session_id, cache_mode, speculative_search, timings, fields, timeout)
 
-    try:
-        agent = get_agent()
-    except Exception as exc:
-        return _with_cors(JsonResponse({"error": f"Agent init failed: {exc}"}, status=500))
 
+def _request_timeout(timeout_raw: Any) -> Union[float, JsonResponse]:
+    """A deadline in seconds (0 = none): AGENT_REQUEST_TIMEOUT, or a shorter `timeout` the request asked for."""
+    timeout = settings.AGENT_REQUEST_TIMEOUT
+    if timeout_raw is None:
+        return timeout
     try:
-        history = SESSION_MEMORY.get(session_id, [])
-        result = agent.run(query=query, allow_search=allow_search, conversation_history=history)
-        updated_history = history + [
-            {"role": "user", "content": query},
-            {"role": "assistant", "content": result.get("answer", "")},
-        ]
-        SESSION_MEMORY[session_id] = updated_history[-SESSION_MEMORY_MAX :]
-        result["session_id"] = session_id
-    except Exception as exc:
-        return _with_cors(JsonResponse({"error": f"Agent run failed: {exc.__class__.__name__}: {exc}"}, status=500))
-    return _with_cors(JsonResponse(result, status=200, safe=False))
+        requested = float(timeout_raw)
+    except (TypeError, ValueError):
+        requested = 0.0
+    if not requested > 0:
+        return JsonResponse({"error": "'timeout' must be a positive number of seconds"}, status=400)
+    # Clients may shorten the server deadline, never extend it.
+    return min(requested, timeout) if timeout > 0 else requested
+
+
+def _deadline(parsed: QueryParams, received: float) -> Optional[Deadline]:
+    return Deadline(parsed.timeout, started=received) if parsed.timeout > 0 else None
+
+
+def _overloaded(exc: Overloaded) -> JsonResponse:
+    response = JsonResponse({"error": str(exc), "reason": exc.reason, "retry_after": exc.retry_after}, status=429)
+    response["Retry-After"] = str(exc.retry_after)
+    return response
+
+
+def _deadline_exceeded(exc: DeadlineExceeded, endpoint: str) -> JsonResponse:
+    shared_metrics().inc("agent_deadline_exceeded_total", endpoint=endpoint, stage=exc.stage)
+    return JsonResponse({"error": str(exc), "stage": exc.stage}, status=504)
+
+
+def _session_conflict_body(exc: SessionConflict, result: Dict[str, Any]) -> Dict[str, Any]:
+    """409 body: the session's current seq plus the answer this turn computed (not stored)."""
+    return {"error": str(exc), "session_id": exc.session_id, "session_seq": exc.seq, "result": result}
+
+
+def _session_conflict(exc: SessionConflict, result: Dict[str, Any]) -> JsonResponse:
+    return JsonResponse(_session_conflict_body(exc, result), status=409)
+
+
+class _Releasing:
+    """Streaming body that releases its admission slot once exhausted or closed, even if never iterated."""
+
+    def __init__(self, content: Iterator[bytes], release: Callable[[], None]) -> None:
+        self._content = content
+        self._release = release
+
+    def __iter__(self) -> "_Releasing":
+        return self
+
+    def __next__(self) -> bytes:
+        try:
+            return next(self._content)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        try:
+            close = getattr(self._content, "close", None)
+            if close is not None:
+                close()
+        finally:
+            self._release()
+
+
+def _remember(session_id: str, base_seq: int, query: str, answer: str) -> int:
+    """
+    Append the turn to the session and return its new sequence number; SessionConflict if another turn
+    landed since `base_seq`. The default session is shared by every request that names none, so its turns
+    are appended without that check (unrelated callers must not reject each other).
+    """
+    return get_session_store().append(
+        session_id,
+        [{"role": "user", "content": query}, {"role": "assistant", "content": answer}],
+        base_seq=None if session_id == DEFAULT_SESSION_ID else base_seq,
+    )
+
+
+def _sse(event: str, data: Any) -> bytes:
+    return b"event: " + event.encode("utf-8") + b"\ndata: " + encode_json(data)[0] + b"\n\n"
+
+
+def _ndjson(data: Any) -> bytes:
+    return encode_json(data)[0] + b"\n"
 
 
-def _with_cors(response: JsonResponse) -> JsonResponse:
+def _with_cors(response: _Response) -> _Response:
     response["Access-Control-Allow-Origin"] = "*"
     response["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
     response["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
+    response["Access-Control-Expose-Headers"] = "Retry-After"
     return response
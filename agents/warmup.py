@@ -0,0 +1,94 @@
+import gc
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_STATE_LOCK = threading.Lock()
+# cold (nothing built yet) -> warming -> ready | failed
+_STATE: Dict[str, Any] = {"status": "cold"}
+
+
+def warm_up(agents: bool = True, freeze: bool = False) -> Dict[str, Any]:
+    """
+    Build what the first request would otherwise pay for, ideally before the server forks workers:
+    - the RAG index (parsed or opened from the mmap'd cache) with its matrix/LSH structures,
+    - the session store and, with `agents`, the sync and async agents and their HTTP clients.
+    With `freeze`, everything allocated so far is moved out of the garbage collector's reach
+    (`gc.freeze`), so collections in forked workers do not write to, and un-share, those pages.
+    Returns the readiness state (also served by the readiness endpoint).
+    """
+    from . import views  # the views own the process-wide agent/RAG singletons
+
+    _update(status="warming", pid=os.getpid(), started_at=time.time())
+    started = time.perf_counter()
+    errors: Dict[str, str] = {}
+    built: List[str] = []
+    steps = [("rag", views.get_rag), ("sessions", views.get_session_store)]
+    if agents:
+        steps += [("agent", views.get_agent), ("async_agent", views.get_async_agent)]
+    for name, build in steps:
+        try:
+            built_object = build()
+            if name == "rag" and built_object.vector_store is not None:
+                built_object.vector_store.warm()
+            built.append(name)
+        except Exception as exc:
+            logger.exception("Warm-up step %s failed", name)
+            errors[name] = f"{exc.__class__.__name__}: {exc}"
+    gc.collect()
+    if freeze:
+        gc.freeze()
+    elapsed = time.perf_counter() - started
+    state = _update(
+        status="failed" if errors else "ready",
+        warmup_ms=round(1000 * elapsed, 1),
+        built=built,
+        errors=errors,
+        gc_frozen=gc.get_freeze_count(),
+        index=index_stats(views.RAG_INSTANCE),
+    )
+    logger.info("Agent warm-up %s in %.1fms (pid %s)", state["status"], 1000 * elapsed, os.getpid())
+    return state
+
+
+def readiness() -> Dict[str, Any]:
+    """Current warm-up state plus this process's resident memory and index size."""
+    from . import views
+
+    with _STATE_LOCK:
+        state = dict(_STATE)
+    if state["status"] == "cold" and views.RAG_INSTANCE is not None:
+        # Warm-up disabled: the index was built lazily by the first request.
+        state["index"] = index_stats(views.RAG_INSTANCE)
+    state["pid"] = os.getpid()
+    state["memory"] = process_memory()
+    return state
+
+
+def index_stats(rag: Any) -> Optional[Dict[str, Any]]:
+    if rag is None or rag.vector_store is None:
+        return None
+    return {"chunks": len(rag.chunks), "terms": len(rag.vector_store.vocabulary), **rag.vector_store.memory_stats()}
+
+
+def process_memory() -> Dict[str, Any]:
+    """Resident and shared (file-backed) bytes of this process from /proc; empty where unavailable."""
+    try:
+        with open("/proc/self/statm") as fh:
+            _, resident, shared = (int(value) for value in fh.read().split()[:3])
+    except (OSError, ValueError):
+        return {}
+    page = os.sysconf("SC_PAGE_SIZE")
+    return {"rss_bytes": resident * page, "shared_bytes": shared * page}
+
+
+def _update(**fields: Any) -> Dict[str, Any]:
+    with _STATE_LOCK:
+        if fields.get("status") == "warming":
+            _STATE.clear()
+        _STATE.update(fields)
+        return dict(_STATE)
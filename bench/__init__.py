@@ -0,0 +1 @@
+"""Offline benchmark suite: fake LLM/search services, a synthetic corpus and a load generator (see bench.run)."""
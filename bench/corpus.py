@@ -0,0 +1,99 @@
+"""
+Synthetic PDF corpus for benchmarks: deterministic pseudo-text over a cryptography vocabulary,
+written as minimal PDF files PyPDF2 can extract. Also derives a query set from the same vocabulary.
+"""
+
+import random
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+# size -> (documents, pages per document)
+CORPUS_SIZES: Dict[str, Tuple[int, int]] = {
+    "tiny": (1, 5),
+    "small": (4, 10),
+    "medium": (12, 40),
+    "large": (40, 100),
+}
+WORDS_PER_PAGE = 350
+_TOPICS = (
+    "aes rsa ecdsa ed25519 sha256 hmac pbkdf2 argon2 chacha20 poly1305 diffie hellman elgamal lattice kyber "
+    "dilithium feistel sbox gcm ctr cbc padding oracle nonce reuse entropy prng keystream mac signature "
+    "certificate pki x509 tls handshake forward secrecy zero knowledge commitment merkle tree blockchain"
+).split()
+_FILLER = (
+    "the a of to and in is that for it as with by on this be are from or an which can at we our these "
+    "key secret message attacker security scheme algorithm proof bits block stream value function"
+).split()
+
+
+def page_text(rng: random.Random, words: int = WORDS_PER_PAGE) -> str:
+    """Filler prose with ~15% topic terms, so retrieval has something to discriminate on."""
+    return " ".join(rng.choice(_TOPICS) if rng.random() < 0.15 else rng.choice(_FILLER) for _ in range(words))
+
+
+def generate_corpus(directory: Path, size: str = "small", seed: int = 0) -> Dict[str, int]:
+    """Write the corpus for `size` into `directory` (skipped when already there); returns its shape."""
+    if size not in CORPUS_SIZES:
+        raise ValueError(f"Unknown corpus size {size!r} (expected one of {', '.join(CORPUS_SIZES)})")
+    documents, pages = CORPUS_SIZES[size]
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    for doc in range(documents):
+        texts = [page_text(rng) for _ in range(pages)]
+        path = directory / f"synthetic-{size}-{doc:03d}.pdf"
+        if not path.exists():
+            write_pdf(path, texts)
+    return {"documents": documents, "pages": documents * pages, "words": documents * pages * WORDS_PER_PAGE}
+
+
+def generate_queries(count: int, distinct: int = 0, seed: int = 1) -> List[str]:
+    """`count` questions; with `distinct` > 0 they cycle through that many unique ones (exercises caches)."""
+    rng = random.Random(seed)
+    unique = distinct or count
+    pool = [
+        f"How does {rng.choice(_TOPICS)} relate to {rng.choice(_TOPICS)} and {rng.choice(_TOPICS)}?"
+        for _ in range(unique)
+    ]
+    return [pool[idx % unique] for idx in range(count)]
+
+
+def write_pdf(path: Path, pages: List[str], line_chars: int = 90) -> None:
+    """Minimal PDF 1.4 writer: one Helvetica text stream per page."""
+    objects: List[bytes] = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pages_id = len(objects) + 2 * len(pages) + 1  # the Pages object follows every content + page pair
+    page_ids = []
+    for text in pages:
+        lines = [text[i : i + line_chars] for i in range(0, len(text), line_chars)]
+        escaped = [line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") for line in lines]
+        stream = ("BT /F1 10 Tf 40 800 Td 12 TL " + " ".join(f"({line}) Tj T*" for line in escaped) + " ET").encode(
+            "latin-1"
+        )
+        content = add(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        page_ids.append(
+            add(
+                b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] /Contents %d 0 R "
+                b"/Resources << /Font << /F1 %d 0 R >> >> >>" % (pages_id, content, font)
+            )
+        )
+    kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+    add(b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids)))
+    catalog = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref)
+    Path(path).write_bytes(bytes(out))
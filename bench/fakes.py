@@ -0,0 +1,274 @@
+"""
+Local stand-ins for the external services, so benchmarks run offline and repeatably:
+- FakeLLMServer: OpenAI/Databricks-compatible chat completions (JSON or SSE streaming),
+  with a configurable latency distribution, tool-call responses, `usage` and error injection.
+- FakeSearchServer: a search API answering in the `{"results": [...]}` shape WebSearchClient reads.
+"""
+
+import hashlib
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+_WORDS = (
+    "cipher key block stream nonce hash digest signature curve modulus prime field entropy padding "
+    "mode counter tag salt secret public private exchange protocol round permutation lattice"
+).split()
+
+
+class Latency:
+    """
+    Latency distribution parsed from a spec (milliseconds):
+    "fixed:200", "uniform:100,300" or "lognormal:200,0.5" (median, sigma).
+    """
+
+    def __init__(self, spec: str) -> None:
+        kind, _, params = spec.partition(":")
+        values = [float(value) for value in params.split(",") if value]
+        expected = {"fixed": 1, "uniform": 2, "lognormal": 2}
+        if kind not in expected or len(values) != expected[kind]:
+            raise ValueError(f"Bad latency spec {spec!r} (fixed:MS, uniform:LO,HI or lognormal:MEDIAN,SIGMA)")
+        self.spec = spec
+        self.kind = kind
+        self.values = values
+
+    def sample(self, rng: random.Random) -> float:
+        """One latency in seconds."""
+        if self.kind == "fixed":
+            ms = self.values[0]
+        elif self.kind == "uniform":
+            ms = rng.uniform(*self.values)
+        else:
+            ms = self.values[0] * rng.lognormvariate(0.0, self.values[1])
+        return max(0.0, ms) / 1000
+
+
+class _QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request: Any, client_address: Any) -> None:
+        # Clients abandoning a connection (pool shutdown, cancelled stream) is normal under load.
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+
+class _FakeServer:
+    """ThreadingHTTPServer on an ephemeral localhost port, served from a daemon thread."""
+
+    handler: Any = None
+
+    def __init__(self, latency: str = "fixed:0", seed: int = 0) -> None:
+        self.latency = Latency(latency)
+        self.seed = seed
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counters: Dict[str, int] = {"requests": 0}
+        self._server: Optional[_QuietServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        assert self._server is not None, "server not started"
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "_FakeServer":
+        owner = self
+
+        class Handler(self.handler):  # type: ignore[misc, name-defined]
+            server_owner = owner
+
+        self._server = _QuietServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "_FakeServer":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+    def count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + 1
+
+    def sample_latency(self) -> float:
+        with self._lock:
+            return self.latency.sample(self._rng)
+
+    def rng_for(self, text: str) -> random.Random:
+        """Deterministic per-request randomness (same prompt -> same decisions)."""
+        digest = hashlib.sha256(f"{self.seed}:{text}".encode("utf-8")).digest()
+        return random.Random(int.from_bytes(digest[:8], "little"))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"latency": self.latency.spec, **self.counters}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real endpoints
+    server_owner: Any = None
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+    def _send_json(self, status: int, body: Dict[str, Any]) -> None:
+        encoded = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+
+class _LLMHandler(_Handler):
+    def do_POST(self) -> None:
+        owner: FakeLLMServer = self.server_owner
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        owner.count("requests")
+        latency = owner.sample_latency()
+        messages: List[Dict[str, Any]] = payload.get("messages") or []
+        rng = owner.rng_for(json.dumps(messages[-1:], sort_keys=True))
+        if rng.random() < owner.error_rate:
+            owner.count("errors")
+            time.sleep(latency / 2)
+            self._send_json(503, {"error_code": "TEMPORARILY_UNAVAILABLE", "message": "injected failure"})
+            return
+        message = owner.respond(messages, bool(payload.get("tools")), rng)
+        if message.get("tool_calls"):
+            owner.count("tool_calls")
+        usage = {
+            "prompt_tokens": len(json.dumps(messages)) // 4,
+            "completion_tokens": len((message.get("content") or "").split()),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        if payload.get("stream"):
+            owner.count("streams")
+            self._stream(message, usage, latency, owner.ttft_fraction)
+            return
+        time.sleep(latency)
+        finish = "tool_calls" if message.get("tool_calls") else "stop"
+        self._send_json(
+            200,
+            {
+                "id": f"chatcmpl-{owner.counters['requests']}",
+                "object": "chat.completion",
+                "model": payload.get("model") or "fake-llm",
+                "choices": [{"index": 0, "message": message, "finish_reason": finish}],
+                "usage": usage,
+            },
+        )
+
+    def _stream(self, message: Dict[str, Any], usage: Dict[str, int], latency: float, ttft_fraction: float) -> None:
+        """SSE chunks: the first after `ttft_fraction` of the latency, the rest spread over the remainder."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        if message.get("tool_calls"):
+            deltas = [{"tool_calls": [{"index": i, **call}]} for i, call in enumerate(message["tool_calls"])]
+        else:
+            words = (message.get("content") or "").split(" ")
+            deltas = [{"content": word + (" " if i < len(words) - 1 else "")} for i, word in enumerate(words)]
+        time.sleep(latency * ttft_fraction)
+        gap = latency * (1 - ttft_fraction) / max(1, len(deltas))
+        for idx, delta in enumerate(deltas):
+            if idx:
+                time.sleep(gap)
+            self._chunk({"choices": [{"index": 0, "delta": delta}]})
+        finish = "tool_calls" if message.get("tool_calls") else "stop"
+        self._chunk({"choices": [{"index": 0, "delta": {}, "finish_reason": finish}], "usage": usage})
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def _chunk(self, data: Dict[str, Any]) -> None:
+        self._write_chunk(f"data: {json.dumps(data)}\n\n".encode("utf-8"))
+
+    def _write_chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+class FakeLLMServer(_FakeServer):
+    """
+    Chat-completions stand-in. Every POST path is accepted (point DATABRICKS_SERVING_ENDPOINT at `url`).
+    - `tool_rate`: share of first passes (tools offered, no tool result yet) answered with a
+      `web_search` tool call instead of text; decided per prompt, so reruns are repeatable.
+    - `answer_words`: length of text answers; `ttft_fraction`: share of the latency spent before the
+      first streamed chunk; `error_rate`: share of requests answered with 503.
+    """
+
+    handler = _LLMHandler
+
+    def __init__(
+        self,
+        latency: str = "lognormal:300,0.4",
+        tool_rate: float = 0.3,
+        answer_words: int = 80,
+        ttft_fraction: float = 0.3,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ) -> None:
+        super().__init__(latency, seed)
+        self.tool_rate = tool_rate
+        self.answer_words = answer_words
+        self.ttft_fraction = ttft_fraction
+        self.error_rate = error_rate
+
+    def respond(self, messages: List[Dict[str, Any]], tools_offered: bool, rng: random.Random) -> Dict[str, Any]:
+        has_tool_result = any(message.get("role") == "tool" for message in messages)
+        if tools_offered and not has_tool_result and rng.random() < self.tool_rate:
+            user = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+            # The agent's user message starts with "User question:\n<query>"; search for the question.
+            lines = [line for line in user.splitlines() if line.strip() and not line.startswith("User question")]
+            query = " ".join((lines[0] if lines else "").split()[:8]) or "cryptography"
+            call = {
+                "id": f"call_{rng.randrange(1 << 30):x}",
+                "type": "function",
+                "function": {"name": "web_search", "arguments": json.dumps({"query": query, "limit": 3})},
+            }
+            return {"role": "assistant", "content": None, "tool_calls": [call]}
+        words = [rng.choice(_WORDS) for _ in range(self.answer_words)]
+        return {"role": "assistant", "content": " ".join(words).capitalize() + "."}
+
+
+class _SearchHandler(_Handler):
+    def do_GET(self) -> None:
+        owner: FakeSearchServer = self.server_owner
+        owner.count("requests")
+        params = parse_qs(urlparse(self.path).query)
+        query = (params.get("q") or [""])[0]
+        limit = int((params.get("num") or ["3"])[0])
+        time.sleep(owner.sample_latency())
+        rng = owner.rng_for(query)
+        results = [
+            {
+                "title": f"{query} ({idx + 1})",
+                "url": f"https://example.org/{rng.randrange(1 << 20)}",
+                "snippet": " ".join(rng.choice(_WORDS) for _ in range(25)),
+            }
+            for idx in range(limit)
+        ]
+        self._send_json(200, {"results": results})
+
+
+class FakeSearchServer(_FakeServer):
+    """Search API stand-in (point SEARCH_API_ENDPOINT at `url`); results are derived from the query."""
+
+    handler = _SearchHandler
+
+    def __init__(self, latency: str = "lognormal:150,0.5", seed: int = 0) -> None:
+        super().__init__(latency, seed)
@@ -0,0 +1,316 @@
+"""
+Load generator for the agent endpoints and the JSON report it produces.
+- Closed loop (`concurrency`): N workers each send the next request as soon as the previous one returns.
+- Open loop (`rps`): requests are scheduled at a fixed rate regardless of how fast answers come back;
+  latency is measured from the scheduled send time, so queueing delay is not hidden.
+Requests go to a running server (`base_url`) or, without one, in-process through Django's test client.
+"""
+
+import gzip
+import json
+import math
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+ENDPOINTS = {"query": "/api/agent/query/", "stream": "/api/agent/query/stream/", "async": "/api/agent/query/async/"}
+
+
+class Sample:
+    __slots__ = ("latency", "status", "error", "ttft", "stages", "wire_bytes", "raw_bytes")
+
+    def __init__(
+        self,
+        latency: float,
+        status: int,
+        error: Optional[str] = None,
+        ttft: Optional[float] = None,
+        stages: Optional[Dict[str, float]] = None,
+        wire_bytes: Optional[int] = None,
+        raw_bytes: Optional[int] = None,
+    ) -> None:
+        self.latency = latency
+        self.status = status
+        self.error = error
+        self.ttft = ttft
+        self.stages = stages or {}
+        self.wire_bytes = wire_bytes  # response body as sent (after any content coding)
+        self.raw_bytes = raw_bytes  # ...and before it
+
+
+class Target:
+    """
+    Sends one agent query and turns the response into a Sample.
+    `verbosity` is passed through to the server; `accept_encoding` is sent as the Accept-Encoding header
+    (gzip bodies are decoded here; wire and uncompressed sizes are both recorded).
+    """
+
+    def __init__(
+        self,
+        endpoint: str = "query",
+        base_url: Optional[str] = None,
+        allow_search: bool = True,
+        verbosity: Optional[str] = None,
+        accept_encoding: str = "identity",
+    ) -> None:
+        if endpoint not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint {endpoint!r} (expected one of {', '.join(ENDPOINTS)})")
+        self.endpoint = endpoint
+        self.path = ENDPOINTS[endpoint]
+        self.base_url = base_url.rstrip("/") if base_url else None
+        self.allow_search = allow_search
+        self.verbosity = verbosity
+        self.accept_encoding = accept_encoding
+        self._local = threading.local()
+
+    def send(self, query: str, session_id: str, started: float) -> Sample:
+        body: Dict[str, Any] = {
+            "query": query,
+            "allow_search": self.allow_search,
+            "session_id": session_id,
+            "timings": True,
+        }
+        if self.verbosity:
+            body["verbosity"] = self.verbosity
+        try:
+            if self.base_url:
+                status, chunks, headers = self._send_http(body)
+            else:
+                status, chunks, headers = self._send_local(body)
+            payload, ttft, sizes = self._read(chunks, started, headers)
+        except Exception as exc:
+            return Sample(time.perf_counter() - started, 0, f"{exc.__class__.__name__}: {exc}")
+        latency = time.perf_counter() - started
+        error = payload.get("error") if isinstance(payload, dict) else None
+        if status != 200 and not error:
+            error = f"HTTP {status}"
+        return Sample(latency, status, error, ttft, stage_breakdown(payload) if not error else None, *sizes)
+
+    def _send_local(self, body: Dict[str, Any]) -> Tuple[int, Iterator[bytes], Dict[str, str]]:
+        client = getattr(self._local, "client", None)
+        if client is None:
+            from django.test import Client
+
+            client = self._local.client = Client()
+        response = client.post(
+            self.path, json.dumps(body), content_type="application/json", HTTP_ACCEPT_ENCODING=self.accept_encoding
+        )
+        headers = {name.lower(): value for name, value in response.items()}
+        if getattr(response, "streaming", False):
+            return response.status_code, iter(response.streaming_content), headers
+        return response.status_code, iter([_decode(response.content, headers.get("content-encoding"))]), headers
+
+    def _send_http(self, body: Dict[str, Any]) -> Tuple[int, Iterator[bytes], Dict[str, str]]:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            import requests
+
+            session = self._local.session = requests.Session()
+        response = session.post(
+            self.base_url + self.path,
+            json=body,
+            headers={"Accept-Encoding": self.accept_encoding},
+            stream=self.endpoint == "stream",
+            timeout=300,
+        )
+        # requests decodes gzip (and br, with brotli installed) itself.
+        headers = {name.lower(): value for name, value in response.headers.items()}
+        return response.status_code, response.iter_content(chunk_size=None), headers
+
+    def _read(
+        self, chunks: Iterator[bytes], started: float, headers: Dict[str, str]
+    ) -> Tuple[Any, Optional[float], Tuple[Optional[int], Optional[int]]]:
+        """Final JSON payload, for the SSE endpoint the time until the first token event, and the body sizes."""
+        if self.endpoint != "stream":
+            body = b"".join(chunks)
+            raw = int(headers.get("x-uncompressed-length") or len(body))
+            return json.loads(body or b"{}"), None, (int(headers.get("content-length") or raw), raw)
+        ttft: Optional[float] = None
+        payload: Any = {}
+        buffer = b""
+        for chunk in chunks:
+            buffer += chunk
+            while b"\n\n" in buffer:
+                frame, buffer = buffer.split(b"\n\n", 1)
+                event, data = _parse_sse(frame)
+                if event == "token" and ttft is None:
+                    ttft = time.perf_counter() - started
+                elif event in ("done", "error"):
+                    payload = data
+        return payload, ttft, (None, None)
+
+
+def run_load(
+    target: Target,
+    queries: Sequence[str],
+    concurrency: int = 0,
+    rps: float = 0.0,
+    warmup: int = 0,
+    sessions: int = 0,
+) -> Tuple[List[Sample], float]:
+    """
+    Send every query once (after `warmup` unmeasured ones) and return (samples, wall seconds).
+    `sessions` > 0 spreads requests over that many session ids (0: a fresh session per request).
+    """
+    if bool(concurrency) == bool(rps):
+        raise ValueError("Pass exactly one of concurrency or rps")
+
+    def session_for(idx: int) -> str:
+        return f"bench-{idx % sessions if sessions else idx}"
+
+    for idx, query in enumerate(queries[:warmup]):
+        target.send(query, f"bench-warmup-{idx}", time.perf_counter())
+    measured = list(queries[warmup:])
+    samples: List[Optional[Sample]] = [None] * len(measured)
+    started = time.perf_counter()
+    if concurrency:
+        cursor = iter(range(len(measured)))
+        cursor_lock = threading.Lock()
+
+        def worker() -> None:
+            while True:
+                with cursor_lock:
+                    idx = next(cursor, None)
+                if idx is None:
+                    return
+                samples[idx] = target.send(measured[idx], session_for(idx), time.perf_counter())
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    else:
+        interval = 1.0 / rps
+        with ThreadPoolExecutor(max_workers=min(512, max(8, math.ceil(rps * 30)))) as pool:
+            for idx, query in enumerate(measured):
+                scheduled = started + idx * interval
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(_record, samples, idx, target.send, query, session_for(idx), scheduled)
+    return [sample for sample in samples if sample is not None], time.perf_counter() - started
+
+
+def _decode(body: bytes, encoding: Optional[str]) -> bytes:
+    if encoding == "gzip":
+        return gzip.decompress(body)
+    if encoding == "br":
+        import brotli
+
+        return brotli.decompress(body)
+    return body
+
+
+def _record(samples: List[Optional[Sample]], idx: int, send: Callable[..., Sample], *args: Any) -> None:
+    samples[idx] = send(*args)
+
+
+def stage_breakdown(payload: Any) -> Dict[str, float]:
+    """
+    Per-stage milliseconds of one response: every `*_ms` number under `timings` (per-stage span totals),
+    plus LLM time (`cache.llm_ms` of each LLM pass) and tool time from the trace.
+    """
+    if not isinstance(payload, dict):
+        return {}
+    stages: Dict[str, float] = {}
+    for name, value in (payload.get("timings") or {}).items():
+        if name.endswith("_ms") and isinstance(value, (int, float)):
+            stages[name] = float(value)
+    for entry in payload.get("trace") or []:
+        if not isinstance(entry, dict):
+            continue
+        if entry.get("event") == "tool_call" and isinstance(entry.get("elapsed_ms"), (int, float)):
+            stages["trace_tools_ms"] = stages.get("trace_tools_ms", 0.0) + entry["elapsed_ms"]
+        cache = entry.get("cache")
+        if isinstance(cache, dict) and isinstance(cache.get("llm_ms"), (int, float)):
+            stages["trace_llm_ms"] = stages.get("trace_llm_ms", 0.0) + cache["llm_ms"]
+    return stages
+
+
+def percentile(values: Sequence[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile (q in 0..100)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))]
+
+
+def summarize(values: Sequence[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"count": 0, "p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    return {
+        "count": len(values),
+        "p50": round(percentile(values, 50) or 0.0, 1),
+        "p95": round(percentile(values, 95) or 0.0, 1),
+        "p99": round(percentile(values, 99) or 0.0, 1),
+        "mean": round(statistics.fmean(values), 1),
+        "max": round(max(values), 1),
+    }
+
+
+def report(samples: Sequence[Sample], wall_seconds: float) -> Dict[str, Any]:
+    ok = [sample for sample in samples if sample.error is None]
+    statuses: Dict[str, int] = {}
+    errors: Dict[str, int] = {}
+    for sample in samples:
+        statuses[str(sample.status)] = statuses.get(str(sample.status), 0) + 1
+        if sample.error is not None:
+            errors[sample.error[:120]] = errors.get(sample.error[:120], 0) + 1
+    stage_names = sorted({name for sample in ok for name in sample.stages})
+    return {
+        "requests": len(samples),
+        "ok": len(ok),
+        "errors": len(samples) - len(ok),
+        "error_rate": round((len(samples) - len(ok)) / len(samples), 4) if samples else 0.0,
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_rps": round(len(ok) / wall_seconds, 2) if wall_seconds else 0.0,
+        "latency_ms": summarize([1000 * sample.latency for sample in ok]),
+        "ttft_ms": summarize([1000 * sample.ttft for sample in ok if sample.ttft is not None]),
+        "response_bytes": summarize([sample.wire_bytes for sample in ok if sample.wire_bytes is not None]),
+        "uncompressed_bytes": summarize([sample.raw_bytes for sample in ok if sample.raw_bytes is not None]),
+        "stages_ms": {
+            name: summarize([sample.stages[name] for sample in ok if name in sample.stages]) for name in stage_names
+        },
+        "status_codes": statuses,
+        "error_messages": errors,
+    }
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[str]:
+    """Human-readable deltas of the headline numbers between two reports."""
+    lines = []
+    rows = (
+        [("throughput_rps", ("results", "throughput_rps"))]
+        + [(f"latency {q}", ("results", "latency_ms", q)) for q in ("p50", "p95", "p99")]
+        + [("bytes mean", ("results", "response_bytes", "mean"))]
+    )
+    for label, path in rows:
+        old, new = _dig(baseline, path), _dig(current, path)
+        if isinstance(old, (int, float)) and isinstance(new, (int, float)) and old:
+            lines.append(f"{label:>16}: {old:>10} -> {new:>10} ({100 * (new - old) / old:+.1f}%)")
+        else:
+            lines.append(f"{label:>16}: {old} -> {new}")
+    return lines
+
+
+def _dig(data: Any, path: Sequence[str]) -> Any:
+    for key in path:
+        data = data.get(key) if isinstance(data, dict) else None
+    return data
+
+
+def _parse_sse(frame: bytes) -> Tuple[Optional[str], Any]:
+    event: Optional[str] = None
+    data_lines = []
+    for line in frame.decode("utf-8").splitlines():
+        if line.startswith("event:"):
+            event = line[6:].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[5:].lstrip())
+    try:
+        return event, json.loads("\n".join(data_lines)) if data_lines else None
+    except json.JSONDecodeError:
+        return event, None
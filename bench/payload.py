@@ -0,0 +1,114 @@
+"""
+Response payload measurements: answers a few synthetic queries in-process (fake LLM/search servers),
+then reports, for every verbosity level, JSON encoder and content coding, the mean body size and the
+encode/compress time, with savings relative to the old default (full result, stdlib JSON, no compression).
+
+    python -m bench.payload --samples 20 --size small --tool-rate 0.5
+    python -m bench.payload --samples 20 --out bench/results/payload.json
+
+Options other than --samples/--repeat/--out are those of `python -m bench.run` (corpus size, fakes, --set).
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from .corpus import generate_corpus, generate_queries
+from .fakes import FakeLLMServer, FakeSearchServer
+from .run import configure, parse_args, setup_agent
+
+
+def timed(fn: Callable[[], Any], repeat: int) -> float:
+    """Mean seconds per call of `fn` over `repeat` calls."""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat
+
+
+def measure(results: List[Dict[str, Any]], repeat: int) -> List[Dict[str, Any]]:
+    from agents import responses
+
+    # Same levels as the server (AGENT_GZIP_LEVEL, AGENT_BROTLI_QUALITY).
+    codings: Dict[str, Callable[[bytes], bytes]] = {
+        "identity": lambda body: body,
+        "gzip": lambda body: responses.compress(body, "gzip"),
+    }
+    if responses.brotli is not None:
+        codings["br"] = lambda body: responses.compress(body, "br")
+    encoders = ["stdlib"] + (["orjson"] if responses.orjson is not None else [])
+
+    rows: List[Dict[str, Any]] = []
+    for level, fields in responses.VERBOSITY_FIELDS.items():
+        shaped = [responses.shape_result(result, fields) for result in results]
+        for encoder in encoders:
+            bodies = [responses.encode_json(data, encoder)[0] for data in shaped]
+            encode_s = statistics.fmean(timed(lambda: responses.encode_json(data, encoder), repeat) for data in shaped)
+            for coding, compress in codings.items():
+                compressed = [compress(body) for body in bodies]
+                compress_s = statistics.fmean(timed(lambda: compress(body), repeat) for body in bodies)
+                rows.append(
+                    {
+                        "verbosity": level,
+                        "encoder": encoder,
+                        "encoding": coding,
+                        "bytes": round(statistics.fmean(len(body) for body in compressed)),
+                        "encode_us": round(1e6 * encode_s, 1),
+                        "compress_us": round(1e6 * compress_s, 1) if coding != "identity" else 0.0,
+                    }
+                )
+    old_default = ("full", "stdlib", "identity")
+    baseline = next(row for row in rows if (row["verbosity"], row["encoder"], row["encoding"]) == old_default)
+    for row in rows:
+        row["bytes_saved_pct"] = round(100 * (1 - row["bytes"] / baseline["bytes"]), 1) if baseline["bytes"] else 0.0
+        row["encode_saved_us"] = round(baseline["encode_us"] - row["encode_us"], 1)
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=10, help="agent answers to measure")
+    parser.add_argument("--repeat", type=int, default=50, help="timing repetitions per answer")
+    parser.add_argument("--out", help="write the rows as JSON here")
+    own, rest = parser.parse_known_args(argv)
+    args = parse_args(rest)
+
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="agent-bench-"))
+    generate_corpus(workdir / "corpus", args.size, seed=args.seed)
+    llm = FakeLLMServer(
+        latency="fixed:0", tool_rate=args.tool_rate, answer_words=args.answer_words, seed=args.seed
+    ).start()
+    search = FakeSearchServer(latency="fixed:0", seed=args.seed).start()
+    try:
+        setup_agent(configure(args, workdir, llm, search))
+        from agents.views import get_agent
+
+        agent = get_agent()
+        results = [agent.run(query) for query in generate_queries(own.samples, seed=args.seed + 1)]
+    finally:
+        llm.stop()
+        search.stop()
+
+    rows = measure(results, own.repeat)
+    print(
+        f"{'verbosity':<9} {'encoder':<7} {'encoding':<8} {'bytes':>8} {'saved':>7} "
+        f"{'encode us':>10} {'compress us':>12}"
+    )
+    for row in rows:
+        print(
+            f"{row['verbosity']:<9} {row['encoder']:<7} {row['encoding']:<8} {row['bytes']:>8} "
+            f"{row['bytes_saved_pct']:>6}% {row['encode_us']:>10} {row['compress_us']:>12}"
+        )
+    if own.out:
+        Path(own.out).parent.mkdir(parents=True, exist_ok=True)
+        Path(own.out).write_text(json.dumps({"samples": own.samples, "rows": rows}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
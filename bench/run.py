@@ -0,0 +1,176 @@
+"""
+End-to-end benchmark: synthetic corpus + fake LLM/search servers + load generator -> JSON report.
+
+    python -m bench.run --size small --requests 200 --concurrency 8 --out bench/results/local.json
+    python -m bench.run --rps 20 --requests 400 --endpoint stream --compare bench/results/local.json
+
+Runs the agent in-process (Django test client) unless --base-url points at a server you started
+yourself with the same fake endpoints (see --serve-only).
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .corpus import CORPUS_SIZES, generate_corpus, generate_queries
+from .fakes import FakeLLMServer, FakeSearchServer
+from .loadgen import ENDPOINTS, Target, compare, report, run_load
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", choices=sorted(CORPUS_SIZES), default="small", help="synthetic corpus size")
+    parser.add_argument("--workdir", help="corpus/index/cache directory (default: a temp dir)")
+    parser.add_argument("--requests", type=int, default=100, help="measured requests")
+    parser.add_argument("--warmup", type=int, default=5, help="unmeasured requests sent first")
+    parser.add_argument("--distinct", type=int, default=0, help="unique queries to cycle through (0: all unique)")
+    parser.add_argument("--sessions", type=int, default=0, help="session ids to spread requests over (0: one each)")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--concurrency", type=int, default=0, help="closed loop with this many workers (default 4)")
+    mode.add_argument("--rps", type=float, default=0.0, help="open loop at this request rate")
+    parser.add_argument("--endpoint", choices=sorted(ENDPOINTS), default="query")
+    parser.add_argument("--no-search", action="store_true", help="send allow_search=false")
+    parser.add_argument("--verbosity", choices=("answer", "sources", "full"), help="response verbosity to request")
+    parser.add_argument("--accept-encoding", default="identity", help="Accept-Encoding header (e.g. gzip)")
+    parser.add_argument(
+        "--llm-latency", default="lognormal:300,0.4", help="fixed:MS | uniform:LO,HI | lognormal:MEDIAN,SIGMA"
+    )
+    parser.add_argument("--search-latency", default="lognormal:150,0.5")
+    parser.add_argument("--tool-rate", type=float, default=0.3, help="share of first passes that call web_search")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of LLM requests answered with 503")
+    parser.add_argument("--answer-words", type=int, default=80)
+    parser.add_argument("--llm-cache", default="off", help="LLM_CACHE_MODE for the run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--base-url", help="benchmark a running server instead of the in-process agent")
+    parser.add_argument("--serve-only", action="store_true", help="start the fakes, print their env and wait")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE", help="extra setting env var")
+    parser.add_argument("--out", help="write the JSON report here")
+    parser.add_argument("--compare", help="baseline report to diff the headline numbers against")
+    args = parser.parse_args(argv)
+    if not args.rps and not args.concurrency:
+        args.concurrency = 4
+    return args
+
+
+def configure(args: argparse.Namespace, workdir: Path, llm: FakeLLMServer, search: FakeSearchServer) -> Dict[str, str]:
+    """Settings env for the agent under test; must be applied before Django is set up."""
+    env = {
+        "DJANGO_SETTINGS_MODULE": "agent_backend.settings",
+        "DJANGO_ALLOWED_HOSTS": "127.0.0.1,localhost,testserver",
+        "DATABRICKS_HOST": "",
+        "DATABRICKS_API_TOKEN": "bench",
+        "DATABRICKS_SERVING_ENDPOINT": f"{llm.url}/serving-endpoints/bench/invocations",
+        "DATABRICKS_SERVING_ENDPOINTS": "",
+        "SEARCH_API_ENDPOINT": f"{search.url}/search",
+        "SEARCH_API_KEY": "bench",
+        "RAG_PDF_PATH": str(workdir / "corpus"),
+        "RAG_CACHE_PATH": str(workdir / f"index-{args.size}.bin"),
+        "LLM_CACHE_MODE": args.llm_cache,
+        "LLM_CACHE_PATH": str(workdir / "llm_cache.sqlite3"),
+        "SESSION_STORE": "memory",
+    }
+    for item in args.set:
+        name, _, value = item.partition("=")
+        env[name] = value
+    return env
+
+
+def setup_agent(env: Dict[str, str], in_process: bool = True) -> float:
+    """Apply the settings env and, for in-process runs, set up Django and warm the agent; returns seconds taken."""
+    os.environ.update(env)
+    started = time.perf_counter()
+    if in_process:
+        import django
+
+        django.setup()
+        from agents.warmup import warm_up
+
+        warm_up(agents=True)
+    return time.perf_counter() - started
+
+
+def git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True, timeout=10
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="agent-bench-"))
+    corpus = generate_corpus(workdir / "corpus", args.size, seed=args.seed)
+    llm = FakeLLMServer(
+        latency=args.llm_latency,
+        tool_rate=args.tool_rate,
+        answer_words=args.answer_words,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    ).start()
+    search = FakeSearchServer(latency=args.search_latency, seed=args.seed).start()
+    try:
+        env = configure(args, workdir, llm, search)
+        if args.serve_only:
+            for name, value in env.items():
+                print(f"export {name}={json.dumps(value)}")
+            print("# fakes running; Ctrl-C to stop", file=sys.stderr)
+            while True:
+                time.sleep(3600)
+        setup_seconds = setup_agent(env, in_process=not args.base_url)
+
+        queries = generate_queries(args.warmup + args.requests, distinct=args.distinct, seed=args.seed + 1)
+        target = Target(
+            args.endpoint,
+            base_url=args.base_url,
+            allow_search=not args.no_search,
+            verbosity=args.verbosity,
+            accept_encoding=args.accept_encoding,
+        )
+        samples, wall = run_load(
+            target, queries, concurrency=args.concurrency, rps=args.rps, warmup=args.warmup, sessions=args.sessions
+        )
+        result: Dict[str, Any] = {
+            "meta": {
+                "commit": git_commit(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "target": args.base_url or "in-process",
+                "setup_seconds": round(setup_seconds, 3),
+            },
+            "config": {
+                key: value
+                for key, value in vars(args).items()
+                if key not in ("out", "compare", "serve_only", "workdir")
+            },
+            "corpus": corpus,
+            "results": report(samples, wall),
+            "fakes": {"llm": llm.stats(), "search": search.stats()},
+        }
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        llm.stop()
+        search.stop()
+
+    print(json.dumps(result["results"], indent=2))
+    if args.out:
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.out).write_text(json.dumps(result, indent=2))
+    if args.compare:
+        print("\n".join(compare(json.loads(Path(args.compare).read_text()), result)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())